@@ -0,0 +1,234 @@
+"""Time the Database methods behind the main screens against a seeded database.
+
+    python -m benchmarks --patients 200 --output before.json
+    python -m benchmarks --patients 200 --baseline before.json --threshold 0.2
+
+Exits with status 1 when a method's median latency regressed by more than
+``--threshold`` (a fraction) against the baseline run.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from src import config
+from benchmarks import datagen
+from benchmarks.common import (
+    add_backend_arguments,
+    backend_from_args,
+    cleanup,
+    open_database,
+    reset_database,
+    summarize,
+)
+
+SLOT_MIXES = ["08:00", "08:00,20:00", "08:00,14:00,20:00", "07:00,12:00,17:00,22:00"]
+
+# Median changes smaller than this are timer noise, not regressions
+MIN_REGRESSION_MS = 0.05
+
+
+def build_cases(db, ids):
+    """(name, call) pairs. ``call(i)`` runs the i-th iteration and returns
+    the number of rows it read or wrote."""
+    today = date.today()
+    patients = ids["patients"]
+    medicines = ids["medicines"]
+    schedules = ids["schedules"]
+
+    def patient(i):
+        return patients[i % len(patients)]
+
+    def get_medicine_logs(i):
+        return len(db.get_medicine_logs(patient(i), today))
+
+    def get_medicine_logs_week(i):
+        return len(db.get_medicine_logs(patient(i)))
+
+    def generate_medicine_logs(i):
+        result = db.generate_medicine_logs(today, patient(i))
+        return result["created"] + result["skipped"]
+
+    def add_medicine_schedule(i):
+        db.add_medicine_schedule(
+            patient_id=patient(i),
+            medicine_id=medicines[i % len(medicines)],
+            prescription_id=None,
+            dosage="1 tablet",
+            frequency="daily",
+            start_date=today,
+            end_date=today + timedelta(days=30),
+            time_slots=SLOT_MIXES[i % len(SLOT_MIXES)],
+        )
+        return 1
+
+    def update_medicine_schedule(i):
+        schedule_id = schedules[i % len(schedules)]
+        db.update_medicine_schedule(
+            schedule_id=schedule_id,
+            medicine_id=medicines[i % len(medicines)],
+            dosage="2 tablets",
+            frequency="daily",
+            start_date=today,
+            end_date=None,
+            time_slots=SLOT_MIXES[i % len(SLOT_MIXES)],
+        )
+        return 1
+
+    def get_expiring_medicines(i):
+        return len(db.get_expiring_medicines(patient(i)))
+
+    def get_all_medicines(i):
+        return len(db.get_all_medicines())
+
+    def get_all_medicines_uncached(i):
+        db.cache.clear()
+        return len(db.get_all_medicines())
+
+    def get_patient_prescriptions(i):
+        return len(db.get_patient_prescriptions(patient(i)))
+
+    return [
+        ("get_medicine_logs", get_medicine_logs),
+        ("get_medicine_logs[week]", get_medicine_logs_week),
+        ("generate_medicine_logs", generate_medicine_logs),
+        ("add_medicine_schedule", add_medicine_schedule),
+        ("update_medicine_schedule", update_medicine_schedule),
+        ("get_expiring_medicines", get_expiring_medicines),
+        ("get_all_medicines", get_all_medicines),
+        ("get_all_medicines[uncached]", get_all_medicines_uncached),
+        ("get_patient_prescriptions", get_patient_prescriptions),
+    ]
+
+
+def run_case(call, iterations, warmup):
+    for i in range(warmup):
+        call(i)
+
+    durations = []
+    rows = 0
+    for i in range(warmup, warmup + iterations):
+        started = time.perf_counter()
+        rows += call(i)
+        durations.append(time.perf_counter() - started)
+    return summarize(durations, rows)
+
+
+def compare(baseline, results, threshold):
+    """Return the cases whose median got slower than the baseline's by more
+    than ``threshold`` (a fraction)."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        limit = before["p50_ms"] * (1 + threshold)
+        if current["p50_ms"] > limit and current["p50_ms"] - before["p50_ms"] > MIN_REGRESSION_MS:
+            regressions.append((name, before["p50_ms"], current["p50_ms"]))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, out=sys.stdout):
+    header = f"{'case':32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'rows/s':>11}"
+    print(header, file=out)
+    print("-" * len(header), file=out)
+    for name, r in results.items():
+        print(
+            f"{name:32} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} "
+            f"{r['ops_per_sec']:9.1f} {r['rows_per_sec']:11.1f}",
+            file=out,
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n")[0])
+    add_backend_arguments(parser)
+    parser.add_argument("--patients", type=int, default=50)
+    parser.add_argument("--medicines", type=int, default=100)
+    parser.add_argument("--schedules-per-patient", type=int, default=3)
+    parser.add_argument("--history-days", type=int, default=30, help="days of dose history to generate")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cases", help="comma-separated case names to run (default: all)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed median slowdown (default: 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    backend = backend_from_args(args)
+    reset_database(backend)
+    db = open_database(backend)
+
+    started = time.perf_counter()
+    ids = datagen.generate(
+        db,
+        patients=args.patients,
+        medicines=args.medicines,
+        schedules=args.patients * args.schedules_per_patient,
+        history_days=args.history_days,
+        seed=args.seed,
+    )
+    print(f"Seeded {args.patients} patients in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    selected = set(args.cases.split(",")) if args.cases else None
+    results = {}
+    for name, call in build_cases(db, ids):
+        if selected and name not in selected:
+            continue
+        results[name] = run_case(call, args.iterations, args.warmup)
+    db.pool.close()
+    cleanup(args)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "backend": args.backend,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tracing": config.TRACING,
+            "scale": {
+                "patients": args.patients,
+                "medicines": args.medicines,
+                "schedules_per_patient": args.schedules_per_patient,
+                "history_days": args.history_days,
+            },
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("scale") != report["meta"]["scale"]:
+            print("Warning: baseline was run at a different scale", file=sys.stderr)
+        regressions = compare(baseline, results, args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: p50 {before:.3f} ms -> {after:.3f} ms", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
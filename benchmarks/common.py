@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+
+from src.backends import create_backend
+from src.database import Database, create_pool
+
+# Benchmarks never touch the app's own database
+BENCH_MYSQL_DATABASE = "medical_management_bench"
+
+
+def add_backend_arguments(parser):
+    parser.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument(
+        "--sqlite-path",
+        help="database file for the sqlite backend (default: a temporary file)",
+    )
+    parser.add_argument(
+        "--mysql-database",
+        default=BENCH_MYSQL_DATABASE,
+        help="database to create on the configured MySQL server (default: %(default)s)",
+    )
+
+
+def backend_from_args(args):
+    args.temporary_dir = None
+    if args.backend == "sqlite":
+        if not args.sqlite_path:
+            args.temporary_dir = tempfile.mkdtemp(prefix="medical-bench-")
+            args.sqlite_path = os.path.join(args.temporary_dir, "bench.db")
+        return create_backend("sqlite", path=args.sqlite_path)
+    return create_backend("mysql", database=args.mysql_database)
+
+
+def reset_database(backend):
+    # Start from an empty schema so runs are comparable
+    if backend.name == "sqlite":
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(backend.path + suffix):
+                os.remove(backend.path + suffix)
+        return
+
+    connection = backend.mysql.connect(**backend.connect_args)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {backend.database}")
+    cursor.close()
+    connection.close()
+
+
+def cleanup(args):
+    if args.temporary_dir:
+        shutil.rmtree(args.temporary_dir, ignore_errors=True)
+
+
+def open_database(backend, pool_size=None):
+    return Database(pool=create_pool(backend, size=pool_size), backend=backend, fixtures=False)
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(durations, rows=0, elapsed=None):
+    """Latency percentiles in milliseconds plus throughput for a list of
+    per-call durations in seconds."""
+    values = sorted(durations)
+    total = elapsed if elapsed is not None else sum(values)
+    return {
+        "calls": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "ops_per_sec": round(len(values) / total, 1) if total else 0.0,
+        "rows": rows,
+        "rows_per_sec": round(rows / total, 1) if total else 0.0,
+    }
@@ -0,0 +1,356 @@
+"""Bulk-load a realistic clinic: patients, medicines, schedules, prescription
+files and months of dose history.
+
+    python -m benchmarks.datagen --sqlite-path clinic.db --reset \\
+        --patients 5000 --medicines 500 --schedules 15000 --history-days 180
+
+Rows go in through batched multi-row INSERTs with ids assigned up front, so
+a dataset with a million medicine_logs rows loads in a few minutes.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks.common import add_backend_arguments, backend_from_args, open_database, reset_database
+from src import timeslots
+from src.database import MISSED_AFTER_MINUTES, expand_occurrences, next_watermark
+
+BATCH_SIZE = 1000
+PROGRESS_EVERY = 250000
+
+# (time_slots, weight): once daily is most common, a few unusual times
+SLOT_MIXES = [
+    ("08:00", 30),
+    ("21:00", 10),
+    ("08:00,20:00", 25),
+    ("09:00,21:00", 8),
+    ("08:00,14:00,20:00", 12),
+    ("07:00,15:00,23:00", 4),
+    ("06:30,18:30", 4),
+    ("07:00,12:00,17:00,22:00", 5),
+    ("10:15", 2),
+]
+
+DOSAGES = ["1 tablet", "2 tablets", "1 capsule", "5 ml", "10 ml", "1 puff", "half tablet"]
+FREQUENCIES = {1: "once daily", 2: "twice daily", 3: "3 times daily", 4: "4 times daily"}
+MANUFACTURERS = ["GlaxoSmithKline", "Pfizer", "Novartis", "Sun Pharma", "AstraZeneca", "Cipla", "Sanofi"]
+MEDICINE_NAMES = [
+    "Paracetamol", "Ibuprofen", "Amoxicillin", "Cetirizine", "Omeprazole", "Metformin", "Amlodipine",
+    "Atorvastatin", "Losartan", "Levothyroxine", "Salbutamol", "Pantoprazole", "Azithromycin",
+    "Montelukast", "Metoprolol", "Sertraline", "Vitamin D3", "Folic Acid", "Aspirin", "Clopidogrel",
+]
+STRENGTHS = ["5mg", "10mg", "20mg", "25mg", "40mg", "50mg", "100mg", "250mg", "500mg"]
+FIRST_NAMES = ["John", "Jane", "Amit", "Priya", "Maria", "Chen", "Fatima", "Luca", "Aisha", "Tom", "Sara", "Ravi"]
+LAST_NAMES = ["Smith", "Doe", "Sharma", "Garcia", "Wang", "Khan", "Rossi", "Patel", "Brown", "Singh", "Kim"]
+
+
+class Loader:
+    """Batches rows per table and flushes them as multi-row INSERTs."""
+
+    def __init__(self, db, batch_size=BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+        self._connection_context = db.pool.connection()
+        self.connection = self._connection_context.__enter__()
+        self.cursor = db.backend.cursor(self.connection)
+
+    def next_id(self, table):
+        self.cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        return self.cursor.fetchone()[0] + 1
+
+    def add(self, table, columns, row):
+        rows = self.pending.setdefault((table, columns), [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(table, columns)
+
+    def flush(self, table=None, columns=None):
+        keys = [(table, columns)] if table else list(self.pending)
+        for key in keys:
+            rows = self.pending.pop(key, None)
+            if not rows:
+                continue
+            table_name, column_names = key
+            placeholders = "(" + ", ".join(["%s"] * len(column_names)) + ")"
+            values = [value for row in rows for value in row]
+            self.cursor.execute(
+                f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES "
+                + ", ".join([placeholders] * len(rows)),
+                values,
+            )
+            self.counts[table_name] = self.counts.get(table_name, 0) + len(rows)
+        self.connection.commit()
+
+    def close(self):
+        self.flush()
+        self.cursor.close()
+        self._connection_context.__exit__(None, None, None)
+
+
+def _adherence_sampler(rng, mean, concentration):
+    # Per-patient adherence drawn from a beta distribution around ``mean``
+    alpha = max(mean * concentration, 0.01)
+    beta = max((1 - mean) * concentration, 0.01)
+    return lambda: rng.betavariate(alpha, beta)
+
+
+def _dose_outcome(rng, adherence, skip_ratio, scheduled_time):
+    if rng.random() < adherence:
+        # Most doses are taken a little late, a few early
+        delay = max(-30, min(240, int(rng.gauss(12, 25))))
+        return "taken", scheduled_time + timedelta(minutes=delay)
+    if rng.random() < skip_ratio:
+        return "skipped", None
+    return "missed", None
+
+
+def generate(
+    db,
+    patients=100,
+    medicines=50,
+    schedules=None,
+    doctors=None,
+    history_days=90,
+    adherence=0.8,
+    adherence_concentration=5.0,
+    skip_ratio=0.2,
+    files_dir=None,
+    seed=1,
+    batch_size=BATCH_SIZE,
+    progress=None,
+    now=None,
+):
+    """Load a dataset into ``db`` and return the ids it created.
+
+    ``schedules`` is the total across patients (default three per patient).
+    Past doses get taken/skipped/missed outcomes from each patient's
+    adherence; doses due within the last MISSED_AFTER_MINUTES are left
+    scheduled. Upcoming doses are virtual, so none are stored. Prescription
+    files are written to ``files_dir`` when given. ``now`` defaults to the
+    database's clock.
+    """
+    rng = random.Random(seed)
+    schedules = patients * 3 if schedules is None else schedules
+    doctors = doctors if doctors is not None else max(1, patients // 50)
+    now = now or db.clock.now()
+    today = now.date()
+    history_start = today - timedelta(days=history_days)
+    slot_choices = [slots for slots, _ in SLOT_MIXES]
+    slot_weights = [weight for _, weight in SLOT_MIXES]
+    sample_adherence = _adherence_sampler(rng, adherence, adherence_concentration)
+
+    def report(message):
+        if progress:
+            progress(message)
+
+    loader = Loader(db, batch_size)
+    try:
+        # Medicines
+        medicine_columns = (
+            "id", "name", "details", "quantity", "stocked_on", "expires_on",
+            "manufacturer", "batch_no", "storage", "prescription",
+        )
+        first_medicine = loader.next_id("medicines")
+        medicine_ids = list(range(first_medicine, first_medicine + medicines))
+        for medicine_id in medicine_ids:
+            loader.add("medicines", medicine_columns, (
+                medicine_id,
+                f"{rng.choice(MEDICINE_NAMES)} {rng.choice(STRENGTHS)}",
+                "Generated medicine",
+                rng.randint(0, 500),
+                today - timedelta(days=rng.randint(0, 365)),
+                # A share of stock expires within the dashboard's 30-day window
+                today + timedelta(days=rng.randint(-30, 60) if rng.random() < 0.15 else rng.randint(61, 900)),
+                rng.choice(MANUFACTURERS),
+                f"GEN{medicine_id:07d}",
+                "Store at room temperature",
+                rng.random() < 0.3,
+            ))
+        loader.flush()
+        report(f"{medicines} medicines")
+
+        # Users: doctors, then patients
+        user_columns = ("id", "username", "password", "email", "full_name", "user_type")
+        first_user = loader.next_id("users")
+        doctor_ids = list(range(first_user, first_user + doctors))
+        patient_ids = list(range(first_user + doctors, first_user + doctors + patients))
+        for user_id in doctor_ids:
+            loader.add("users", user_columns, (
+                user_id, f"doctor{user_id}", "doctor123", f"doctor{user_id}@example.com",
+                f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", "doctor",
+            ))
+        for user_id in patient_ids:
+            loader.add("users", user_columns, (
+                user_id, f"patient{user_id}", "password123", f"patient{user_id}@example.com",
+                f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", "patient",
+            ))
+        loader.flush()
+        report(f"{doctors} doctors, {patients} patients")
+
+        # One prescription per patient, with a file on disk if asked
+        prescription_columns = ("id", "patient_id", "doctor_id", "prescription_date", "notes", "file_path")
+        first_prescription = loader.next_id("prescriptions")
+        prescription_of = {}
+        if files_dir:
+            os.makedirs(files_dir, exist_ok=True)
+        for offset, patient_id in enumerate(patient_ids):
+            prescription_id = first_prescription + offset
+            prescription_of[patient_id] = prescription_id
+            doctor_id = rng.choice(doctor_ids)
+            prescribed_on = history_start + timedelta(days=rng.randint(0, max(0, history_days // 4)))
+            file_path = None
+            if files_dir:
+                file_path = os.path.join(files_dir, f"prescription_{prescription_id}.txt")
+                with open(file_path, "w") as f:
+                    f.write(f"Prescription {prescription_id} for patient {patient_id}\n")
+                    f.write(f"Prescribed by doctor {doctor_id} on {prescribed_on.isoformat()}\n")
+            loader.add("prescriptions", prescription_columns, (
+                prescription_id, patient_id, doctor_id, prescribed_on, "Generated prescription", file_path,
+            ))
+        loader.flush()
+        report(f"{patients} prescriptions")
+
+        # Schedules, spread over patients, with start dates across the history
+        schedule_columns = (
+            "id", "patient_id", "medicine_id", "prescription_id", "dosage", "frequency",
+            "start_date", "end_date", "time_slots", "notes",
+        )
+        first_schedule = loader.next_id("medicine_schedules")
+        schedule_rows = []
+        for offset in range(schedules):
+            patient_id = patient_ids[offset % patients] if offset < patients else rng.choice(patient_ids)
+            time_slots = rng.choices(slot_choices, slot_weights)[0]
+            start_date = history_start + timedelta(days=rng.randint(0, history_days))
+            # Courses of treatment end; long-term medication does not
+            end_date = None if rng.random() < 0.6 else start_date + timedelta(days=rng.randint(5, 90))
+            schedule = {
+                "id": first_schedule + offset,
+                "patient_id": patient_id,
+                "start_date": start_date,
+                "end_date": end_date,
+                "time_slots": time_slots,
+            }
+            schedule_rows.append(schedule)
+            loader.add("medicine_schedules", schedule_columns, (
+                schedule["id"], patient_id, rng.choice(medicine_ids), prescription_of[patient_id],
+                rng.choice(DOSAGES), FREQUENCIES[len(time_slots.split(","))],
+                start_date, end_date, time_slots, None,
+            ))
+        loader.flush()
+        # After the schedules themselves, which the slots reference
+        for schedule in schedule_rows:
+            for minute in timeslots.parse(schedule["time_slots"]):
+                loader.add("medicine_schedule_slots", ("schedule_id", "minute_of_day"), (schedule["id"], minute))
+        loader.flush()
+        report(f"{schedules} schedules")
+
+        # Dose history, one schedule at a time to bound memory
+        log_columns = ("schedule_id", "scheduled_time", "taken_time", "status")
+        patient_adherence = {patient_id: sample_adherence() for patient_id in patient_ids}
+        logs = 0
+        next_report = PROGRESS_EVERY
+        for schedule in schedule_rows:
+            adherence_rate = patient_adherence[schedule["patient_id"]]
+            for schedule_id, scheduled_time in expand_occurrences([schedule], history_start, today, until=now):
+                if now - scheduled_time <= timedelta(minutes=MISSED_AFTER_MINUTES):
+                    status, taken_time = "scheduled", None
+                else:
+                    status, taken_time = _dose_outcome(rng, adherence_rate, skip_ratio, scheduled_time)
+                loader.add("medicine_logs", log_columns, (schedule_id, scheduled_time, taken_time, status))
+                logs += 1
+            if logs >= next_report:
+                report(f"{logs} medicine logs")
+                next_report += PROGRESS_EVERY
+        loader.flush()
+        report(f"{logs} medicine logs")
+
+        # Every due dose is stored, so the materializer starts from the next one
+        for schedule in schedule_rows:
+            watermark = next_watermark(schedule, timeslots.parse(schedule["time_slots"]), now.replace(microsecond=0))
+            loader.add("schedule_log_watermarks", ("schedule_id", "logs_until"), (schedule["id"], watermark))
+        loader.flush()
+    finally:
+        loader.close()
+
+    # Rows were written behind the cache's back
+    db.cache.clear()
+    return {
+        "patients": patient_ids,
+        "doctors": doctor_ids,
+        "medicines": medicine_ids,
+        "schedules": [schedule["id"] for schedule in schedule_rows],
+        "counts": dict(loader.counts),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.datagen", description=__doc__.split("\n")[0])
+    add_backend_arguments(parser)
+    parser.add_argument("--reset", action="store_true", help="drop the database before loading")
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--medicines", type=int, default=200)
+    parser.add_argument("--schedules", type=int, help="total schedules (default: 3 per patient)")
+    parser.add_argument("--doctors", type=int, help="default: one per 50 patients")
+    parser.add_argument("--history-days", type=int, default=90)
+    parser.add_argument("--adherence", type=float, default=0.8, help="mean share of past doses taken")
+    parser.add_argument(
+        "--adherence-concentration",
+        type=float,
+        default=5.0,
+        help="higher values keep patients closer to the mean adherence",
+    )
+    parser.add_argument("--skip-ratio", type=float, default=0.2, help="share of untaken doses marked skipped")
+    parser.add_argument("--files-dir", help="write a prescription file per patient into this directory")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.backend == "sqlite" and not args.sqlite_path:
+        parser.error("--sqlite-path is required for the sqlite backend")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    backend = backend_from_args(args)
+    if args.reset:
+        reset_database(backend)
+    db = open_database(backend)
+
+    started = time.perf_counter()
+
+    def progress(message):
+        print(f"[{time.perf_counter() - started:7.1f}s] {message}", file=sys.stderr)
+
+    result = generate(
+        db,
+        patients=args.patients,
+        medicines=args.medicines,
+        schedules=args.schedules,
+        doctors=args.doctors,
+        history_days=args.history_days,
+        adherence=args.adherence,
+        adherence_concentration=args.adherence_concentration,
+        skip_ratio=args.skip_ratio,
+        files_dir=args.files_dir,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        progress=progress,
+    )
+    db.pool.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(result["counts"].values())
+    print(f"Loaded {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+    for table, count in sorted(result["counts"].items()):
+        print(f"  {table}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
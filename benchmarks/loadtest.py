@@ -0,0 +1,299 @@
+"""Simulate many kiosks using the app at once and watch how it holds up.
+
+    python -m benchmarks.loadtest --clients 1,10,50,200 --duration 20
+
+Each simulated client has its own Database and replays patient sessions
+(open the dashboard, mark doses, browse schedules and prescriptions) or,
+for ``--admin-ratio`` of them, admin sessions (browse, add, restock and
+remove medicines). Every step starts all clients together on a day whose
+doses are all still virtual, like the 8 AM rush, so marking a dose stores
+it. It reports throughput, latency percentiles, deadlocks and lock
+timeouts, and duplicate medicine_logs rows.
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from benchmarks import datagen
+from benchmarks.common import (
+    add_backend_arguments,
+    backend_from_args,
+    cleanup,
+    open_database,
+    reset_database,
+    summarize,
+)
+from src.backends import create_backend
+from src.pool import PoolTimeoutError
+
+# MySQL error numbers
+ER_LOCK_DEADLOCK = 1213
+ER_LOCK_WAIT_TIMEOUT = 1205
+
+# Seconds a client waits after the step's start time is handed out, so all
+# clients (and processes) are connected before the rush begins
+START_DELAY = 1.0
+
+DUPLICATE_LOGS_QUERY = """
+SELECT COUNT(*) FROM (
+    SELECT schedule_id, scheduled_time
+    FROM medicine_logs
+    GROUP BY schedule_id, scheduled_time
+    HAVING COUNT(*) > 1
+) duplicates
+"""
+
+
+def classify_error(error):
+    if isinstance(error, PoolTimeoutError):
+        return "pool_timeout"
+    errno = getattr(error, "errno", None)
+    if errno == ER_LOCK_DEADLOCK:
+        return "deadlock"
+    if errno == ER_LOCK_WAIT_TIMEOUT:
+        return "lock_timeout"
+    if isinstance(error, sqlite3.OperationalError) and "locked" in str(error):
+        return "lock_timeout"
+    return "error"
+
+
+class Client:
+    """One kiosk: a Database of its own and the timings of what it did."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.rng = random.Random(spec["seed"])
+        backend = create_backend(spec["backend"], **spec["backend_options"])
+        self.db = open_database(backend, pool_size=1)
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = []
+        self.sessions = 0
+
+    def timed(self, operation, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            kind = classify_error(e)
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+            if len(self.error_samples) < 5:
+                self.error_samples.append(f"{operation}: {type(e).__name__}: {e}")
+            return None
+        finally:
+            self.latencies.setdefault(operation, []).append(time.perf_counter() - started)
+
+    def patient_session(self):
+        db = self.db
+        patient_id = self.rng.choice(self.spec["patients"])
+        day = self.spec["day"]
+
+        self.timed("login", db.get_user_by_id, patient_id)
+        # Dashboard, as PatientApp.load_dashboard_data does it
+        logs = self.timed("get_medicine_logs", db.get_medicine_logs, patient_id, day) or []
+        self.timed("get_expiring_medicines", db.get_expiring_medicines, patient_id)
+
+        pending = [log for log in logs if log["status"] == "scheduled"]
+        for log in self.rng.sample(pending, min(len(pending), self.rng.randint(0, 2))):
+            status = "taken" if self.rng.random() < 0.9 else "skipped"
+            taken_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S") if status == "taken" else None
+            self.timed("update_medicine_log", db.update_medicine_log, log["id"], status, taken_time)
+
+        if self.rng.random() < 0.5:
+            schedules = self.timed(
+                "get_patient_medicine_schedules", db.get_patient_medicine_schedules, patient_id
+            ) or []
+            if schedules:
+                self.timed("get_schedule_by_id", db.get_schedule_by_id, self.rng.choice(schedules)["id"])
+        if self.rng.random() < 0.3:
+            self.timed("get_patient_prescriptions", db.get_patient_prescriptions, patient_id)
+
+    def admin_session(self):
+        db = self.db
+        medicines = self.timed("get_all_medicines", db.get_all_medicines) or []
+        if medicines:
+            medicine = self.rng.choice(medicines)
+            self.timed(
+                "update_medicine_quantity", db.update_medicine_quantity, medicine["id"], self.rng.randint(0, 500)
+            )
+        medicine_id = self.timed(
+            "add_medicine",
+            db.add_medicine,
+            f"Load test {self.spec['seed']}-{self.sessions}",
+            "Added by the load test",
+            10,
+            date.today(),
+            date.today() + timedelta(days=365),
+            "Load Labs",
+            "LOAD",
+            "Room temperature",
+            False,
+        )
+        if medicine_id:
+            self.timed("remove_medicine", db.remove_medicine, medicine_id)
+
+    def run(self):
+        session = self.admin_session if self.spec["role"] == "admin" else self.patient_session
+        time.sleep(max(0.0, self.spec["start_at"] - time.time()))
+        deadline = time.time() + self.spec["duration"]
+        while time.time() < deadline and (
+            not self.spec["sessions"] or self.sessions < self.spec["sessions"]
+        ):
+            session()
+            self.sessions += 1
+        self.db.pool.close()
+        return {
+            "role": self.spec["role"],
+            "sessions": self.sessions,
+            "latencies": self.latencies,
+            "errors": self.errors,
+            "error_samples": self.error_samples,
+        }
+
+
+def run_client(spec):
+    # Top level so process pools can pickle it
+    return Client(spec).run()
+
+
+def run_step(args, clients, day, ids, step):
+    admins = int(round(clients * args.admin_ratio))
+    start_at = time.time() + START_DELAY + (clients * 0.01 if args.mode == "process" else 0)
+    backend_options = (
+        {"path": args.sqlite_path} if args.backend == "sqlite" else {"database": args.mysql_database}
+    )
+    specs = [
+        {
+            "role": "admin" if i < admins else "patient",
+            "seed": args.seed * 100000 + step * 1000 + i,
+            "backend": args.backend,
+            "backend_options": backend_options,
+            "patients": ids["patients"],
+            "day": day,
+            "start_at": start_at,
+            "duration": args.duration,
+            "sessions": args.sessions,
+        }
+        for i in range(clients)
+    ]
+
+    if args.mode == "process":
+        executor = ProcessPoolExecutor(max_workers=clients, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=clients)
+    with executor:
+        results = list(executor.map(run_client, specs))
+    wall = time.time() - start_at
+
+    durations = []
+    per_operation = {}
+    errors = {}
+    samples = []
+    sessions = 0
+    for result in results:
+        sessions += result["sessions"]
+        for operation, values in result["latencies"].items():
+            durations.extend(values)
+            per_operation.setdefault(operation, []).extend(values)
+        for kind, count in result["errors"].items():
+            errors[kind] = errors.get(kind, 0) + count
+        samples.extend(result["error_samples"])
+
+    overall = summarize(durations, elapsed=wall)
+    return {
+        "clients": clients,
+        "admins": admins,
+        "day": day.isoformat(),
+        "wall_seconds": round(wall, 2),
+        "sessions": sessions,
+        "sessions_per_sec": round(sessions / wall, 1) if wall else 0.0,
+        "ops_per_sec": overall["ops_per_sec"],
+        "p50_ms": overall["p50_ms"],
+        "p95_ms": overall["p95_ms"],
+        "p99_ms": overall["p99_ms"],
+        "errors": errors,
+        "error_samples": samples[:10],
+        "operations": {name: summarize(values) for name, values in sorted(per_operation.items())},
+    }
+
+
+def count_duplicate_logs(db):
+    with db.pool.connection() as connection:
+        cursor = db.backend.cursor(connection)
+        cursor.execute(DUPLICATE_LOGS_QUERY)
+        duplicates = cursor.fetchone()[0]
+        cursor.close()
+    return duplicates
+
+
+def print_step(step, out=sys.stdout):
+    errors = step["errors"]
+    locks = errors.get("deadlock", 0) + errors.get("lock_timeout", 0)
+    other = sum(errors.values()) - locks
+    print(
+        f"{step['clients']:>7} {step['sessions_per_sec']:>10.1f} {step['ops_per_sec']:>9.1f} "
+        f"{step['p50_ms']:>9.2f} {step['p95_ms']:>9.2f} {step['p99_ms']:>9.2f} "
+        f"{locks:>7} {other:>7} {step['duplicate_logs']:>6}",
+        file=out,
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest", description=__doc__.split("\n")[0])
+    add_backend_arguments(parser)
+    parser.add_argument("--clients", default="1,10,50", help="comma-separated concurrency steps")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per step")
+    parser.add_argument("--sessions", type=int, default=0, help="stop each client after this many sessions")
+    parser.add_argument("--admin-ratio", type=float, default=0.05)
+    parser.add_argument("--patients", type=int, default=50, help="patients to seed; clients share them")
+    parser.add_argument("--medicines", type=int, default=100)
+    parser.add_argument("--history-days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    steps = [int(value) for value in args.clients.split(",")]
+    backend = backend_from_args(args)
+    reset_database(backend)
+    db = open_database(backend)
+    ids = datagen.generate(
+        db, patients=args.patients, medicines=args.medicines, history_days=args.history_days, seed=args.seed
+    )
+
+    print(
+        f"{'clients':>7} {'sessions/s':>10} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'locks':>7} {'errors':>7} {'dups':>6}"
+    )
+    results = []
+    for index, clients in enumerate(steps):
+        # A future day with no stored logs, so the first marks store them
+        day = date.today() + timedelta(days=1 + index)
+        step = run_step(args, clients, day, ids, index)
+        step["duplicate_logs"] = count_duplicate_logs(db)
+        results.append(step)
+        print_step(step)
+        for sample in step["error_samples"][:3]:
+            print(f"        {sample}", file=sys.stderr)
+
+    db.pool.close()
+    cleanup(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"mode": args.mode, "backend": args.backend, "steps": results}, f, indent=2)
+    return 1 if any(step["duplicate_logs"] for step in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
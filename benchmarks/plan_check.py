@@ -0,0 +1,270 @@
+"""Check the query plans of the statements Database issues.
+
+    python -m benchmarks.plan_check
+    python -m benchmarks.plan_check --backend mysql --verbose
+
+Seeds a database, runs a workload touching every Database query, and
+EXPLAINs each distinct SELECT, UPDATE and DELETE it captured. A statement
+fails when its plan reads a large table in full. The hot statements listed
+in HOT_METHODS also fail when they sort through a temporary table
+(``Using filesort`` in MySQL, ``USE TEMP B-TREE`` in SQLite) unless the
+plan starts from an equality lookup, such as one patient's schedules, that
+keeps the sort small. Exits 1 on any failure, so a schema change that drops
+an index the app relies on is caught before it reaches a clinic.
+"""
+
+import argparse
+import re
+import sys
+from datetime import timedelta
+
+from benchmarks import datagen
+from benchmarks.common import add_backend_arguments, backend_from_args, cleanup, open_database, reset_database
+from src import tracing
+
+# Tables that grow with the number of patients and the length of their history
+LARGE_TABLES = {"users", "prescriptions", "medicine_schedules", "medicine_schedule_slots", "medicine_logs"}
+
+# Hot paths: the dashboard's logs by schedule and date, the schedule
+# listing and the expiring-medicines join. These must not sort unbounded.
+HOT_METHODS = {
+    "get_medicine_logs",
+    "update_medicine_schedule",
+    "delete_future_logs",
+    "mark_missed_medicine_logs",
+    "get_patient_medicine_schedules",
+    "get_expiring_medicines",
+}
+
+# Full scans that are intended, by statement fingerprint
+ALLOWED_SCANS = {
+    # The daily job generating logs for every active schedule
+    "SELECT * FROM medicine_schedules WHERE start_date <= ? AND (end_date IS NULL OR end_date >= ?)",
+}
+
+EXPLAINED_STATEMENTS = ("SELECT", "UPDATE", "DELETE")
+
+# "FROM medicine_logs ml" -> ("medicine_logs", "ml")
+TABLE_ALIASES = re.compile(
+    r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE|SET|JOIN|ON|ORDER|GROUP|LEFT|INNER)(\w+))?", re.I
+)
+
+
+class CapturingCursor:
+    def __init__(self, cursor, captured):
+        self.cursor = cursor
+        self.captured = captured
+
+    def execute(self, query, params=()):
+        key = (tracing.current_method() or "-", tracing.fingerprint(query))
+        self.captured.setdefault(key, (query, tuple(params or ())))
+        return self.cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class CapturingBackend:
+    """Backend proxy keeping the first query and parameters of each distinct
+    statement, by calling Database method."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.captured = {}
+
+    def cursor(self, connection, dictionary=False):
+        return CapturingCursor(self.backend.cursor(connection, dictionary), self.captured)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+def run_workload(db, ids):
+    """Call every Database query at least once on the seeded data."""
+    today = db.clock.today()
+    patient_id = ids["patients"][len(ids["patients"]) // 2]
+    schedule_id = ids["schedules"][len(ids["schedules"]) // 2]
+    medicine_id = ids["medicines"][0]
+
+    user = db.get_user_by_id(patient_id)
+    db.get_user(user["username"])
+    db.get_user_id_by_username(user["username"])
+    db.get_all_doctors()
+
+    db.generate_medicine_logs(today)
+    db.generate_medicine_logs(today, patient_id)
+    db.generate_medicine_logs_for_schedule(schedule_id, today + timedelta(days=1))
+    db.materialize_logs(db.get_patient_ids(limit=500))
+    logs = db.get_medicine_logs(patient_id, today)
+    db.get_medicine_logs(patient_id)
+    if logs:
+        db.update_medicine_log(logs[0]["id"], "taken", db.clock.now())
+    rows, next_key = db.get_medicine_log_page(patient_id, newest_first=True, page_size=50)
+    db.get_medicine_log_page(patient_id, after=next_key, status="taken", page_size=50)
+    db.get_medicine_log_page(
+        patient_id, start_date=today - timedelta(days=30), end_date=today, medicine_id=medicine_id, page_size=50
+    )
+    for _ in db.iter_medicine_log_history(patient_id, page_size=500):
+        pass
+    db.mark_missed_medicine_logs(full=True)
+    db.mark_missed_medicine_logs()
+
+    db.get_patient_medicine_schedules(patient_id)
+    schedule = db.get_schedule_by_id(schedule_id)
+    db.update_medicine_schedule(
+        schedule_id=schedule_id,
+        medicine_id=schedule["medicine_id"],
+        dosage=schedule["dosage"],
+        frequency=schedule["frequency"],
+        start_date=today,
+        end_date=schedule["end_date"],
+        time_slots=schedule["time_slots"],
+    )
+    db.delete_future_logs(schedule_id)
+    new_schedule = db.add_medicine_schedule(
+        patient_id=patient_id,
+        medicine_id=medicine_id,
+        prescription_id=None,
+        dosage="1 tablet",
+        frequency="daily",
+        start_date=today,
+        end_date=today + timedelta(days=7),
+        time_slots="08:00",
+    )
+    db.delete_medicine_schedule(new_schedule)
+
+    db.get_expiring_medicines(patient_id)
+    db.get_all_medicines()
+    db.get_medicine_by_id(medicine_id)
+    new_medicine = db.add_medicine(
+        "Plan check", "Added by the plan check", 1, today, today + timedelta(days=365), "Plan Labs", "PLAN",
+        "Room temperature", False,
+    )
+    db.update_medicine_quantity(new_medicine, 2)
+    db.remove_medicine(new_medicine)
+
+    db.get_patient_prescriptions(patient_id)
+    prescription_id = db.add_prescription(patient_id, notes="Plan check")
+    db.delete_prescription(prescription_id)
+
+
+def explain(db, query, params):
+    """The plan of ``query`` as a list of steps, each a dict with the table
+    read, whether it is read in full and whether it sorts."""
+    aliases = {}
+    for table, alias in TABLE_ALIASES.findall(query):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+
+    steps = []
+    with db.pool.connection() as connection:
+        if db.backend.name == "sqlite":
+            cursor = db.backend.cursor(connection)
+            cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+            for _, _, _, detail in cursor.fetchall():
+                match = re.match(r"(SCAN|SEARCH) (\w+)", detail)
+                table = match and match.group(2) != "CONSTANT" and aliases.get(match.group(2), match.group(2))
+                steps.append({
+                    "table": table or None,
+                    "full_scan": bool(table) and match.group(1) == "SCAN",
+                    "sort": "TEMP B-TREE" in detail,
+                    "equality": bool(table) and match.group(1) == "SEARCH" and bool(re.search(r"\w=\?", detail)),
+                    "detail": detail,
+                })
+        else:
+            cursor = db.backend.cursor(connection, dictionary=True)
+            cursor.execute("EXPLAIN " + query, params)
+            for row in cursor.fetchall():
+                extra = row.get("Extra") or ""
+                steps.append({
+                    "table": aliases.get(row["table"], row["table"]),
+                    "full_scan": row["type"] in ("ALL", "index"),
+                    "sort": "Using filesort" in extra or "Using temporary" in extra,
+                    "equality": row["type"] in ("system", "const", "eq_ref", "ref"),
+                    "detail": f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {extra}",
+                })
+        cursor.close()
+    return steps
+
+
+def check(method, fingerprint, steps):
+    problems = []
+    tables = [step for step in steps if step["table"]]
+    bounded = bool(tables) and tables[0]["equality"]
+    for step in steps:
+        if step["full_scan"] and step["table"] in LARGE_TABLES and fingerprint not in ALLOWED_SCANS:
+            problems.append(f"full scan of {step['table']}")
+    if method in HOT_METHODS and not bounded and any(step["sort"] for step in steps):
+        problems.append("sort without an index")
+    return problems
+
+
+def analyze(db):
+    # Fresh statistics, as a long-running clinic database would have
+    with db.pool.connection() as connection:
+        cursor = db.backend.cursor(connection)
+        if db.backend.name == "sqlite":
+            cursor.execute("ANALYZE")
+        else:
+            cursor.execute("ANALYZE TABLE " + ", ".join(sorted(LARGE_TABLES | {"medicines"})))
+            cursor.fetchall()
+        cursor.close()
+        connection.commit()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.plan_check", description=__doc__.split("\n")[0])
+    add_backend_arguments(parser)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--medicines", type=int, default=200)
+    parser.add_argument("--history-days", type=int, default=60)
+    parser.add_argument("--no-analyze", action="store_true", help="check the plans without fresh statistics")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="print every plan, not only failing ones")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    backend = backend_from_args(args)
+    reset_database(backend)
+    db = open_database(backend)
+    ids = datagen.generate(
+        db, patients=args.patients, medicines=args.medicines, history_days=args.history_days, seed=args.seed
+    )
+    if not args.no_analyze:
+        analyze(db)
+
+    # Statements are attributed to the Database method that issued them
+    if not isinstance(db.backend, tracing.TracedBackend):
+        tracing.instrument(db)
+    capturing = CapturingBackend(db.backend)
+    db.backend = capturing
+    run_workload(db, ids)
+    db.backend = capturing.backend
+
+    failures = 0
+    checked = 0
+    for (method, fingerprint), (query, params) in sorted(capturing.captured.items()):
+        if not query.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+            continue
+        steps = explain(db, query, params)
+        problems = check(method, fingerprint, steps)
+        checked += 1
+        failures += bool(problems)
+        if problems or args.verbose:
+            print(f"{'FAIL' if problems else 'ok':4} {method}: {fingerprint[:110]}")
+            for problem in problems:
+                print(f"       {problem}")
+            for step in steps:
+                print(f"       | {step['detail']}")
+
+    db.pool.close()
+    cleanup(args)
+    print(f"{checked} statements checked, {failures} failed", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
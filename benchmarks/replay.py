@@ -0,0 +1,141 @@
+"""Replay a recorded Database trace against any backend or build.
+
+    MEDICAL_APP_RECORD_TRACE=clinic.trace.gz python main.py    # record a session
+    python -m benchmarks.replay clinic.trace.gz --sqlite-path copy.db --pace fast
+
+Calls recorded on different threads are replayed on different threads, in
+their recorded order. ``--pace original`` keeps the recorded gaps between
+calls (``--speed 2`` halves them); ``--pace fast`` issues them back to back.
+Replay against a copy of the database the trace was recorded on, since the
+trace refers to its rows by id.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+from benchmarks.common import add_backend_arguments, backend_from_args, cleanup, open_database, summarize
+from src.recorder import read_trace
+
+
+def replay(db, entries, pace="fast", speed=1.0):
+    """Re-issue ``entries`` on ``db`` and return {method: result dict} with
+    the recorded and replayed durations of each call."""
+    by_thread = {}
+    # Generators are written when they finish, so restore call order first
+    for entry in sorted(entries, key=lambda entry: entry["t"]):
+        by_thread.setdefault(entry["th"], []).append(entry)
+
+    lock = threading.Lock()
+    outcomes = []  # (method, recorded seconds, replayed seconds, error name or None)
+    started = time.perf_counter()
+
+    def run(thread_entries):
+        for entry in thread_entries:
+            if pace == "original":
+                delay = entry["t"] / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            method = getattr(db, entry["m"])
+            call_started = time.perf_counter()
+            error = None
+            try:
+                result = method(**entry["a"])
+                if hasattr(result, "__next__"):
+                    for _ in result:
+                        pass
+            except Exception as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - call_started
+            with lock:
+                outcomes.append((entry["m"], entry["d"], elapsed, error, entry.get("e")))
+
+    threads = [
+        threading.Thread(target=run, args=(thread_entries,), name=f"replay-{number}")
+        for number, thread_entries in sorted(by_thread.items())
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    grouped = {}
+    for method, recorded, replayed, error, recorded_error in outcomes:
+        group = grouped.setdefault(method, {"recorded": [], "replayed": [], "errors": 0, "new_errors": 0})
+        group["recorded"].append(recorded)
+        group["replayed"].append(replayed)
+        if error:
+            group["errors"] += 1
+            if not recorded_error:
+                group["new_errors"] += 1
+
+    results = {}
+    for method, group in sorted(grouped.items()):
+        recorded = summarize(group["recorded"])
+        replayed = summarize(group["replayed"])
+        results[method] = {
+            "calls": replayed["calls"],
+            "recorded_p50_ms": recorded["p50_ms"],
+            "recorded_p95_ms": recorded["p95_ms"],
+            "p50_ms": replayed["p50_ms"],
+            "p95_ms": replayed["p95_ms"],
+            "p99_ms": replayed["p99_ms"],
+            "errors": group["errors"],
+            "new_errors": group["new_errors"],
+        }
+    return {"wall_seconds": round(wall, 3), "threads": len(threads), "calls": len(outcomes), "methods": results}
+
+
+def print_report(report, out=sys.stdout):
+    header = (
+        f"{'method':32} {'calls':>7} {'rec p50':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    )
+    print(header, file=out)
+    print("-" * len(header), file=out)
+    for method, r in report["methods"].items():
+        print(
+            f"{method:32} {r['calls']:>7} {r['recorded_p50_ms']:9.3f} {r['p50_ms']:9.3f} "
+            f"{r['p95_ms']:9.3f} {r['p99_ms']:9.3f} {r['errors']:>7}",
+            file=out,
+        )
+    print(f"{report['calls']} calls on {report['threads']} threads in {report['wall_seconds']:.2f}s", file=out)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.replay", description=__doc__.split("\n")[0])
+    parser.add_argument("trace", help="trace file written with MEDICAL_APP_RECORD_TRACE")
+    add_backend_arguments(parser)
+    parser.add_argument("--pace", choices=["original", "fast"], default="fast")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed-up factor for --pace original")
+    parser.add_argument("--pool-size", type=int, help="default: one connection per replay thread")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.backend == "sqlite" and not args.sqlite_path:
+        parser.error("--sqlite-path is required: replay against a copy of the recorded database")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    header, entries = read_trace(args.trace)
+    backend = backend_from_args(args)
+    threads = len({entry["th"] for entry in entries}) or 1
+    db = open_database(backend, pool_size=args.pool_size or threads)
+
+    report = replay(db, entries, pace=args.pace, speed=args.speed)
+    db.pool.close()
+    cleanup(args)
+
+    report["trace"] = {"path": args.trace, **header}
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+"""Fast-forward a clinic through simulated days and watch the costs evolve.
+
+    python -m benchmarks.simulate --patients 2000 --days 365 --sample-every 7
+
+The Database runs on a SimulatedClock. Each simulated day:
+
+* at 06:00 the materializer stores every dose due since the previous
+  run and the old ones still untouched are marked missed,
+* a few patients start new courses of treatment,
+* at 22:00 ``--dashboard-share`` of the patients open their dashboard and
+  take (or skip) their doses according to their adherence.
+
+Every ``--sample-every`` days it reports generation time, rows created,
+missed-dose sweep time, medicine_logs size and dashboard and history
+query latency.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import datagen
+from benchmarks.common import add_backend_arguments, backend_from_args, cleanup, reset_database, summarize
+from src import materializer
+from src.clock import SimulatedClock
+from src.database import Database, create_pool
+
+
+def table_size(db, table):
+    with db.pool.connection() as connection:
+        cursor = db.backend.cursor(connection)
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return count
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class Simulation:
+    def __init__(self, db, clock, ids, args):
+        self.db = db
+        self.clock = clock
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.patients = ids["patients"]
+        self.medicines = ids["medicines"]
+        self.adherence = {patient_id: self.rng.betavariate(4, 1) for patient_id in self.patients}
+
+    def run_day(self, day):
+        db = self.db
+        stats = {"day": day.isoformat()}
+
+        # Morning: the materializer stores the doses due since yesterday morning
+        self.clock.set(datetime.combine(day, datetime.min.time()) + timedelta(hours=6))
+        totals = materializer.run(db)
+        stats["generate_seconds"] = totals["seconds"]
+        stats["logs_created"] = totals["created"]
+        stats["missed"], stats["sweep_seconds"] = timed(db.mark_missed_medicine_logs)
+
+        # New courses of treatment
+        for _ in range(self._new_schedules()):
+            time_slots = self.rng.choices(
+                [slots for slots, _ in datagen.SLOT_MIXES], [weight for _, weight in datagen.SLOT_MIXES]
+            )[0]
+            db.add_medicine_schedule(
+                patient_id=self.rng.choice(self.patients),
+                medicine_id=self.rng.choice(self.medicines),
+                prescription_id=None,
+                dosage=self.rng.choice(datagen.DOSAGES),
+                frequency=datagen.FREQUENCIES[len(time_slots.split(","))],
+                start_date=day,
+                end_date=day + timedelta(days=self.rng.randint(5, 60)),
+                time_slots=time_slots,
+            )
+
+        # Evening: some patients open the app and catch up on the day's doses
+        self.clock.set(datetime.combine(day, datetime.min.time()) + timedelta(hours=22))
+        dashboard = []
+        marked = 0
+        visitors = self.rng.sample(self.patients, max(1, int(len(self.patients) * self.args.dashboard_share)))
+        for patient_id in visitors:
+            logs, elapsed = timed(db.get_medicine_logs, patient_id, day)
+            dashboard.append(elapsed)
+            for log in logs:
+                if log["status"] != "scheduled" or log["scheduled_time"] > self.clock.now():
+                    continue
+                if self.rng.random() < self.adherence[patient_id]:
+                    taken_time = log["scheduled_time"] + timedelta(minutes=self.rng.randint(0, 90))
+                    db.update_medicine_log(log["id"], "taken", taken_time)
+                else:
+                    db.update_medicine_log(log["id"], "skipped")
+                marked += 1
+        stats["doses_marked"] = marked
+
+        dashboard_summary = summarize(dashboard)
+        stats["dashboard_p50_ms"] = dashboard_summary["p50_ms"]
+        stats["dashboard_p95_ms"] = dashboard_summary["p95_ms"]
+        return stats
+
+    def sample(self, stats):
+        # Heavier measurements, only on sampled days
+        db = self.db
+        history = []
+        for patient_id in self.rng.sample(self.patients, min(20, len(self.patients))):
+            _, elapsed = timed(db.get_medicine_log_page, patient_id, newest_first=True, page_size=100)
+            history.append(elapsed)
+        history_summary = summarize(history)
+        stats["history_page_p50_ms"] = history_summary["p50_ms"]
+        stats["history_page_p95_ms"] = history_summary["p95_ms"]
+        stats["medicine_logs"] = table_size(db, "medicine_logs")
+        stats["medicine_schedules"] = table_size(db, "medicine_schedules")
+        return stats
+
+    def _new_schedules(self):
+        expected = len(self.patients) * self.args.new_schedule_rate
+        return int(expected) + (1 if self.rng.random() < expected % 1 else 0)
+
+
+COLUMNS = [
+    ("day", "{:>10}"),
+    ("generate_seconds", "{:>9.3f}"),
+    ("logs_created", "{:>8}"),
+    ("sweep_seconds", "{:>8.3f}"),
+    ("missed", "{:>7}"),
+    ("medicine_logs", "{:>10}"),
+    ("dashboard_p50_ms", "{:>9.2f}"),
+    ("dashboard_p95_ms", "{:>9.2f}"),
+    ("history_page_p50_ms", "{:>9.2f}"),
+]
+HEADERS = ["day", "gen s", "created", "sweep s", "missed", "logs", "dash p50", "dash p95", "hist p50"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.simulate", description=__doc__.split("\n")[0])
+    add_backend_arguments(parser)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--medicines", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--start", help="first simulated day, YYYY-MM-DD (default: today)")
+    parser.add_argument("--history-days", type=int, default=30, help="dose history to seed before the start")
+    parser.add_argument("--dashboard-share", type=float, default=0.1, help="share of patients using the app daily")
+    parser.add_argument(
+        "--new-schedule-rate", type=float, default=0.01, help="new schedules per patient per day"
+    )
+    parser.add_argument("--sample-every", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the sampled days as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = datetime.strptime(args.start, "%Y-%m-%d") if args.start else datetime.combine(
+        datetime.now().date(), datetime.min.time()
+    )
+    clock = SimulatedClock(start)
+    backend = backend_from_args(args)
+    reset_database(backend)
+    db = Database(pool=create_pool(backend), backend=backend, fixtures=False, clock=clock)
+
+    ids = datagen.generate(
+        db, patients=args.patients, medicines=args.medicines, history_days=args.history_days, seed=args.seed
+    )
+    simulation = Simulation(db, clock, ids, args)
+
+    print(" ".join(f"{header:>{10 if i == 0 else 9}}" for i, header in enumerate(HEADERS)))
+    samples = []
+    started = time.perf_counter()
+    for offset in range(args.days):
+        day = start.date() + timedelta(days=offset)
+        stats = simulation.run_day(day)
+        if offset % args.sample_every == 0 or offset == args.days - 1:
+            stats = simulation.sample(stats)
+            samples.append(stats)
+            print(" ".join(format.format(stats[name]) for name, format in COLUMNS))
+
+    print(f"Simulated {args.days} days in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    db.pool.close()
+    cleanup(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "samples": samples}, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
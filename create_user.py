@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from src.database import Database
+from src.database import get_database
 
 class CreateUserWindow:
     def __init__(self):
@@ -35,7 +35,7 @@ class CreateUserWindow:
         
     def create_user(self):
         try:
-            db = Database()
+            db = get_database()
             db.add_user(
                 username=self.username.get(),
                 password=self.password.get(),
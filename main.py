@@ -1,8 +1,31 @@
-import tkinter as tk
+import argparse
+
+from src import startup
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Medical Management System")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print import times and time to first paint once the database is connected",
+    )
+    return parser.parse_args(argv)
 
-from src.ui.home import HomeApp
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.profile_startup:
+        startup.start_profile()
+
+    # Imported here so the profile covers them
+    import tkinter as tk
+    from src.ui import watchdog
+    from src.ui.home import HomeApp
+
+    startup.mark("imports done")
     root = tk.Tk()
     app = HomeApp(root)
+    startup.mark("login window created")
+    watchdog.start(root)
     root.mainloop()
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from src.database import get_database
+
+
+class AsyncDatabase:
+    """Awaitable facade over Database.
+
+    Every public Database method is available as a coroutine, e.g.
+    ``await db.get_medicine_logs(patient_id, today)``. Calls run on a pool of
+    worker threads, so independent queries can be overlapped with
+    ``asyncio.gather``. ``submit`` returns a ``concurrent.futures.Future`` for
+    callers that are not running an event loop.
+
+    The facade wraps the process-wide Database by default, so it shares its
+    connection pool and cache with the rest of the app; keep ``workers`` below
+    config.POOL_SIZE to leave connections for the other threads. Generator
+    methods (history iteration) and context managers (``transaction()``) are
+    tied to the thread that uses them and are not available here; use
+    ``database`` directly for those.
+    """
+
+    def __init__(self, workers=4, database=None):
+        self.workers = workers
+        self.database = database or get_database()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-worker")
+
+    def __getattr__(self, name):
+        method = self._method(name)
+        if name.startswith("_") or not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(method, *args, **kwargs)
+            )
+
+        return call
+
+    def submit(self, method_name, *args, **kwargs):
+        method = self._method(method_name)
+        return self._executor.submit(method, *args, **kwargs)
+
+    def _method(self, name):
+        # Checked on the class, as tracing and the recorder wrap the instance's methods
+        unbound = getattr(type(self.database), name, None)
+        if inspect.isfunction(unbound) and inspect.isgeneratorfunction(inspect.unwrap(unbound)):
+            raise AttributeError(f"{name} is a generator or context manager; call it on AsyncDatabase.database")
+        return getattr(self.database, name)
+
+    async def load_dashboard(self, patient_id, for_date):
+        """Fetch everything the patient dashboard shows, overlapping the
+        independent queries. Returns (logs for the day, expiring medicines).
+        Due doses are stored by src/materializer.py, not here."""
+        return await asyncio.gather(
+            self.get_medicine_logs(patient_id, for_date), self.get_expiring_medicines(patient_id)
+        )
+
+    def close(self):
+        # The Database outlives the facade
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -0,0 +1,227 @@
+import sqlite3
+from datetime import date, datetime
+
+from src import config
+
+
+class MySQLBackend:
+    name = "mysql"
+    insert_ignore = "INSERT IGNORE"
+    # MySQL commits implicitly around DDL, so migrations commit one at a time
+    transactional_ddl = False
+    migration_lock = "medical_management_migrations"
+    migration_lock_timeout = 60
+
+    def __init__(self, database=None, **connect_args):
+        # Imported here so SQLite-only installs don't need the MySQL driver
+        import mysql.connector
+
+        self.mysql = mysql.connector
+        self.database = database or config.DB_NAME
+        self.connect_args = connect_args or dict(config.DB_CONFIG)
+
+    def connect(self):
+        from mysql.connector import errorcode
+
+        try:
+            return self.mysql.connect(database=self.database, **self.connect_args)
+        except self.mysql.errors.ProgrammingError as e:
+            if e.errno != errorcode.ER_BAD_DB_ERROR:
+                raise
+
+        # First run against this server: create the database, then select it
+        connection = self.mysql.connect(**self.connect_args)
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+        cursor.execute(f"USE {self.database}")
+        cursor.close()
+        return connection
+
+    def health_check(self, connection):
+        return connection.is_connected()
+
+    def cursor(self, connection, dictionary=False):
+        return connection.cursor(dictionary=dictionary)
+
+    def begin(self, connection):
+        connection.start_transaction()
+
+    def add_minutes(self, datetime_sql, minutes_sql):
+        return f"DATE_ADD({datetime_sql}, INTERVAL {minutes_sql} MINUTE)"
+
+    def upsert(self, table, columns, key, rows=1):
+        updates = ", ".join(f"{column} = VALUES({column})" for column in columns if column not in key)
+        return f"{_insert(table, columns, rows)} ON DUPLICATE KEY UPDATE {updates}"
+
+    def options(self):
+        # Enough to open the same database from another process
+        return {"database": self.database, **self.connect_args}
+
+    def is_missing_table_error(self, error):
+        from mysql.connector import errorcode
+
+        return (
+            isinstance(error, self.mysql.errors.ProgrammingError)
+            and error.errno == errorcode.ER_NO_SUCH_TABLE
+        )
+
+    def acquire_migration_lock(self, connection):
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT GET_LOCK(%s, %s)", (self.migration_lock, self.migration_lock_timeout)
+        )
+        acquired = cursor.fetchone()[0]
+        cursor.close()
+        if not acquired:
+            raise Exception("Timed out waiting for another client to finish migrating the schema")
+
+    def release_migration_lock(self, connection):
+        cursor = connection.cursor()
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (self.migration_lock,))
+        cursor.fetchone()
+        cursor.close()
+
+
+def _insert(table, columns, rows):
+    placeholders = f"({', '.join(['%s'] * len(columns))})"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * rows)}"
+
+
+def _convert_date(value):
+    return date.fromisoformat(value.decode())
+
+
+def _convert_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", _convert_date)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_datetime)
+
+
+class SQLiteCursor:
+    """Gives sqlite3 cursors the mysql.connector surface Database relies on:
+    ``%s`` placeholders and optional dict rows."""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace("%s", "?"), tuple(params))
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(query.replace("%s", "?"), seq_of_params)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is None or not self._dictionary:
+            return row
+        return self._to_dict(row)
+
+    def fetchmany(self, size=1):
+        return self._rows(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def _rows(self, rows):
+        if not self._dictionary:
+            return rows
+        return [self._to_dict(row) for row in rows]
+
+    def _to_dict(self, row):
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    insert_ignore = "INSERT OR IGNORE"
+    transactional_ddl = True
+
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA foreign_keys = ON",
+        "PRAGMA busy_timeout = 5000",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -20000",
+        "PRAGMA mmap_size = 268435456",
+    )
+
+    def __init__(self, path=None):
+        self.path = path or config.SQLITE_PATH
+
+    def connect(self):
+        # Pooled connections move between threads, one borrower at a time
+        connection = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+        )
+        for pragma in self.PRAGMAS:
+            connection.execute(pragma)
+        return connection
+
+    def health_check(self, connection):
+        connection.execute("SELECT 1").fetchone()
+        return True
+
+    def cursor(self, connection, dictionary=False):
+        return SQLiteCursor(connection.cursor(), dictionary)
+
+    def begin(self, connection):
+        connection.execute("BEGIN")
+
+    def add_minutes(self, datetime_sql, minutes_sql):
+        # Same "YYYY-MM-DD HH:MM:SS" text the datetime adapter stores
+        return f"datetime({datetime_sql}, '+' || {minutes_sql} || ' minutes')"
+
+    def upsert(self, table, columns, key, rows=1):
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in key)
+        return f"{_insert(table, columns, rows)} ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}"
+
+    def options(self):
+        return {"path": self.path}
+
+    def is_missing_table_error(self, error):
+        return isinstance(error, sqlite3.OperationalError) and "no such table" in str(error)
+
+    def acquire_migration_lock(self, connection):
+        # Takes the database write lock until the migration transaction commits
+        connection.execute("BEGIN IMMEDIATE")
+
+    def release_migration_lock(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
+
+
+BACKENDS = {
+    MySQLBackend.name: MySQLBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
+def create_backend(name=None, **options):
+    name = name or config.DB_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown database backend: {name}")
+    return BACKENDS[name](**options)
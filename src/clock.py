@@ -0,0 +1,43 @@
+import threading
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Wall-clock time. Database and the screens read the time through a
+    clock so simulations and tests can substitute their own."""
+
+    def now(self):
+        return datetime.now()
+
+    def today(self):
+        return datetime.now().date()
+
+
+class SimulatedClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self, start=None):
+        self._now = start or datetime.now()
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            return self._now
+
+    def today(self):
+        return self.now().date()
+
+    def set(self, moment):
+        with self._lock:
+            if moment < self._now:
+                raise ValueError("A simulated clock cannot go backwards")
+            self._now = moment
+
+    def advance(self, **delta):
+        # e.g. clock.advance(days=1) or clock.advance(minutes=30)
+        with self._lock:
+            self._now += timedelta(**delta)
+            return self._now
+
+
+SYSTEM_CLOCK = SystemClock()
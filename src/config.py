@@ -0,0 +1,60 @@
+import os
+
+# Storage backend: "mysql" for a shared server, "sqlite" for a single-clinic install
+DB_BACKEND = os.environ.get("MEDICAL_APP_DB_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("MEDICAL_APP_SQLITE_PATH", "medical_management.db")
+
+# MySQL connection settings, overridable from the environment for clinic installs
+DB_CONFIG = {
+    "host": os.environ.get("MEDICAL_APP_DB_HOST", "localhost"),
+    "port": int(os.environ.get("MEDICAL_APP_DB_PORT", "3306")),
+    "user": os.environ.get("MEDICAL_APP_DB_USER", "root"),
+    "password": os.environ.get("MEDICAL_APP_DB_PASSWORD", "1234"),
+}
+DB_NAME = os.environ.get("MEDICAL_APP_DB_NAME", "medical_management")
+
+# Connection pool settings
+POOL_SIZE = int(os.environ.get("MEDICAL_APP_POOL_SIZE", "5"))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get("MEDICAL_APP_POOL_CHECKOUT_TIMEOUT", "10"))
+POOL_IDLE_TIMEOUT = float(os.environ.get("MEDICAL_APP_POOL_IDLE_TIMEOUT", "300"))
+POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("MEDICAL_APP_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# In-process cache for users, doctors and the medicine catalog
+CACHE_SIZE = int(os.environ.get("MEDICAL_APP_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.environ.get("MEDICAL_APP_CACHE_TTL", "300"))
+# Parsed time slots, one entry per schedule
+SLOT_CACHE_SIZE = int(os.environ.get("MEDICAL_APP_SLOT_CACHE_SIZE", "20000"))
+
+# Load the demo users, medicines and schedules into an empty database
+LOAD_FIXTURES = os.environ.get("MEDICAL_APP_FIXTURES", "").lower() in ("1", "true", "yes")
+
+# Per-query tracing; statements slower than SLOW_QUERY_MS go to a rotating log
+TRACING = os.environ.get("MEDICAL_APP_TRACING", "1").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.environ.get("MEDICAL_APP_SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.environ.get("MEDICAL_APP_SLOW_QUERY_LOG", "slow_queries.log")
+SLOW_QUERY_LOG_BYTES = int(os.environ.get("MEDICAL_APP_SLOW_QUERY_LOG_BYTES", str(1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.environ.get("MEDICAL_APP_SLOW_QUERY_LOG_BACKUPS", "3"))
+
+# Prometheus-format metrics: served on METRICS_HOST:METRICS_PORT and/or
+# rewritten to METRICS_FILE every METRICS_INTERVAL seconds. Off when both are unset.
+METRICS_PORT = int(os.environ.get("MEDICAL_APP_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("MEDICAL_APP_METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("MEDICAL_APP_METRICS_FILE", "")
+METRICS_INTERVAL = float(os.environ.get("MEDICAL_APP_METRICS_INTERVAL", "15"))
+
+# The UI watchdog logs the Tk thread's stack when the event loop stalls for
+# longer than STALL_THRESHOLD_MS (0 turns it off), to a rotating log.
+STALL_THRESHOLD_MS = float(os.environ.get("MEDICAL_APP_STALL_THRESHOLD_MS", "150"))
+STALL_LOG = os.environ.get("MEDICAL_APP_STALL_LOG", "ui_stalls.log")
+STALL_LOG_BYTES = int(os.environ.get("MEDICAL_APP_STALL_LOG_BYTES", str(1024 * 1024)))
+STALL_LOG_BACKUPS = int(os.environ.get("MEDICAL_APP_STALL_LOG_BACKUPS", "3"))
+
+# Due doses are stored for every patient every MATERIALIZE_INTERVAL seconds
+# (0 turns the in-app job off, e.g. when `python -m src.materializer` runs instead)
+MATERIALIZE_INTERVAL = float(os.environ.get("MEDICAL_APP_MATERIALIZE_INTERVAL", "300"))
+MATERIALIZE_BATCH_SIZE = int(os.environ.get("MEDICAL_APP_MATERIALIZE_BATCH_SIZE", "500"))
+
+# Record every Database call to this gzipped trace file for benchmarks/replay.py.
+# Free-text arguments are pseudonymized unless RECORD_ANONYMIZE is off.
+RECORD_TRACE = os.environ.get("MEDICAL_APP_RECORD_TRACE", "")
+RECORD_ANONYMIZE = os.environ.get("MEDICAL_APP_RECORD_ANONYMIZE", "1").lower() in ("1", "true", "yes")
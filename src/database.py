@@ -1,137 +1,293 @@
-import mysql.connector as mysql
-from datetime import date, timedelta, datetime
+from contextlib import contextmanager
+from datetime import timedelta, datetime
 import os
 import shutil
+import threading
+
+from src import config, migrations, recorder, timeslots, tracing
+from src.backends import create_backend
+from src.cache import TTLCache
+from src.clock import SYSTEM_CLOCK
+from src.occurrences import (
+    diff_occurrences,
+    iter_occurrences,
+    merge_logs,
+    parse_virtual_id,
+    to_date,
+    virtual_logs,
+)
+from src.pool import ConnectionPool
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+_database = None
+_database_lock = threading.Lock()
+
+# get_medicine_logs without a date covers today and this many days ahead
+UPCOMING_DAYS = 7
+# Rows per multi-row INSERT when generating logs
+LOG_BATCH_SIZE = 500
+# Minutes after its time an untouched dose counts as missed, unless its
+# schedule sets missed_after_minutes (at most MAX_MISSED_AFTER_MINUTES)
+MISSED_AFTER_MINUTES = 60
+MAX_MISSED_AFTER_MINUTES = 24 * 60
+# The missed-dose sweep updates one chunk of scheduled_time per statement
+SWEEP_CHUNK = timedelta(days=1)
+MISSED_SWEEP_JOB = "missed_sweep"
+# Dose history is read in keyset pages, streamed from the cursor in chunks
+HISTORY_PAGE_SIZE = 500
+HISTORY_FETCH_SIZE = 100
+
+
+def create_pool(backend, size=None):
+    return ConnectionPool(
+        backend.connect,
+        size=size or config.POOL_SIZE,
+        checkout_timeout=config.POOL_CHECKOUT_TIMEOUT,
+        idle_timeout=config.POOL_IDLE_TIMEOUT,
+        health_check_interval=config.POOL_HEALTH_CHECK_INTERVAL,
+        health_check=backend.health_check,
+    )
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _backend, _pool
+    with _pool_lock:
+        if _pool is None:
+            _backend = create_backend()
+            _pool = create_pool(_backend)
+        return _pool
+
+
+def get_backend():
+    """Return the backend configured for this process (see config.DB_BACKEND)."""
+    get_pool()
+    return _backend
+
+
+def get_database():
+    """Return the process-wide Database shared by every screen."""
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database()
+            # Only this instance records: materializer workers and benchmarks
+            # build their own Databases, and each recorder truncates the trace
+            if config.RECORD_TRACE:
+                recorder.record(_database)
+        return _database
+
+
+def _day_start(value):
+    # Lower bound of a half-open [day, next day) range that can use an index
+    return datetime.combine(to_date(value), datetime.min.time())
+
+
+def expand_occurrences(schedules, start_date, end_date, slots=None, until=None):
+    """Return (schedule_id, scheduled_time) for every dose of ``schedules``
+    falling on a day between ``start_date`` and ``end_date`` (inclusive),
+    and before ``until`` when given.
+
+    ``slots`` maps schedule ids to their minutes of day (see
+    Database._schedule_slots); other schedules have their time_slots parsed.
+    """
+    start = _day_start(start_date)
+    end = _day_start(end_date) + timedelta(days=1)
+    if until is not None:
+        end = min(end, until)
+    occurrences = []
+    for schedule in schedules:
+        minutes = slots.get(schedule["id"]) if slots else None
+        if minutes is None:
+            minutes = timeslots.parse(schedule["time_slots"])
+        occurrences.extend(
+            (schedule["id"], scheduled_time) for scheduled_time in iter_occurrences(schedule, minutes, start, end)
+        )
+    return occurrences
 
 
-class Database:
-    connection: mysql.MySQLConnection
+def missed_after(schedule):
+    minutes = schedule.get("missed_after_minutes")
+    return MISSED_AFTER_MINUTES if minutes is None else minutes
 
-    def __init__(self):
-        self.connection = mysql.connect(
-            host="localhost", user="root", password="1234"
-        )
-        self.create_database()
-        self.create_tables()
-        self.add_sample_medicines()
-        self.add_sample_users()
 
-    def get_user_by_id(self, user_id):
-        cursor = self.connection.cursor(dictionary=True)
-        query = "SELECT * FROM users WHERE id = %s"
-        cursor.execute(query, (user_id,))
-        user = cursor.fetchone()
-        cursor.close()
-        return user
-
-    def create_database(self):
-        cursor = self.connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS medical_management")
-        cursor.execute("USE medical_management")
-        cursor.close()
-
-    def create_tables(self):
-        cursor = self.connection.cursor()
-
-        # Users table
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(100) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            email VARCHAR(255) UNIQUE,
-            full_name VARCHAR(255) NOT NULL,
-            user_type ENUM('patient', 'doctor', 'admin') NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-        )
+def next_watermark(schedule, minutes, until):
+    # The schedule's first dose at or after ``until``: none is due before it,
+    # so the materializer can leave the schedule alone until then
+    end = max(until, _day_start(schedule["start_date"])) + timedelta(days=2)
+    for scheduled_time in iter_occurrences(schedule, minutes, until, end):
+        return scheduled_time
+    return end  # Ended: past end_date, so never selected again
 
-        # Medicines table
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS medicines (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            details TEXT,
-            quantity INT NOT NULL,
-            stocked_on DATE NOT NULL,
-            expires_on DATE,
-            manufacturer VARCHAR(255),
-            batch_no VARCHAR(100),
-            storage VARCHAR(100),
-            prescription BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-        """
-        )
 
-        # Prescriptions table
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS prescriptions (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            patient_id INT NOT NULL,
-            doctor_id INT,
-            prescription_date DATE NOT NULL,
-            notes TEXT,
-            file_path VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY (doctor_id) REFERENCES users(id) ON DELETE SET NULL
-        )
-        """
-        )
+def initial_log_status(scheduled_time, now, missed_after_minutes=MISSED_AFTER_MINUTES):
+    # Doses already past their grace period are recorded as missed
+    if now - scheduled_time > timedelta(minutes=missed_after_minutes):
+        return "missed"
+    return "scheduled"
 
-        # Medicine schedules table
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS medicine_schedules (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            patient_id INT NOT NULL,
-            medicine_id INT NOT NULL,
-            prescription_id INT,
-            dosage VARCHAR(100) NOT NULL,
-            frequency VARCHAR(100) NOT NULL,
-            start_date DATE NOT NULL,
-            end_date DATE,
-            time_slots TEXT NOT NULL,
-            notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY (medicine_id) REFERENCES medicines(id) ON DELETE CASCADE,
-            FOREIGN KEY (prescription_id) REFERENCES prescriptions(id) ON DELETE SET NULL
-        )
-        """
-        )
 
-        # Medicine logs table
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS medicine_logs (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            schedule_id INT NOT NULL,
-            scheduled_time DATETIME NOT NULL,
-            taken_time DATETIME,
-            status ENUM('scheduled', 'taken', 'missed', 'skipped') DEFAULT 'scheduled',
-            notes TEXT,
-            FOREIGN KEY (schedule_id) REFERENCES medicine_schedules(id) ON DELETE CASCADE
-        )
+def _check_missed_after(minutes):
+    if not 0 <= int(minutes) <= MAX_MISSED_AFTER_MINUTES:
+        raise ValueError(f"A dose must count as missed within {MAX_MISSED_AFTER_MINUTES} minutes")
+
+
+class Database:
+    pool: ConnectionPool
+
+    def __init__(self, pool=None, fixtures=None, backend=None, clock=None):
+        self.backend = backend or get_backend()
+        # Every "now" and "today" below comes from the clock, so a simulation can move time
+        self.clock = clock or SYSTEM_CLOCK
+        if pool is None:
+            pool = create_pool(backend) if backend else get_pool()
+        self.pool = pool
+        # Reference data (users, doctors, the medicine catalog) is read far
+        # more often than it changes; writes below invalidate exact keys
+        self.cache = TTLCache(maxsize=config.CACHE_SIZE, ttl=config.CACHE_TTL)
+        # (time_slots, minutes of day) by (schedule id, updated_at)
+        self.slot_cache = TTLCache(maxsize=config.SLOT_CACHE_SIZE, ttl=config.CACHE_TTL)
+        # Per-thread state of an open transaction() block
+        self._local = threading.local()
+        # Running totals for monitoring, see work_stats()
+        self._stats = {
+            "transactions_committed": 0,
+            "transactions_rolled_back": 0,
+            "logs_created": 0,
+            "logs_skipped": 0,
+        }
+        self._stats_lock = threading.Lock()
+        if config.TRACING:
+            tracing.instrument(self)
+        # Set by get_database() when recording a trace
+        self.recorder = None
+        self.migrate_schema()
+
+        if fixtures is None:
+            fixtures = config.LOAD_FIXTURES
+        if fixtures:
+            self.load_fixtures()
+
+    @contextmanager
+    def transaction(self):
+        """Run several Database calls as one unit of work.
+
+        Calls made on this thread inside the block share one connection and
+        skip their own commits; the block commits once on exit and rolls back
+        if it raises. Nested blocks use savepoints, so an inner failure only
+        undoes the inner block.
         """
-        )
+        local = self._local
+        connection = getattr(local, "connection", None)
+        if connection is not None:
+            local.depth += 1
+            savepoint = f"unit_of_work_{local.depth}"
+            cursor = self.backend.cursor(connection)
+            cursor.execute(f"SAVEPOINT {savepoint}")
+            try:
+                yield self
+            except BaseException:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+                raise
+            else:
+                cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+            finally:
+                cursor.close()
+                local.depth -= 1
+            return
+
+        with self.pool.connection() as connection:
+            self.backend.begin(connection)
+            local.connection = connection
+            local.depth = 0
+            local.stale = set()
+            try:
+                yield self
+            except BaseException:
+                connection.rollback()
+                self._count("transactions_rolled_back")
+                raise
+            else:
+                connection.commit()
+                self._count("transactions_committed")
+            finally:
+                local.connection = None
+                # Drop anything another thread cached while this block was open
+                self.cache.invalidate(*local.stale)
+
+    def in_transaction(self):
+        return getattr(self._local, "connection", None) is not None
+
+    @contextmanager
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            yield connection
+            return
+        with self.pool.connection() as connection:
+            yield connection
+
+    def _commit(self, connection):
+        # Inside transaction() the block commits once on exit
+        if not self.in_transaction():
+            connection.commit()
+            self._count("transactions_committed")
+
+    def _cached(self, key, load, cache_none=True):
+        # Reads inside a transaction may see uncommitted rows; keep them out of the shared cache
+        if self.in_transaction():
+            return load()
+        return self.cache.get_or_load(key, load, cache_none)
+
+    def _invalidate(self, *keys):
+        self.cache.invalidate(*keys)
+        if self.in_transaction():
+            self._local.stale.update(keys)
 
-        self.connection.commit()
-        cursor.close()
+    def get_user_by_id(self, user_id):
+        def load():
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection, dictionary=True)
+                query = "SELECT * FROM users WHERE id = %s"
+                cursor.execute(query, (user_id,))
+                user = cursor.fetchone()
+                cursor.close()
+            return user
+
+        # Users added by another client must be found at once, so misses aren't cached
+        return self._cached(("user_id", int(user_id)), load, cache_none=False)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def work_stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def migrate_schema(self):
+        with self._connection() as connection:
+            applied = migrations.migrate(connection, self.backend)
+        return applied
+
+    def load_fixtures(self):
+        with self.transaction():
+            self.add_sample_medicines()
+            self.add_sample_users()
 
     def add_sample_users(self):
-        cursor = self.connection.cursor(dictionary=True)
-        cursor.execute("SELECT COUNT(*) as count FROM users")
-        result = cursor.fetchone()
-        count = result["count"]
-        cursor.close()
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            cursor.execute("SELECT COUNT(*) as count FROM users")
+            result = cursor.fetchone()
+            count = result["count"]
+            cursor.close()
 
         if count == 0:
             sample_users = [
@@ -191,7 +347,7 @@ class Database:
             with open(sample_prescription_path, "w") as f:
                 f.write("Sample prescription for patient John Smith\n")
                 f.write("Prescribed by Dr. Robert Johnson\n")
-                f.write("Date: " + date.today().strftime("%Y-%m-%d") + "\n\n")
+                f.write("Date: " + self.clock.today().strftime("%Y-%m-%d") + "\n\n")
                 f.write(
                     "1. Paracetamol 500mg - 1 tablet three times daily after meals for 7 days\n"
                 )
@@ -203,7 +359,7 @@ class Database:
             prescription_id = self.add_prescription(
                 patient_id=patient1_id,
                 doctor_id=doctor1_id,
-                prescription_date=date.today().strftime("%Y-%m-%d"),
+                prescription_date=self.clock.today().strftime("%Y-%m-%d"),
                 notes="Take medicines as prescribed. Follow up in 2 weeks.",
                 file_path=sample_prescription_path,
             )
@@ -218,8 +374,8 @@ class Database:
                     prescription_id=prescription_id,
                     dosage="1 tablet",
                     frequency="3 times daily",
-                    start_date=date.today().strftime("%Y-%m-%d"),
-                    end_date=(date.today() + timedelta(days=7)).strftime("%Y-%m-%d"),
+                    start_date=self.clock.today().strftime("%Y-%m-%d"),
+                    end_date=(self.clock.today() + timedelta(days=7)).strftime("%Y-%m-%d"),
                     time_slots="08:00,14:00,20:00",
                     notes="Take after meals",
                 )
@@ -231,21 +387,22 @@ class Database:
                     prescription_id=prescription_id,
                     dosage="1 tablet",
                     frequency="twice daily",
-                    start_date=date.today().strftime("%Y-%m-%d"),
-                    end_date=(date.today() + timedelta(days=5)).strftime("%Y-%m-%d"),
+                    start_date=self.clock.today().strftime("%Y-%m-%d"),
+                    end_date=(self.clock.today() + timedelta(days=5)).strftime("%Y-%m-%d"),
                     time_slots="09:00,21:00",
                     notes="Take with food to avoid stomach upset",
                 )
 
     def add_sample_medicines(self):
-        cursor = self.connection.cursor(dictionary=True)
-        cursor.execute("SELECT COUNT(*) as count FROM medicines")
-        result = cursor.fetchone()
-        count = result["count"]
-        cursor.close()
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            cursor.execute("SELECT COUNT(*) as count FROM medicines")
+            result = cursor.fetchone()
+            count = result["count"]
+            cursor.close()
 
         if count == 0:
-            today = date.today()
+            today = self.clock.today()
             sample_medicines = [
                 {
                     "name": "Paracetamol 500mg",
@@ -319,39 +476,46 @@ class Database:
 
     # User management methods
     def add_user(self, username, password, email, full_name, user_type):
-        cursor = self.connection.cursor()
-        query = """
-        INSERT INTO users (username, password, email, full_name, user_type)
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        values = (username, password, email, full_name, user_type)
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            query = """
+            INSERT INTO users (username, password, email, full_name, user_type)
+            VALUES (%s, %s, %s, %s, %s)
+            """
+            values = (username, password, email, full_name, user_type)
+
+            cursor.execute(query, values)
+            self._commit(connection)
+            last_id = cursor.lastrowid
+            cursor.close()
 
-        cursor.execute(query, values)
-        self.connection.commit()
-        last_id = cursor.lastrowid
-        cursor.close()
+        stale = [("user", username), ("user_id", last_id)]
+        if user_type == "doctor":
+            stale.append(("doctors",))
+        self._invalidate(*stale)
         return last_id
 
     def get_user_id_by_username(self, username):
-        cursor = self.connection.cursor(dictionary=True)
-        query = "SELECT id FROM users WHERE username = %s"
-        cursor.execute(query, (username,))
-        result = cursor.fetchone()
-        cursor.close()
-        return result["id"] if result else None
+        user = self.get_user(username)
+        return user["id"] if user else None
 
     def get_user(self, username):
-        cursor = self.connection.cursor(dictionary=True)
-        query = "SELECT * FROM users WHERE username = %s"
-        cursor.execute(query, (username,))
-        user = cursor.fetchone()
-        cursor.close()
-        return user
+        def load():
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection, dictionary=True)
+                query = "SELECT * FROM users WHERE username = %s"
+                cursor.execute(query, (username,))
+                user = cursor.fetchone()
+                cursor.close()
+            return user
+
+        # Not caching misses also keeps mistyped logins out of the cache
+        return self._cached(("user", username), load, cache_none=False)
 
     # Prescription management methods
     def add_prescription(self, patient_id, file_path=None, doctor_id=None, prescription_date=None, notes=None):
         if prescription_date is None:
-            prescription_date = date.today().strftime("%Y-%m-%d")
+            prescription_date = self.clock.today().strftime("%Y-%m-%d")
 
         # Create prescriptions directory if it doesn't exist
         if file_path:
@@ -366,52 +530,55 @@ class Database:
             shutil.copy2(file_path, new_path)
             file_path = new_path
 
-        cursor = self.connection.cursor()
-        query = """
-        INSERT INTO prescriptions (patient_id, doctor_id, prescription_date, notes, file_path)
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        values = (patient_id, doctor_id, prescription_date, notes, file_path)
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            query = """
+            INSERT INTO prescriptions (patient_id, doctor_id, prescription_date, notes, file_path)
+            VALUES (%s, %s, %s, %s, %s)
+            """
+            values = (patient_id, doctor_id, prescription_date, notes, file_path)
 
-        cursor.execute(query, values)
-        self.connection.commit()
-        last_id = cursor.lastrowid
-        cursor.close()
+            cursor.execute(query, values)
+            self._commit(connection)
+            last_id = cursor.lastrowid
+            cursor.close()
         return last_id
 
     def get_patient_prescriptions(self, patient_id):
-        cursor = self.connection.cursor(dictionary=True)
-        query = """
-        SELECT p.*, u.full_name as doctor_name 
-        FROM prescriptions p 
-        LEFT JOIN users u ON p.doctor_id = u.id 
-        WHERE p.patient_id = %s
-        ORDER BY p.prescription_date DESC
-        """
-        cursor.execute(query, (patient_id,))
-        prescriptions = cursor.fetchall()
-        cursor.close()
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            query = """
+            SELECT p.*, u.full_name as doctor_name 
+            FROM prescriptions p 
+            LEFT JOIN users u ON p.doctor_id = u.id 
+            WHERE p.patient_id = %s
+            ORDER BY p.prescription_date DESC
+            """
+            cursor.execute(query, (patient_id,))
+            prescriptions = cursor.fetchall()
+            cursor.close()
         return prescriptions
 
     def delete_prescription(self, prescription_id):
-        cursor = self.connection.cursor(dictionary=True)
-
-        # Get the file path before deleting
-        query = "SELECT file_path FROM prescriptions WHERE id = %s"
-        cursor.execute(query, (prescription_id,))
-        result = cursor.fetchone()
-
-        if result and result["file_path"] and os.path.exists(result["file_path"]):
-            try:
-                os.remove(result["file_path"])
-            except:
-                pass  # Continue even if file removal fails
-
-        # Delete prescription
-        query = "DELETE FROM prescriptions WHERE id = %s"
-        cursor.execute(query, (prescription_id,))
-        self.connection.commit()
-        cursor.close()
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+
+            # Get the file path before deleting
+            query = "SELECT file_path FROM prescriptions WHERE id = %s"
+            cursor.execute(query, (prescription_id,))
+            result = cursor.fetchone()
+
+            if result and result["file_path"] and os.path.exists(result["file_path"]):
+                try:
+                    os.remove(result["file_path"])
+                except:
+                    pass  # Continue even if file removal fails
+
+            # Delete prescription
+            query = "DELETE FROM prescriptions WHERE id = %s"
+            cursor.execute(query, (prescription_id,))
+            self._commit(connection)
+            cursor.close()
 
     # Medicine methods
     def add_medicine(
@@ -426,71 +593,86 @@ class Database:
         storage,
         prescription,
     ):
-        cursor = self.connection.cursor()
-        query = """
-        INSERT INTO medicines 
-        (name, details, quantity, stocked_on, expires_on, manufacturer, batch_no, storage, prescription)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        values = (
-            name,
-            details,
-            quantity,
-            stocked_on,
-            expires_on,
-            manufacturer,
-            batch_no,
-            storage,
-            prescription,
-        )
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            query = """
+            INSERT INTO medicines 
+            (name, details, quantity, stocked_on, expires_on, manufacturer, batch_no, storage, prescription)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """
+            values = (
+                name,
+                details,
+                quantity,
+                stocked_on,
+                expires_on,
+                manufacturer,
+                batch_no,
+                storage,
+                prescription,
+            )
 
-        cursor.execute(query, values)
-        self.connection.commit()
-        last_id = cursor.lastrowid
-        cursor.close()
+            cursor.execute(query, values)
+            self._commit(connection)
+            last_id = cursor.lastrowid
+            cursor.close()
+        self._invalidate(("medicines",))
         return last_id
 
     def get_all_medicines(self):
-        cursor = self.connection.cursor(dictionary=True)
-        query = "SELECT * FROM medicines ORDER BY name"
-        cursor.execute(query)
-        medicines = cursor.fetchall()
-        cursor.close()
-        return medicines
+        def load():
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection, dictionary=True)
+                query = "SELECT * FROM medicines ORDER BY name"
+                cursor.execute(query)
+                medicines = cursor.fetchall()
+                cursor.close()
+            return medicines
+
+        return self._cached(("medicines",), load)
 
     def get_medicine_by_id(self, medicine_id):
-        cursor = self.connection.cursor(dictionary=True)
-        query = "SELECT * FROM medicines WHERE id = %s"
-        cursor.execute(query, (medicine_id,))
-        medicine = cursor.fetchone()
-        cursor.close()
-        return medicine
+        def load():
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection, dictionary=True)
+                query = "SELECT * FROM medicines WHERE id = %s"
+                cursor.execute(query, (medicine_id,))
+                medicine = cursor.fetchone()
+                cursor.close()
+            return medicine
+
+        # Like the user lookups, a medicine added by another client must show up at once
+        return self._cached(("medicine", int(medicine_id)), load, cache_none=False)
 
     def update_medicine_quantity(self, medicine_id, new_quantity):
-        cursor = self.connection.cursor()
-        query = "UPDATE medicines SET quantity = %s WHERE id = %s"
-        cursor.execute(query, (new_quantity, medicine_id))
-        self.connection.commit()
-        cursor.close()
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            query = "UPDATE medicines SET quantity = %s WHERE id = %s"
+            cursor.execute(query, (new_quantity, medicine_id))
+            self._commit(connection)
+            cursor.close()
+        self._invalidate(("medicines",), ("medicine", int(medicine_id)))
 
     def remove_medicine(self, medicine_id):
-        cursor = self.connection.cursor()
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
 
-        # First check if this medicine is used in any schedules
-        check_query = "SELECT COUNT(*) as count FROM medicine_schedules WHERE medicine_id = %s"
-        cursor.execute(check_query, (medicine_id,))
-        result = cursor.fetchone()
+            # First check if this medicine is used in any schedules
+            check_query = "SELECT COUNT(*) as count FROM medicine_schedules WHERE medicine_id = %s"
+            cursor.execute(check_query, (medicine_id,))
+            result = cursor.fetchone()
 
-        if result[0] > 0:
-            cursor.close()
-            raise Exception("Cannot remove medicine that is used in patient schedules")
+            if result[0] > 0:
+                cursor.close()
+                raise Exception("Cannot remove medicine that is used in patient schedules")
 
-        # Delete the medicine
-        delete_query = "DELETE FROM medicines WHERE id = %s"
-        cursor.execute(delete_query, (medicine_id,))
+            # Delete the medicine
+            delete_query = "DELETE FROM medicines WHERE id = %s"
+            cursor.execute(delete_query, (medicine_id,))
 
-        self.connection.commit()
-        cursor.close()
+            self._commit(connection)
+            cursor.close()
+        self._invalidate(("medicines",), ("medicine", int(medicine_id)))
 
     # Medicine schedule methods
     def add_medicine_schedule(
@@ -504,71 +686,83 @@ class Database:
         end_date,
         time_slots,
         notes=None,
+        missed_after_minutes=MISSED_AFTER_MINUTES,
     ):
-        cursor = self.connection.cursor()
-        query = """
-        INSERT INTO medicine_schedules 
-        (patient_id, medicine_id, prescription_id, dosage, frequency, start_date, end_date, time_slots, notes)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        values = (
-            patient_id,
-            medicine_id,
-            prescription_id,
-            dosage,
-            frequency,
-            start_date,
-            end_date,
-            time_slots,
-            notes,
-        )
-
-        cursor.execute(query, values)
-        self.connection.commit()
-        last_id = cursor.lastrowid
-        cursor.close()
-
-        # Generate medicine logs for the schedule
-        start_date_obj = datetime.strptime(start_date, "%Y-%m-%d").date()
-        end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
-
-        # Generate logs for next 7 days or until end date, whichever comes first
-        current_date = start_date_obj
-        end_generate = date.today() + timedelta(days=7)
+        minutes = timeslots.parse(time_slots)
+        time_slots = timeslots.format_slots(minutes)
+        _check_missed_after(missed_after_minutes)
+
+        # The schedule, its slots and its first logs are saved together
+        with self.transaction():
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection)
+                query = """
+                INSERT INTO medicine_schedules 
+                (patient_id, medicine_id, prescription_id, dosage, frequency, start_date, end_date, time_slots, notes,
+                    missed_after_minutes)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """
+                values = (
+                    patient_id,
+                    medicine_id,
+                    prescription_id,
+                    dosage,
+                    frequency,
+                    start_date,
+                    end_date,
+                    time_slots,
+                    notes,
+                    missed_after_minutes,
+                )
 
-        while current_date <= end_generate:
-            if end_date_obj and current_date > end_date_obj:
-                break
-            self.generate_medicine_logs_for_schedule(last_id, current_date)
-            current_date += timedelta(days=1)
+                cursor.execute(query, values)
+                last_id = cursor.lastrowid
+                self._save_slots(cursor, last_id, minutes)
+                self._commit(connection)
+                cursor.close()
+
+            # A back-dated schedule gets logs for its doses already due;
+            # upcoming ones stay virtual
+            schedule = {
+                "id": last_id,
+                "start_date": start_date,
+                "end_date": end_date,
+                "time_slots": time_slots,
+                "missed_after_minutes": missed_after_minutes,
+            }
+            now = self.clock.now().replace(microsecond=0)
+            self.generate_medicine_logs_bulk([schedule], start_date, now.date(), until=now)
+            self._set_watermarks([(last_id, next_watermark(schedule, minutes, now))])
 
         return last_id
 
     def get_patient_medicine_schedules(self, patient_id):
-        cursor = self.connection.cursor(dictionary=True)
-        query = """
-        SELECT ms.*, m.name as medicine_name, m.details, m.expires_on
-        FROM medicine_schedules ms
-        JOIN medicines m ON ms.medicine_id = m.id
-        WHERE ms.patient_id = %s
-        ORDER BY ms.start_date DESC
-        """
-        cursor.execute(query, (patient_id,))
-        schedules = cursor.fetchall()
-        cursor.close()
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            query = """
+            SELECT ms.*, m.name as medicine_name, m.details, m.expires_on
+            FROM medicine_schedules ms
+            JOIN medicines m ON ms.medicine_id = m.id
+            WHERE ms.patient_id = %s
+            ORDER BY ms.start_date DESC
+            """
+            cursor.execute(query, (patient_id,))
+            schedules = cursor.fetchall()
+            cursor.close()
         return schedules
 
     def get_schedule_by_id(self, schedule_id):
-        cursor = self.connection.cursor(dictionary=True)
-        query = """
-        SELECT ms.*, m.name as medicine_name, m.details 
-        FROM medicine_schedules ms
-        JOIN medicines m ON ms.medicine_id = m.id
-        WHERE ms.id = %s
-        """
-        cursor.execute(query, (schedule_id,))
-        schedule = cursor.fetchone()
-        cursor.close()
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            query = """
+            SELECT ms.*, m.name as medicine_name, m.details 
+            FROM medicine_schedules ms
+            JOIN medicines m ON ms.medicine_id = m.id
+            WHERE ms.id = %s
+            """
+            cursor.execute(query, (schedule_id,))
+            schedule = cursor.fetchone()
+            cursor.close()
         return schedule
 
     def update_medicine_schedule(
@@ -581,230 +775,737 @@ class Database:
         end_date,
         time_slots,
         notes=None,
+        missed_after_minutes=None,
     ):
-        cursor = self.connection.cursor()
-        query = """
-        UPDATE medicine_schedules
-        SET medicine_id = %s, dosage = %s, frequency = %s, start_date = %s,
-            end_date = %s, time_slots = %s, notes = %s
-        WHERE id = %s
-        """
-        values = (medicine_id, dosage, frequency, start_date, end_date, time_slots, notes, schedule_id)
+        """Save an edited schedule and bring its logs in line with it; see
+        _apply_schedule_diff. ``missed_after_minutes`` of None keeps the
+        schedule's grace period."""
+        minutes = timeslots.parse(time_slots)
+        time_slots = timeslots.format_slots(minutes)
+        if missed_after_minutes is not None:
+            _check_missed_after(missed_after_minutes)
+
+        # Read before the write transaction, which then starts with a write
+        old = self.get_schedule_by_id(schedule_id)
+        if old is None:
+            raise Exception("This medicine schedule no longer exists")
+        try:
+            old_minutes = self._schedule_slots([old])[schedule_id]
+        except ValueError:
+            old_minutes = ()  # Slots that never parsed never had logs
+
+        # The schedule and its log changes commit once, or not at all
+        with self.transaction():
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection)
+                query = """
+                UPDATE medicine_schedules
+                SET medicine_id = %s, dosage = %s, frequency = %s, start_date = %s,
+                    end_date = %s, time_slots = %s, notes = %s,
+                    missed_after_minutes = COALESCE(%s, missed_after_minutes)
+                WHERE id = %s
+                """
+                values = (
+                    medicine_id,
+                    dosage,
+                    frequency,
+                    start_date,
+                    end_date,
+                    time_slots,
+                    notes,
+                    missed_after_minutes,
+                    schedule_id,
+                )
 
-        cursor.execute(query, values)
-        self.connection.commit()
-        cursor.close()
+                cursor.execute(query, values)
+                cursor.execute("SELECT missed_after_minutes FROM medicine_schedules WHERE id = %s", (schedule_id,))
+                missed_after_minutes = cursor.fetchone()[0]
+                self._save_slots(cursor, schedule_id, minutes)
+                self._commit(connection)
+                cursor.close()
+
+            schedule = {
+                "id": schedule_id,
+                "start_date": start_date,
+                "end_date": end_date,
+                "time_slots": time_slots,
+                "missed_after_minutes": missed_after_minutes,
+            }
+            self._apply_schedule_diff(old, old_minutes, schedule, minutes)
+            self._rewind_watermark(schedule_id)
+
+    def _apply_schedule_diff(self, old, old_minutes, new, new_minutes):
+        """Bring a schedule's logs in line with an edit, leaving its history
+        alone.
+
+        From now on, stored logs of doses only the old version has are
+        deleted unless the patient acted on them (taken or skipped, or
+        given a time or notes). Before now, nothing is deleted or rewritten:
+        the only change is storing the due doses of days the new version
+        covers and the old one did not, such as an earlier start date.
+        Doses both versions share keep their logs, so the work follows the
+        size of the edit rather than the length of the schedule.
+        """
+        schedule_id = new["id"]
+        now = self.clock.now()
+
+        # Only logs stored ahead of time (marked early, or older data) can be removed
+        removed = []
+        last = self._last_log_time(schedule_id)
+        if last is not None and last >= now:
+            removed, _ = diff_occurrences(old, old_minutes, new, new_minutes, now, last + timedelta(minutes=1))
+
+        deleted = 0
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            for i in range(0, len(removed), LOG_BATCH_SIZE):
+                batch = removed[i:i + LOG_BATCH_SIZE]
+                query = f"""
+                DELETE FROM medicine_logs
+                WHERE schedule_id = %s AND scheduled_time IN ({", ".join(["%s"] * len(batch))})
+                AND scheduled_time >= %s
+                AND status IN ('scheduled', 'missed') AND taken_time IS NULL AND notes IS NULL
+                """
+                cursor.execute(query, [schedule_id, *batch, now])
+                deleted += cursor.rowcount
+            self._commit(connection)
+            cursor.close()
 
-        # Regenerate medicine logs for updated schedule
-        schedule_start = datetime.strptime(start_date, "%Y-%m-%d").date()
-        schedule_end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+        # Comparing both versions with the new slots leaves only the added days
+        start = _day_start(min(to_date(old["start_date"]), to_date(new["start_date"])))
+        _, added = diff_occurrences(old, new_minutes, new, new_minutes, start, now)
+        due = [(schedule_id, scheduled_time) for scheduled_time in added]
+        created = self._insert_logs(due, {schedule_id: missed_after(new)})
+        return {"deleted": deleted, "created": created}
+
+    def _rewind_watermark(self, schedule_id):
+        # The old version's next dose may come after one the new version adds
+        now = self.clock.now().replace(microsecond=0)
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            cursor.execute(
+                "UPDATE schedule_log_watermarks SET logs_until = %s WHERE schedule_id = %s AND logs_until > %s",
+                (now, schedule_id, now),
+            )
+            self._commit(connection)
+            cursor.close()
 
-        # Delete future logs for this schedule
-        self.delete_future_medicine_logs(schedule_id, schedule_start)
+    def _last_log_time(self, schedule_id):
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            query = """
+            SELECT scheduled_time FROM medicine_logs
+            WHERE schedule_id = %s
+            ORDER BY scheduled_time DESC
+            LIMIT 1
+            """
+            cursor.execute(query, (schedule_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        return row[0] if row else None
 
-        # Generate new logs
-        current_date = schedule_start
-        while (schedule_end is None or current_date <= schedule_end) and current_date <= date.today() + timedelta(days=7):
-            self.generate_medicine_logs_for_schedule(schedule_id, current_date)
-            current_date += timedelta(days=1)
+    def _save_slots(self, cursor, schedule_id, minutes):
+        cursor.execute("DELETE FROM medicine_schedule_slots WHERE schedule_id = %s", (schedule_id,))
+        query = f"""
+        INSERT INTO medicine_schedule_slots (schedule_id, minute_of_day)
+        VALUES {", ".join(["(%s, %s)"] * len(minutes))}
+        """
+        cursor.execute(query, [value for minute in minutes for value in (schedule_id, minute)])
 
-    def delete_medicine_schedule(self, schedule_id):
-        cursor = self.connection.cursor()
-        # First delete related medicine logs
-        delete_logs_query = "DELETE FROM medicine_logs WHERE schedule_id = %s"
-        cursor.execute(delete_logs_query, (schedule_id,))
-
-        # Then delete the schedule
-        delete_schedule_query = "DELETE FROM medicine_schedules WHERE id = %s"
-        cursor.execute(delete_schedule_query, (schedule_id,))
-
-        self.connection.commit()
-        cursor.close()
-
-    def delete_future_medicine_logs(self, schedule_id, from_date):
-        cursor = self.connection.cursor()
-        query = """
-        DELETE FROM medicine_logs
-        WHERE schedule_id = %s 
-        AND DATE(scheduled_time) >= %s
+    def _schedule_slots(self, schedules):
+        """Minutes of day of each schedule's doses, by schedule id, read from
+        medicine_schedule_slots. Rows without updated_at (schedules being
+        saved) and schedules without slot rows have their text parsed.
         """
-        cursor.execute(query, (schedule_id, from_date))
-        self.connection.commit()
-        cursor.close()
+        slots = {}
+        missing = {}
+        for schedule in schedules:
+            if "updated_at" not in schedule:
+                slots[schedule["id"]] = timeslots.parse(schedule["time_slots"])
+                continue
+            # updated_at only has one-second resolution, so the text is checked too
+            cached = self.slot_cache.get((schedule["id"], schedule["updated_at"]))
+            if cached is not None and cached[0] == schedule["time_slots"]:
+                slots[schedule["id"]] = cached[1]
+            else:
+                missing[schedule["id"]] = schedule
+        if not missing:
+            return slots
+
+        loaded = {}
+        ids = list(missing)
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            for i in range(0, len(ids), LOG_BATCH_SIZE):
+                batch = ids[i:i + LOG_BATCH_SIZE]
+                query = f"""
+                SELECT schedule_id, minute_of_day FROM medicine_schedule_slots
+                WHERE schedule_id IN ({", ".join(["%s"] * len(batch))})
+                ORDER BY schedule_id, minute_of_day
+                """
+                cursor.execute(query, batch)
+                for schedule_id, minute in cursor.fetchall():
+                    loaded.setdefault(schedule_id, []).append(minute)
+            cursor.close()
 
-    def delete_future_logs(self, schedule_id):
-        cursor = self.connection.cursor()
-        today = date.today().strftime("%Y-%m-%d")
-        query = "DELETE FROM medicine_logs WHERE schedule_id = %s AND DATE(scheduled_time) >= %s"
-        cursor.execute(query, (schedule_id, today))
-        self.connection.commit()
-        cursor.close()
+        for schedule_id, schedule in missing.items():
+            if schedule_id not in loaded:
+                slots[schedule_id] = timeslots.parse(schedule["time_slots"])
+                continue
+            slots[schedule_id] = tuple(loaded[schedule_id])
+            # Keyed by content, so rows read inside a transaction are safe to share
+            self.slot_cache.set((schedule_id, schedule["updated_at"]), (schedule["time_slots"], slots[schedule_id]))
+        return slots
 
-    def generate_medicine_logs_for_schedule(self, schedule_id, for_date):
-        cursor = self.connection.cursor(dictionary=True)
+    def delete_medicine_schedule(self, schedule_id):
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            # First delete related medicine logs
+            delete_logs_query = "DELETE FROM medicine_logs WHERE schedule_id = %s"
+            cursor.execute(delete_logs_query, (schedule_id,))
 
-        # Get schedule details
-        query = "SELECT * FROM medicine_schedules WHERE id = %s"
-        cursor.execute(query, (schedule_id,))
-        schedule = cursor.fetchone()
+            # Then delete the schedule
+            delete_schedule_query = "DELETE FROM medicine_schedules WHERE id = %s"
+            cursor.execute(delete_schedule_query, (schedule_id,))
 
-        if not schedule:
+            self._commit(connection)
             cursor.close()
-            return
 
-        # Check if logs already exist for this date
-        query = """
-        SELECT COUNT(*) as count FROM medicine_logs 
-        WHERE schedule_id = %s 
-        AND DATE(scheduled_time) = %s
-        """
-        cursor.execute(query, (schedule_id, for_date))
-        result = cursor.fetchone()
-
-        if result["count"] > 0:
+    def delete_future_logs(self, schedule_id):
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            query = "DELETE FROM medicine_logs WHERE schedule_id = %s AND scheduled_time >= %s"
+            cursor.execute(query, (schedule_id, _day_start(self.clock.today())))
+            self._commit(connection)
             cursor.close()
-            return  # Logs already exist
 
-        # Generate logs based on time slots
-        time_slots = schedule["time_slots"].split(",")
-
-        for time_slot in time_slots:
-            time_parts = time_slot.strip().split(":")
-            hour = int(time_parts[0])
-            minute = int(time_parts[1]) if len(time_parts) > 1 else 0
+    def generate_medicine_logs_for_schedule(self, schedule_id, for_date):
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            query = "SELECT * FROM medicine_schedules WHERE id = %s"
+            cursor.execute(query, (schedule_id,))
+            schedule = cursor.fetchone()
+            cursor.close()
 
-            scheduled_time = datetime.combine(
-                for_date, datetime.min.time().replace(hour=hour, minute=minute)
-            )
+        if not schedule:
+            return {"created": 0, "skipped": 0}
+        return self.generate_medicine_logs_bulk([schedule], for_date, for_date, until=self.clock.now())
 
-            insert_query = """
-            INSERT INTO medicine_logs (schedule_id, scheduled_time, status)
-            VALUES (%s, %s, %s)
-            """
+    def generate_medicine_logs(self, for_date, patient_id=None):
+        """Store the logs of ``for_date``'s doses that are already due, for one
+        patient or for everyone."""
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+
+            if patient_id:
+                query = """
+                SELECT * FROM medicine_schedules 
+                WHERE patient_id = %s 
+                AND start_date <= %s 
+                AND (end_date IS NULL OR end_date >= %s)
+                """
+                cursor.execute(query, (patient_id, for_date, for_date))
+            else:
+                query = """
+                SELECT * FROM medicine_schedules 
+                WHERE start_date <= %s 
+                AND (end_date IS NULL OR end_date >= %s)
+                """
+                cursor.execute(query, (for_date, for_date))
+
+            schedules = cursor.fetchall()
+            cursor.close()
 
-            # Set status based on current time
-            current_time = datetime.now()
-            status = "scheduled"
-            if scheduled_time < current_time:
-                # If it's in the past, mark as missed
-                time_diff = current_time - scheduled_time
-                if time_diff.total_seconds() > 3600:  # More than 1 hour in the past
-                    status = "missed"
+        # Doses later in the day stay virtual until they are due or acted on
+        return self.generate_medicine_logs_bulk(schedules, for_date, for_date, until=self.clock.now())
 
-            cursor.execute(insert_query, (schedule_id, scheduled_time, status))
+    def generate_medicine_logs_bulk(self, schedules, start_date, end_date, until=None):
+        """Create the missing logs for every occurrence of ``schedules`` between
+        ``start_date`` and ``end_date`` (inclusive), and before ``until`` when
+        given, in a single transaction.
 
-        self.connection.commit()
-        cursor.close()
+        ``schedules`` are medicine_schedules rows (at least id, start_date,
+        end_date and time_slots). Returns {"created": n, "skipped": n}, where
+        skipped counts occurrences that already had a log.
+        """
+        occurrences = expand_occurrences(
+            schedules, start_date, end_date, self._schedule_slots(schedules), until=until
+        )
+        created = self._insert_logs(occurrences, {schedule["id"]: missed_after(schedule) for schedule in schedules})
+        return {"created": created, "skipped": len(occurrences) - created}
+
+    def _insert_logs(self, occurrences, grace):
+        # Stores (schedule_id, scheduled_time) pairs and returns how many were
+        # new; ``grace`` maps schedule ids to their missed_after_minutes
+        if not occurrences:
+            return 0
+
+        now = self.clock.now()
+        created = 0
+
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+
+            # The unique (schedule_id, scheduled_time) key makes this idempotent
+            for i in range(0, len(occurrences), LOG_BATCH_SIZE):
+                batch = occurrences[i:i + LOG_BATCH_SIZE]
+                query = f"""
+                {self.backend.insert_ignore} INTO medicine_logs (schedule_id, scheduled_time, status)
+                VALUES {", ".join(["(%s, %s, %s)"] * len(batch))}
+                """
+                values = []
+                for schedule_id, scheduled_time in batch:
+                    status = initial_log_status(scheduled_time, now, grace[schedule_id])
+                    values.extend((schedule_id, scheduled_time, status))
+                cursor.execute(query, values)
+                created += cursor.rowcount
+
+            self._commit(connection)
+            cursor.close()
 
-    def generate_medicine_logs(self, for_date, patient_id=None):
-        cursor = self.connection.cursor(dictionary=True)
+        self._count("logs_created", created)
+        self._count("logs_skipped", len(occurrences) - created)
+        return created
+
+    def _set_watermarks(self, watermarks):
+        # (schedule_id, logs_until) pairs
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            for i in range(0, len(watermarks), LOG_BATCH_SIZE):
+                batch = watermarks[i:i + LOG_BATCH_SIZE]
+                query = self.backend.upsert(
+                    "schedule_log_watermarks", ("schedule_id", "logs_until"), ("schedule_id",), len(batch)
+                )
+                cursor.execute(query, [value for watermark in batch for value in watermark])
+            self._commit(connection)
+            cursor.close()
 
-        if patient_id:
+    def get_patient_ids(self, after_id=0, limit=500):
+        """Ids of up to ``limit`` patients above ``after_id``, in order, for
+        walking every patient in batches."""
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
             query = """
-            SELECT * FROM medicine_schedules 
-            WHERE patient_id = %s 
-            AND start_date <= %s 
-            AND (end_date IS NULL OR end_date >= %s)
+            SELECT id FROM users
+            WHERE user_type = 'patient' AND id > %s
+            ORDER BY id
+            LIMIT %s
             """
-            cursor.execute(query, (patient_id, for_date, for_date))
-        else:
-            query = """
-            SELECT * FROM medicine_schedules 
-            WHERE start_date <= %s 
-            AND (end_date IS NULL OR end_date >= %s)
-            """
-            cursor.execute(query, (for_date, for_date))
+            cursor.execute(query, (after_id, limit))
+            patient_ids = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+        return patient_ids
+
+    def materialize_logs(self, patient_ids, until=None):
+        """Store a log for every dose of ``patient_ids``' schedules due before
+        ``until`` (default now) that has none yet.
 
-        schedules = cursor.fetchall()
-        cursor.close()
+        A schedule's watermark in schedule_log_watermarks is the time of its
+        next dose without a log, so a run only reads and writes the schedules
+        with a dose that fell due since the last one. Schedules without a
+        watermark are expanded from their start date, which also fills any
+        gaps. Returns {"schedules": n, "created": n}.
+        """
+        if not patient_ids:
+            return {"schedules": 0, "created": 0}
+        # Whole seconds, as a DATETIME column stores them
+        until = (until or self.clock.now()).replace(microsecond=0)
+
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            query = f"""
+            SELECT ms.id, ms.start_date, ms.end_date, ms.time_slots, ms.updated_at, ms.missed_after_minutes,
+                w.logs_until
+            FROM medicine_schedules ms
+            LEFT JOIN schedule_log_watermarks w ON w.schedule_id = ms.id
+            WHERE ms.patient_id IN ({", ".join(["%s"] * len(patient_ids))})
+            AND ms.start_date <= %s
+            AND (w.logs_until IS NULL OR w.logs_until < %s)
+            AND (ms.end_date IS NULL OR w.logs_until IS NULL OR ms.end_date >= DATE(w.logs_until))
+            """
+            cursor.execute(query, [*patient_ids, until.date(), until])
+            schedules = cursor.fetchall()
+            cursor.close()
+        if not schedules:
+            return {"schedules": 0, "created": 0}
 
+        # Read before the write transaction, which then starts with a write
+        slots = self._schedule_slots(schedules)
+        occurrences = []
         for schedule in schedules:
-            self.generate_medicine_logs_for_schedule(schedule["id"], for_date)
+            start = schedule["logs_until"] or _day_start(schedule["start_date"])
+            occurrences.extend(
+                (schedule["id"], scheduled_time)
+                for scheduled_time in iter_occurrences(schedule, slots[schedule["id"]], start, until)
+            )
 
-    def get_medicine_logs(self, patient_id, for_date=None):
-        cursor = self.connection.cursor(dictionary=True)
+        watermarks = [
+            (schedule["id"], next_watermark(schedule, slots[schedule["id"]], until)) for schedule in schedules
+        ]
+        with self.transaction():
+            created = self._insert_logs(occurrences, {schedule["id"]: missed_after(schedule) for schedule in schedules})
+            self._set_watermarks(watermarks)
+        return {"schedules": len(schedules), "created": created}
 
+    def get_medicine_logs(self, patient_id, for_date=None):
+        """Doses of ``for_date``, or of today and the UPCOMING_DAYS after it,
+        in time order. Stored logs are merged with virtual ones for the doses
+        that have no row yet; see src/occurrences.py."""
         if for_date:
+            start = _day_start(for_date)
+            end = start + timedelta(days=1)
+        else:
+            start = _day_start(self.clock.today())
+            end = start + timedelta(days=UPCOMING_DAYS + 1)
+
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
             query = """
             SELECT ml.*, ms.dosage, m.name as medicine_name 
             FROM medicine_logs ml
             JOIN medicine_schedules ms ON ml.schedule_id = ms.id
             JOIN medicines m ON ms.medicine_id = m.id
             WHERE ms.patient_id = %s
-            AND DATE(ml.scheduled_time) = %s
-            ORDER BY ml.scheduled_time
+            AND ml.scheduled_time >= %s AND ml.scheduled_time < %s
+            ORDER BY ml.scheduled_time, ml.schedule_id
             """
-            cursor.execute(query, (patient_id, for_date))
-        else:
-            # Get logs for the next 7 days by default
-            today = date.today().strftime("%Y-%m-%d")
-            future_date = (date.today() + timedelta(days=7)).strftime("%Y-%m-%d")
+            cursor.execute(query, (patient_id, start, end))
+            logs = cursor.fetchall()
 
             query = """
-            SELECT ml.*, ms.dosage, m.name as medicine_name 
-            FROM medicine_logs ml
-            JOIN medicine_schedules ms ON ml.schedule_id = ms.id
+            SELECT ms.id, ms.start_date, ms.end_date, ms.time_slots, ms.updated_at, ms.dosage,
+                ms.missed_after_minutes, m.name as medicine_name
+            FROM medicine_schedules ms
             JOIN medicines m ON ms.medicine_id = m.id
             WHERE ms.patient_id = %s
-            AND DATE(ml.scheduled_time) BETWEEN %s AND %s
-            ORDER BY ml.scheduled_time
+            AND ms.start_date < %s
+            AND (ms.end_date IS NULL OR ms.end_date >= %s)
             """
-            cursor.execute(query, (patient_id, today, future_date))
+            cursor.execute(query, (patient_id, end.date(), start.date()))
+            schedules = cursor.fetchall()
+            cursor.close()
 
-        logs = cursor.fetchall()
-        cursor.close()
-        return logs
+        if not schedules:
+            return logs
+        now = self.clock.now()
+        stored = {(log["schedule_id"], log["scheduled_time"]) for log in logs}
+        virtual = virtual_logs(
+            schedules,
+            self._schedule_slots(schedules),
+            start,
+            end,
+            stored,
+            lambda schedule, scheduled_time: initial_log_status(scheduled_time, now, missed_after(schedule)),
+        )
+        return merge_logs(logs, virtual)
+
+    def get_medicine_log_page(
+        self,
+        patient_id,
+        after=None,
+        start_date=None,
+        end_date=None,
+        status=None,
+        medicine_id=None,
+        newest_first=False,
+        page_size=HISTORY_PAGE_SIZE,
+    ):
+        """Return one page of a patient's dose history and the key of the next.
+
+        Pages are ordered by (scheduled_time, id) and addressed by keyset: pass
+        the returned key as ``after`` to get the following page, so deep pages
+        cost the same as the first. The key is None after the last page.
+        """
+        rows = list(
+            self._iter_log_page(
+                patient_id, after, start_date, end_date, status, medicine_id, newest_first, page_size
+            )
+        )
+        next_key = None
+        if len(rows) == page_size:
+            next_key = (rows[-1]["scheduled_time"], rows[-1]["id"])
+        return rows, next_key
+
+    def iter_medicine_log_history(
+        self,
+        patient_id,
+        start_date=None,
+        end_date=None,
+        status=None,
+        medicine_id=None,
+        newest_first=False,
+        page_size=HISTORY_PAGE_SIZE,
+    ):
+        """Yield every matching log of a patient in constant memory.
+
+        ``start_date`` and ``end_date`` are inclusive days, ``status`` is one
+        status or a list of them. Rows are streamed from the cursor one page
+        (a keyset-bounded query) at a time.
+        """
+        after = None
+        while True:
+            count = 0
+            for row in self._iter_log_page(
+                patient_id, after, start_date, end_date, status, medicine_id, newest_first, page_size
+            ):
+                count += 1
+                after = (row["scheduled_time"], row["id"])
+                yield row
+            if count < page_size:
+                return
+
+    def _iter_log_page(
+        self, patient_id, after, start_date, end_date, status, medicine_id, newest_first, page_size
+    ):
+        conditions = ["ms.patient_id = %s"]
+        values = [patient_id]
+
+        if start_date:
+            conditions.append("ml.scheduled_time >= %s")
+            values.append(_day_start(start_date))
+        if end_date:
+            conditions.append("ml.scheduled_time < %s")
+            values.append(_day_start(end_date) + timedelta(days=1))
+        if status:
+            statuses = [status] if isinstance(status, str) else list(status)
+            conditions.append(f"ml.status IN ({', '.join(['%s'] * len(statuses))})")
+            values.extend(statuses)
+        if medicine_id:
+            conditions.append("ms.medicine_id = %s")
+            values.append(medicine_id)
+        if after:
+            # Keyset continuation: strictly past the last (scheduled_time, id) seen
+            op = "<" if newest_first else ">"
+            conditions.append(
+                f"(ml.scheduled_time {op} %s OR (ml.scheduled_time = %s AND ml.id {op} %s))"
+            )
+            values.extend((after[0], after[0], after[1]))
+
+        direction = "DESC" if newest_first else "ASC"
+        query = f"""
+        SELECT ml.*, ms.dosage, ms.medicine_id, m.name as medicine_name
+        FROM medicine_logs ml
+        JOIN medicine_schedules ms ON ml.schedule_id = ms.id
+        JOIN medicines m ON ms.medicine_id = m.id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY ml.scheduled_time {direction}, ml.id {direction}
+        LIMIT %s
+        """
+        values.append(page_size)
+
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            cursor.execute(query, values)
+            if self.in_transaction():
+                # The pinned connection may be needed again before the caller finishes
+                rows = cursor.fetchall()
+                cursor.close()
+                yield from rows
+                return
+
+            try:
+                while True:
+                    rows = cursor.fetchmany(HISTORY_FETCH_SIZE)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                # An abandoned iteration must still drain the unbuffered result
+                # (at most one page) before the connection goes back to the pool
+                cursor.fetchall()
+                cursor.close()
 
     def update_medicine_log(self, log_id, status, taken_time=None, notes=None):
-        cursor = self.connection.cursor()
+        """Record what happened to a dose and return its log id. A virtual
+        log id (see src/occurrences.py) stores the dose first."""
+        occurrence = parse_virtual_id(log_id)
+        if occurrence is not None:
+            # Read before the write transaction, which then starts with a write
+            schedule = self._check_occurrence(*occurrence)
+        with self.transaction():
+            if occurrence is not None:
+                log_id = self._store_occurrence(*occurrence, missed_after(schedule))
+
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection)
+
+                if taken_time:
+                    query = """
+                    UPDATE medicine_logs
+                    SET status = %s, taken_time = %s, notes = %s
+                    WHERE id = %s
+                    """
+                    values = (status, taken_time, notes, log_id)
+                else:
+                    query = """
+                    UPDATE medicine_logs
+                    SET status = %s, notes = %s
+                    WHERE id = %s
+                    """
+                    values = (status, notes, log_id)
+
+                cursor.execute(query, values)
+                self._commit(connection)
+                cursor.close()
+        return log_id
+
+    def _check_occurrence(self, schedule_id, scheduled_time):
+        schedule = self.get_schedule_by_id(schedule_id)
+        if schedule is None:
+            raise Exception("This medicine schedule no longer exists")
+        minutes = self._schedule_slots([schedule])[schedule_id]
+        if not any(iter_occurrences(schedule, minutes, scheduled_time, scheduled_time + timedelta(minutes=1))):
+            raise Exception("The schedule no longer has a dose at this time")
+        return schedule
 
-        if taken_time:
-            query = """
-            UPDATE medicine_logs
-            SET status = %s, taken_time = %s, notes = %s
-            WHERE id = %s
+    def _store_occurrence(self, schedule_id, scheduled_time, missed_after_minutes):
+        # Id of the log of one dose, inserting it unless another client already did
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            query = f"""
+            {self.backend.insert_ignore} INTO medicine_logs (schedule_id, scheduled_time, status)
+            VALUES (%s, %s, %s)
             """
-            values = (status, taken_time, notes, log_id)
+            status = initial_log_status(scheduled_time, self.clock.now(), missed_after_minutes)
+            cursor.execute(query, (schedule_id, scheduled_time, status))
+            self._count("logs_created", cursor.rowcount)
+            cursor.execute(
+                "SELECT id FROM medicine_logs WHERE schedule_id = %s AND scheduled_time = %s",
+                (schedule_id, scheduled_time),
+            )
+            log_id = cursor.fetchone()[0]
+            cursor.close()
+        return log_id
+
+    def mark_missed_medicine_logs(self, now=None, full=False):
+        """Mark doses still scheduled more than their schedule's
+        missed_after_minutes before now as missed. Returns how many changed.
+
+        The previous sweep's time is kept in job_watermarks, so a sweep only
+        looks at doses that can have become overdue since: those scheduled
+        at most MAX_MISSED_AFTER_MINUTES before it. The first sweep, or one
+        with ``full``, looks at every scheduled dose. Each SWEEP_CHUNK of
+        scheduled_time is a single indexed UPDATE, committed on its own.
+        """
+        now = (now or self.clock.now()).replace(microsecond=0)
+        high_water = None if full else self._job_watermark(MISSED_SWEEP_JOB)
+        if high_water is None:
+            start = self._oldest_scheduled_log()
         else:
+            start = high_water - timedelta(minutes=MAX_MISSED_AFTER_MINUTES)
+
+        overdue = self.backend.add_minutes("medicine_logs.scheduled_time", "ms.missed_after_minutes")
+        query = f"""
+        UPDATE medicine_logs
+        SET status = 'missed'
+        WHERE status = 'scheduled' AND scheduled_time >= %s AND scheduled_time < %s
+        AND EXISTS (
+            SELECT 1 FROM medicine_schedules ms
+            WHERE ms.id = medicine_logs.schedule_id AND {overdue} < %s
+        )
+        """
+        updated = 0
+        while start is not None and start < now:
+            end = min(start + SWEEP_CHUNK, now)
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection)
+                cursor.execute(query, (start, end, now))
+                updated += cursor.rowcount
+                self._commit(connection)
+                cursor.close()
+            start = end
+
+        self._set_job_watermark(MISSED_SWEEP_JOB, now)
+        return updated
+
+    def _oldest_scheduled_log(self):
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
             query = """
-            UPDATE medicine_logs
-            SET status = %s, notes = %s
-            WHERE id = %s
+            SELECT scheduled_time FROM medicine_logs
+            WHERE status = 'scheduled'
+            ORDER BY scheduled_time
+            LIMIT 1
             """
-            values = (status, notes, log_id)
+            cursor.execute(query)
+            row = cursor.fetchone()
+            cursor.close()
+        return row[0] if row else None
+
+    def claim_job(self, job, every):
+        """Take this run of a periodic ``job`` that every client runs: True
+        for at most one caller in ``every`` seconds, so a clinic's kiosks do
+        the work once between them. Runs are recorded in job_watermarks."""
+        now = self.clock.now().replace(microsecond=0)
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            cursor.execute(
+                "UPDATE job_watermarks SET high_water = %s WHERE job = %s AND high_water <= %s",
+                (now, job, now - timedelta(seconds=every)),
+            )
+            claimed = cursor.rowcount == 1
+            self._commit(connection)
+            if not claimed:
+                # First run ever; committed separately so MySQL never holds
+                # the UPDATE's gap lock while inserting
+                cursor.execute(
+                    f"{self.backend.insert_ignore} INTO job_watermarks (job, high_water) VALUES (%s, %s)", (job, now)
+                )
+                claimed = cursor.rowcount == 1
+                self._commit(connection)
+            cursor.close()
+        return claimed
 
-        cursor.execute(query, values)
-        self.connection.commit()
-        cursor.close()
+    def _job_watermark(self, job):
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            cursor.execute("SELECT high_water FROM job_watermarks WHERE job = %s", (job,))
+            row = cursor.fetchone()
+            cursor.close()
+        return row[0] if row else None
+
+    def _set_job_watermark(self, job, high_water):
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection)
+            query = self.backend.upsert("job_watermarks", ("job", "high_water"), ("job",))
+            cursor.execute(query, (job, high_water))
+            self._commit(connection)
+            cursor.close()
 
     def get_expiring_medicines(self, patient_id, days=30):
-        cursor = self.connection.cursor(dictionary=True)
-        future_date = (date.today() + timedelta(days=days)).strftime("%Y-%m-%d")
-
-        query = """
-        SELECT DISTINCT m.* 
-        FROM medicines m
-        JOIN medicine_schedules ms ON m.id = ms.medicine_id
-        WHERE ms.patient_id = %s
-        AND m.expires_on <= %s
-        AND m.expires_on >= CURDATE()
-        ORDER BY m.expires_on
-        """
+        with self._connection() as connection:
+            cursor = self.backend.cursor(connection, dictionary=True)
+            today = self.clock.today()
+            future_date = today + timedelta(days=days)
 
-        cursor.execute(query, (patient_id, future_date))
-        medicines = cursor.fetchall()
-        cursor.close()
+            query = """
+            SELECT DISTINCT m.* 
+            FROM medicines m
+            JOIN medicine_schedules ms ON m.id = ms.medicine_id
+            WHERE ms.patient_id = %s
+            AND m.expires_on <= %s
+            AND m.expires_on >= %s
+            ORDER BY m.expires_on
+            """
+
+            cursor.execute(query, (patient_id, future_date, today))
+            medicines = cursor.fetchall()
+            cursor.close()
         return medicines
 
     def get_all_doctors(self):
-        cursor = self.connection.cursor(dictionary=True)
-        query = """
-        SELECT id, full_name, email 
-        FROM users 
-        WHERE user_type = 'doctor'
-        ORDER BY full_name
-        """
-        cursor.execute(query)
-        doctors = cursor.fetchall()
-        cursor.close()
-        return doctors
\ No newline at end of file
+        def load():
+            with self._connection() as connection:
+                cursor = self.backend.cursor(connection, dictionary=True)
+                query = """
+                SELECT id, full_name, email 
+                FROM users 
+                WHERE user_type = 'doctor'
+                ORDER BY full_name
+                """
+                cursor.execute(query)
+                doctors = cursor.fetchall()
+                cursor.close()
+            return doctors
+
+        return self._cached(("doctors",), load)
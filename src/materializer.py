@@ -0,0 +1,166 @@
+"""Store a medicine_logs row for every dose that has fallen due.
+
+Upcoming doses are virtual (see src/occurrences.py) until someone acts on
+them. This job turns due doses into history for every patient, including
+those who have not opened the app in a while, a batch of patient ids at a
+time. Each schedule keeps a watermark, so a run only expands the doses
+that fell due since the previous one. After each pass the missed-dose sweep
+(Database.mark_missed_medicine_logs) marks the doses left untouched past
+their grace period.
+
+    python -m src.materializer                   # one pass
+    python -m src.materializer --workers 4       # batches spread over 4 processes
+    python -m src.materializer --every 300       # keep running
+
+The app runs the same job on a background thread every
+MATERIALIZE_INTERVAL seconds once the database is connected. Every kiosk
+does, so each pass first claims the run (Database.claim_job): one client
+does the work per interval and the others skip it.
+"""
+
+import argparse
+import itertools
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src import config
+from src.clock import SYSTEM_CLOCK, SimulatedClock
+
+MATERIALIZE_JOB = "materializer"
+
+logger = logging.getLogger("medical_app.materializer")
+
+
+def iter_patient_batches(db, batch_size):
+    after_id = 0
+    while True:
+        patient_ids = db.get_patient_ids(after_id, batch_size)
+        if not patient_ids:
+            return
+        yield patient_ids
+        after_id = patient_ids[-1]
+
+
+def run(db, until=None, batch_size=None, workers=1):
+    """Materialize every patient's due doses up to ``until`` (default now)
+    and return totals. With ``workers`` above 1 the batches are spread over
+    that many processes, each opening ``db``'s database on its own
+    connections; batches never share a schedule, so they do not contend."""
+    batch_size = batch_size or config.MATERIALIZE_BATCH_SIZE
+    # One horizon for the whole pass, however long it takes
+    until = (until or db.clock.now()).replace(microsecond=0)
+    started = time.perf_counter()
+    totals = {"batches": 0, "schedules": 0, "created": 0}
+
+    batches = iter_patient_batches(db, batch_size)
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        with executor:
+            # The workers' "now" is the caller's, so simulated clocks carry over
+            target = (db.backend.name, db.backend.options(), None if db.clock is SYSTEM_CLOCK else db.clock.now())
+            for result in executor.map(materialize_batch, batches, itertools.repeat(until), itertools.repeat(target)):
+                _add(totals, result)
+    else:
+        for patient_ids in batches:
+            _add(totals, db.materialize_logs(patient_ids, until))
+
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+
+_worker_database = None
+
+
+def materialize_batch(patient_ids, until, target):
+    # Top level so process pools can pickle it; each worker opens its own Database
+    global _worker_database
+    if _worker_database is None:
+        from src.backends import create_backend
+        from src.database import Database
+
+        backend_name, options, now = target
+        _worker_database = Database(
+            backend=create_backend(backend_name, **options),
+            fixtures=False,
+            clock=SimulatedClock(now) if now else None,
+        )
+    return _worker_database.materialize_logs(patient_ids, until)
+
+
+def _add(totals, result):
+    totals["batches"] += 1
+    totals["schedules"] += result["schedules"]
+    totals["created"] += result["created"]
+
+
+def start(db, interval=None):
+    """Run the job every ``interval`` seconds (default
+    config.MATERIALIZE_INTERVAL, 0 turns it off) on a daemon thread. Returns
+    an Event that stops it, or None."""
+    interval = config.MATERIALIZE_INTERVAL if interval is None else interval
+    if not interval:
+        return None
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            try:
+                if db.claim_job(MATERIALIZE_JOB, interval):
+                    totals = run(db)
+                    missed = db.mark_missed_medicine_logs()
+                    logger.info(
+                        "Materialized %d logs for %d schedules, %d doses missed",
+                        totals["created"],
+                        totals["schedules"],
+                        missed,
+                    )
+            except Exception:
+                logger.exception("Log materializer failed")
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=loop, name="log-materializer", daemon=True).start()
+    return stop
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Store the logs of every dose that has fallen due")
+    parser.add_argument("--batch-size", type=int, default=config.MATERIALIZE_BATCH_SIZE, help="patients per batch")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--every", type=float, default=0, help="repeat every this many seconds")
+    parser.add_argument(
+        "--full-sweep",
+        action="store_true",
+        help="check every scheduled dose for missed ones, not only those since the last sweep",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from src.database import get_database
+
+    db = get_database()
+    full_sweep = args.full_sweep
+    while True:
+        # A single pass always runs; a repeating one shares the interval with the kiosks
+        if db.claim_job(MATERIALIZE_JOB, args.every):
+            totals = run(db, batch_size=args.batch_size, workers=args.workers)
+            missed = db.mark_missed_medicine_logs(full=full_sweep)
+            full_sweep = False
+            print(
+                f"{totals['created']} logs created for {totals['schedules']} schedules "
+                f"in {totals['batches']} batches, {totals['seconds']:.1f}s; {missed} doses missed",
+                file=sys.stderr,
+            )
+        if not args.every:
+            return 0
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+import logging
+import os
+import threading
+import time
+
+from src import config, tracing
+
+logger = logging.getLogger("medical_app.metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers a cached lookup up to a stalled connection checkout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}_total{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}  # labels -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _labels(self.labelnames, key, [("le", _number(float(bound)))])
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    """Metrics owned by the app plus collectors that read live state (pool,
+    cache, Database counters) when the page is rendered."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        # collector() yields (name, type, documentation, [(labels dict, value)])
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                logger.exception("Metrics collector failed")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                suffix = "_total" if kind == "counter" else ""
+                for labels, value in samples:
+                    label_text = _labels(labels.keys(), labels.values())
+                    lines.append(f"{name}{suffix}{label_text} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+DB_METHOD_SECONDS = REGISTRY.register(
+    Histogram("medical_app_db_method_duration_seconds", "Wall time of Database method calls.", ["method"])
+)
+DB_METHOD_ERRORS = REGISTRY.register(
+    Counter("medical_app_db_method_errors", "Database method calls that raised.", ["method", "error"])
+)
+DB_QUERIES = REGISTRY.register(
+    Counter("medical_app_db_queries", "SQL statements executed, by the Database method that ran them.", ["method"])
+)
+DB_QUERY_ROWS = REGISTRY.register(
+    Counter("medical_app_db_query_rows", "Rows returned or affected by SQL statements.", ["method"])
+)
+UI_CALLBACK_SECONDS = REGISTRY.register(
+    Histogram("medical_app_ui_callback_duration_seconds", "Time spent on the Tk thread in task callbacks.", ["callback"])
+)
+UI_STALL_SECONDS = REGISTRY.register(
+    Histogram("medical_app_ui_stall_duration_seconds", "Event-loop stalls caught by the UI watchdog.", ["view"])
+)
+
+
+def _record(event):
+    # tracing listener
+    method = event.method or "-"
+    if isinstance(event, tracing.CallEvent):
+        DB_METHOD_SECONDS.observe(event.elapsed, method=method)
+        if event.error:
+            DB_METHOD_ERRORS.inc(method=method, error=event.error)
+    else:
+        DB_QUERIES.inc(method=method)
+        DB_QUERY_ROWS.inc(event.rows, method=method)
+
+
+POOL_COUNTERS = (
+    ("checkouts", "Connections handed out by the pool."),
+    ("created", "Connections opened by the pool."),
+    ("discarded", "Connections closed after failing a health check or an error."),
+    ("evicted", "Idle connections closed after the idle timeout."),
+    ("timeouts", "Checkouts that gave up waiting for a free connection."),
+)
+
+
+def database_collector(database):
+    def collect():
+        pool = database.pool.stats()
+        yield "medical_app_pool_size", "gauge", "Maximum pooled connections.", [({}, pool["size"])]
+        yield "medical_app_pool_connections", "gauge", "Pooled connections by state.", [
+            ({"state": "open"}, pool["open"]),
+            ({"state": "idle"}, pool["idle"]),
+            ({"state": "in_use"}, pool["in_use"]),
+        ]
+        for name, documentation in POOL_COUNTERS:
+            yield f"medical_app_pool_{name}", "counter", documentation, [({}, pool[name])]
+
+        cache = database.cache_stats()
+        yield "medical_app_cache_entries", "gauge", "Entries in the in-process cache.", [({}, cache["size"])]
+        for name in ("hits", "misses", "evictions", "invalidations"):
+            yield f"medical_app_cache_{name}", "counter", f"In-process cache {name}.", [({}, cache[name])]
+
+        work = database.work_stats()
+        yield "medical_app_transactions", "counter", "Committed and rolled back transactions.", [
+            ({"outcome": "commit"}, work["transactions_committed"]),
+            ({"outcome": "rollback"}, work["transactions_rolled_back"]),
+        ]
+        yield "medical_app_medicine_logs_generated", "counter", "Occurrences handled by the log generator.", [
+            ({"result": "created"}, work["logs_created"]),
+            ({"result": "skipped"}, work["logs_skipped"]),
+        ]
+
+    return collect
+
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve ``/metrics`` from a daemon thread. Binds to localhost by default;
+    the page is unauthenticated."""
+    # Imported here, as most runs never serve metrics and it slows startup
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would otherwise flood stderr
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_file(path, registry=REGISTRY):
+    # Written to a temporary file and renamed so readers never see half a page
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(registry.render())
+    os.replace(temporary, path)
+
+
+def start_file_writer(path, interval, registry=REGISTRY):
+    stop = threading.Event()
+
+    def run():
+        while True:
+            try:
+                write_file(path, registry)
+            except OSError:
+                logger.exception("Could not write metrics to %s", path)
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=run, name="metrics-file", daemon=True).start()
+    return stop
+
+
+_started = False
+
+
+def start(database=None):
+    """Start whichever exporters are configured and return True if any were.
+
+    ``MEDICAL_APP_METRICS_PORT`` serves the page over HTTP on localhost and
+    ``MEDICAL_APP_METRICS_FILE`` rewrites it every
+    ``MEDICAL_APP_METRICS_INTERVAL`` seconds. Database timings come from
+    tracing, so they are only published while it is on.
+    """
+    global _started
+    if _started or not (config.METRICS_PORT or config.METRICS_FILE):
+        return _started
+    _started = True
+
+    tracing.add_listener(_record)
+    if database is not None:
+        REGISTRY.add_collector(database_collector(database))
+    if config.METRICS_PORT:
+        start_http_server(config.METRICS_PORT, config.METRICS_HOST)
+    if config.METRICS_FILE:
+        start_file_writer(config.METRICS_FILE, config.METRICS_INTERVAL)
+    return True
+
+
+def time_callback(name, callback, *args):
+    started = time.perf_counter()
+    try:
+        return callback(*args)
+    finally:
+        UI_CALLBACK_SECONDS.observe(time.perf_counter() - started, callback=name)
@@ -0,0 +1,423 @@
+from src import timeslots
+
+MYSQL_INITIAL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100) UNIQUE NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        email VARCHAR(255) UNIQUE,
+        full_name VARCHAR(255) NOT NULL,
+        user_type ENUM('patient', 'doctor', 'admin') NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS medicines (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        details TEXT,
+        quantity INT NOT NULL,
+        stocked_on DATE NOT NULL,
+        expires_on DATE,
+        manufacturer VARCHAR(255),
+        batch_no VARCHAR(100),
+        storage VARCHAR(100),
+        prescription BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS prescriptions (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id INT NOT NULL,
+        doctor_id INT,
+        prescription_date DATE NOT NULL,
+        notes TEXT,
+        file_path VARCHAR(255),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (doctor_id) REFERENCES users(id) ON DELETE SET NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS medicine_schedules (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id INT NOT NULL,
+        medicine_id INT NOT NULL,
+        prescription_id INT,
+        dosage VARCHAR(100) NOT NULL,
+        frequency VARCHAR(100) NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE,
+        time_slots TEXT NOT NULL,
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (medicine_id) REFERENCES medicines(id) ON DELETE CASCADE,
+        FOREIGN KEY (prescription_id) REFERENCES prescriptions(id) ON DELETE SET NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS medicine_logs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        schedule_id INT NOT NULL,
+        scheduled_time DATETIME NOT NULL,
+        taken_time DATETIME,
+        status ENUM('scheduled', 'taken', 'missed', 'skipped') DEFAULT 'scheduled',
+        notes TEXT,
+        FOREIGN KEY (schedule_id) REFERENCES medicine_schedules(id) ON DELETE CASCADE
+    )
+    """,
+]
+
+# Same tables for SQLite: CHECK constraints stand in for ENUMs and triggers
+# for ON UPDATE CURRENT_TIMESTAMP. Timestamps are stored in local time like MySQL.
+SQLITE_INITIAL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username VARCHAR(100) UNIQUE NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        email VARCHAR(255) UNIQUE,
+        full_name VARCHAR(255) NOT NULL,
+        user_type TEXT NOT NULL CHECK (user_type IN ('patient', 'doctor', 'admin')),
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS medicines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(255) NOT NULL,
+        details TEXT,
+        quantity INT NOT NULL,
+        stocked_on DATE NOT NULL,
+        expires_on DATE,
+        manufacturer VARCHAR(255),
+        batch_no VARCHAR(100),
+        storage VARCHAR(100),
+        prescription BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS medicines_updated_at
+    AFTER UPDATE ON medicines FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+    BEGIN
+        UPDATE medicines SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS prescriptions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INT NOT NULL,
+        doctor_id INT,
+        prescription_date DATE NOT NULL,
+        notes TEXT,
+        file_path VARCHAR(255),
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (doctor_id) REFERENCES users(id) ON DELETE SET NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS medicine_schedules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INT NOT NULL,
+        medicine_id INT NOT NULL,
+        prescription_id INT,
+        dosage VARCHAR(100) NOT NULL,
+        frequency VARCHAR(100) NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE,
+        time_slots TEXT NOT NULL,
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (medicine_id) REFERENCES medicines(id) ON DELETE CASCADE,
+        FOREIGN KEY (prescription_id) REFERENCES prescriptions(id) ON DELETE SET NULL
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS medicine_schedules_updated_at
+    AFTER UPDATE ON medicine_schedules FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+    BEGIN
+        UPDATE medicine_schedules SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS medicine_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        schedule_id INT NOT NULL,
+        scheduled_time DATETIME NOT NULL,
+        taken_time DATETIME,
+        status TEXT DEFAULT 'scheduled'
+            CHECK (status IN ('scheduled', 'taken', 'missed', 'skipped')),
+        notes TEXT,
+        FOREIGN KEY (schedule_id) REFERENCES medicine_schedules(id) ON DELETE CASCADE
+    )
+    """,
+]
+
+# Drop duplicate logs for the same dose, keeping any the patient acted on
+DEDUPLICATE_MEDICINE_LOGS = """
+DELETE FROM medicine_logs
+WHERE id IN (
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY schedule_id, scheduled_time
+            ORDER BY status IN ('taken', 'skipped') DESC, id
+        ) AS duplicate_rank
+        FROM medicine_logs
+    ) ranked
+    WHERE duplicate_rank > 1
+)
+"""
+
+MYSQL_INDEXES = [
+    DEDUPLICATE_MEDICINE_LOGS,
+    """
+    CREATE UNIQUE INDEX uq_medicine_logs_schedule_time
+    ON medicine_logs (schedule_id, scheduled_time)
+    """,
+    """
+    CREATE INDEX idx_medicine_logs_scheduled_time
+    ON medicine_logs (scheduled_time)
+    """,
+    """
+    CREATE INDEX idx_medicine_schedules_patient_dates
+    ON medicine_schedules (patient_id, start_date, end_date)
+    """,
+    """
+    CREATE INDEX idx_prescriptions_patient_date
+    ON prescriptions (patient_id, prescription_date)
+    """,
+    """
+    CREATE INDEX idx_medicines_expires_on
+    ON medicines (expires_on)
+    """,
+]
+
+SQLITE_INDEXES = [
+    DEDUPLICATE_MEDICINE_LOGS,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_medicine_logs_schedule_time
+    ON medicine_logs (schedule_id, scheduled_time)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_medicine_logs_scheduled_time
+    ON medicine_logs (scheduled_time)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_medicine_schedules_patient_dates
+    ON medicine_schedules (patient_id, start_date, end_date)
+    """,
+    # SQLite does not index foreign keys on its own
+    """
+    CREATE INDEX IF NOT EXISTS idx_medicine_schedules_medicine
+    ON medicine_schedules (medicine_id)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_prescriptions_patient_date
+    ON prescriptions (patient_id, prescription_date)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_medicines_expires_on
+    ON medicines (expires_on)
+    """,
+]
+
+MYSQL_LOOKUP_INDEXES = [
+    """
+    CREATE INDEX idx_users_type_name
+    ON users (user_type, full_name)
+    """,
+]
+
+SQLITE_LOOKUP_INDEXES = [
+    """
+    CREATE INDEX IF NOT EXISTS idx_users_type_name
+    ON users (user_type, full_name)
+    """,
+    # Deleting a prescription checks the schedules referring to it
+    """
+    CREATE INDEX IF NOT EXISTS idx_medicine_schedules_prescription
+    ON medicine_schedules (prescription_id)
+    """,
+]
+
+SCHEDULE_SLOTS_TABLE = """
+CREATE TABLE IF NOT EXISTS medicine_schedule_slots (
+    schedule_id INT NOT NULL,
+    minute_of_day SMALLINT NOT NULL CHECK (minute_of_day BETWEEN 0 AND 1439),
+    PRIMARY KEY (schedule_id, minute_of_day),
+    FOREIGN KEY (schedule_id) REFERENCES medicine_schedules(id) ON DELETE CASCADE
+)
+"""
+
+
+def backfill_schedule_slots(cursor):
+    # Slots that never parsed stay text-only; Database falls back to the text
+    cursor.execute("SELECT id, time_slots FROM medicine_schedules")
+    values = []
+    for schedule_id, time_slots in cursor.fetchall():
+        try:
+            minutes = timeslots.parse(time_slots)
+        except ValueError:
+            continue
+        values.extend((schedule_id, minute) for minute in minutes)
+    if values:
+        cursor.executemany(
+            "INSERT INTO medicine_schedule_slots (schedule_id, minute_of_day) VALUES (%s, %s)", values
+        )
+
+
+# Doses of a schedule before logs_until all have a medicine_logs row; the
+# materializer (src/materializer.py) only works past it
+SCHEDULE_WATERMARKS_TABLE = """
+CREATE TABLE IF NOT EXISTS schedule_log_watermarks (
+    schedule_id INT PRIMARY KEY,
+    logs_until DATETIME NOT NULL,
+    FOREIGN KEY (schedule_id) REFERENCES medicine_schedules(id) ON DELETE CASCADE
+)
+"""
+
+
+# High-water marks of periodic jobs, such as the missed-dose sweep
+JOB_WATERMARKS_TABLE = """
+CREATE TABLE IF NOT EXISTS job_watermarks (
+    job VARCHAR(64) PRIMARY KEY,
+    high_water DATETIME NOT NULL
+)
+"""
+
+# Minutes after its time an untouched dose counts as missed. The missed-dose
+# sweep relies on the upper bound (MAX_MISSED_AFTER_MINUTES in src/database.py)
+MISSED_AFTER_COLUMN = """
+ALTER TABLE medicine_schedules
+ADD COLUMN missed_after_minutes SMALLINT NOT NULL DEFAULT 60
+    CHECK (missed_after_minutes BETWEEN 0 AND 1440)
+"""
+
+
+# Ordered schema migrations: (version, description, statements per backend).
+# A statement may also be a function taking a cursor, for data migrations.
+# Append new entries; never edit one that has shipped.
+MIGRATIONS = [
+    (
+        1,
+        "initial schema",
+        {"mysql": MYSQL_INITIAL_SCHEMA, "sqlite": SQLITE_INITIAL_SCHEMA},
+    ),
+    (
+        2,
+        "indexes for date-range lookups and one log per dose",
+        {"mysql": MYSQL_INDEXES, "sqlite": SQLITE_INDEXES},
+    ),
+    (
+        3,
+        "indexes for the doctor list and prescription deletes",
+        {"mysql": MYSQL_LOOKUP_INDEXES, "sqlite": SQLITE_LOOKUP_INDEXES},
+    ),
+    (
+        4,
+        "time slots as minute-of-day rows",
+        {
+            "mysql": [SCHEDULE_SLOTS_TABLE, backfill_schedule_slots],
+            "sqlite": [SCHEDULE_SLOTS_TABLE + " WITHOUT ROWID", backfill_schedule_slots],
+        },
+    ),
+    (
+        5,
+        "per-schedule log watermarks",
+        {
+            "mysql": [SCHEDULE_WATERMARKS_TABLE],
+            "sqlite": [SCHEDULE_WATERMARKS_TABLE],
+        },
+    ),
+    (
+        6,
+        "per-schedule missed-dose grace period and job watermarks",
+        {
+            "mysql": [
+                MISSED_AFTER_COLUMN,
+                JOB_WATERMARKS_TABLE,
+                "CREATE INDEX idx_medicine_logs_status_time ON medicine_logs (status, scheduled_time)",
+            ],
+            "sqlite": [
+                MISSED_AFTER_COLUMN,
+                JOB_WATERMARKS_TABLE,
+                "CREATE INDEX IF NOT EXISTS idx_medicine_logs_status_time ON medicine_logs (status, scheduled_time)",
+            ],
+        },
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def current_version(connection, backend):
+    cursor = backend.cursor(connection)
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        result = cursor.fetchone()
+    except Exception as e:
+        if not backend.is_missing_table_error(e):
+            raise
+        return 0  # Fresh database, or one created before versioning
+    finally:
+        cursor.close()
+    return result[0] or 0
+
+
+def migrate(connection, backend):
+    """Bring the schema up to LATEST_VERSION and return the versions applied.
+
+    The fast path is a single version read. Pending migrations run under a
+    backend lock so concurrent clients starting together apply each one once.
+    """
+    if current_version(connection, backend) >= LATEST_VERSION:
+        return []
+
+    backend.acquire_migration_lock(connection)
+    applied = []
+    try:
+        cursor = backend.cursor(connection)
+        cursor.execute(SCHEMA_VERSION_TABLE)
+        version = current_version(connection, backend)
+
+        for migration_version, description, statements in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            for statement in statements[backend.name]:
+                if callable(statement):
+                    statement(cursor)  # Data migrations that need Python
+                else:
+                    cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (migration_version, description),
+            )
+            if not backend.transactional_ddl:
+                connection.commit()
+            applied.append(migration_version)
+
+        # Backends with transactional DDL apply all pending migrations atomically
+        connection.commit()
+        cursor.close()
+    finally:
+        backend.release_migration_lock(connection)
+
+    return applied
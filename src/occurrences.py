@@ -0,0 +1,148 @@
+"""Dose occurrences computed from schedule definitions.
+
+A medicine_logs row is only stored once a dose is acted on or falls due.
+Upcoming doses are *virtual*: computed here when a screen asks for them
+and identified by ids like ``v:<schedule_id>:<YYYYMMDDHHMM>``, which
+Database.update_medicine_log accepts like any other log id.
+"""
+
+import heapq
+from datetime import date, datetime, timedelta
+
+VIRTUAL_PREFIX = "v:"
+
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def iter_occurrences(schedule, minutes, start, end):
+    """Yield the dose times of ``schedule`` in [start, end), in order.
+
+    ``minutes`` are the schedule's dose times as minutes past midnight and
+    ``start`` and ``end`` are datetimes. Open-ended schedules are fine: only
+    the requested window is ever computed.
+    """
+    first_day = max(start.date(), to_date(schedule["start_date"]))
+    last_day = (end - timedelta(microseconds=1)).date()
+    if schedule["end_date"]:
+        last_day = min(last_day, to_date(schedule["end_date"]))
+
+    offsets = [timedelta(minutes=minute) for minute in minutes]
+    day = first_day
+    while day <= last_day:
+        day_start = datetime.combine(day, datetime.min.time())
+        for offset in offsets:
+            scheduled_time = day_start + offset
+            if start <= scheduled_time < end:
+                yield scheduled_time
+        day += timedelta(days=1)
+
+
+def diff_occurrences(old, old_minutes, new, new_minutes, start, end):
+    """(removed, added): the dose times in [start, end) that only the old, or
+    only the new, version of a schedule has, each in time order.
+
+    Worked out from the two definitions, so the cost follows the change:
+    the days only one version covers, and on the days both cover, the
+    time slots only one of them has.
+    """
+    old_minutes, new_minutes = set(old_minutes), set(new_minutes)
+    removed = []
+    added = []
+    for days in _days_only_in(old, new):
+        removed.extend(iter_occurrences(days, sorted(old_minutes), start, end))
+    for days in _days_only_in(new, old):
+        added.extend(iter_occurrences(days, sorted(new_minutes), start, end))
+    both = _days_in_both(old, new)
+    if both is not None:
+        removed.extend(iter_occurrences(both, sorted(old_minutes - new_minutes), start, end))
+        added.extend(iter_occurrences(both, sorted(new_minutes - old_minutes), start, end))
+    return sorted(removed), sorted(added)
+
+
+def _days(first, last):
+    # A day range in the shape iter_occurrences takes; last is None when open-ended
+    return {"start_date": first, "end_date": last}
+
+
+def _last_day(schedule):
+    return to_date(schedule["end_date"]) if schedule["end_date"] else None
+
+
+def _days_only_in(a, b):
+    a_first, a_last = to_date(a["start_date"]), _last_day(a)
+    b_first, b_last = to_date(b["start_date"]), _last_day(b)
+    ranges = []
+    if a_first < b_first:
+        last = b_first - timedelta(days=1)
+        ranges.append(_days(a_first, last if a_last is None else min(a_last, last)))
+    if b_last is not None and (a_last is None or a_last > b_last):
+        ranges.append(_days(max(a_first, b_last + timedelta(days=1)), a_last))
+    return ranges
+
+
+def _days_in_both(a, b):
+    first = max(to_date(a["start_date"]), to_date(b["start_date"]))
+    lasts = [day for day in (_last_day(a), _last_day(b)) if day is not None]
+    last = min(lasts) if lasts else None
+    if last is not None and last < first:
+        return None
+    return _days(first, last)
+
+
+def virtual_id(schedule_id, scheduled_time):
+    return f"{VIRTUAL_PREFIX}{schedule_id}:{scheduled_time:%Y%m%d%H%M}"
+
+
+def parse_virtual_id(log_id):
+    """(schedule_id, scheduled_time) of a virtual log id, or None for the id
+    of a stored row."""
+    if not isinstance(log_id, str) or not log_id.startswith(VIRTUAL_PREFIX):
+        return None
+    try:
+        schedule_id, stamp = log_id[len(VIRTUAL_PREFIX):].split(":")
+        return int(schedule_id), datetime.strptime(stamp, "%Y%m%d%H%M")
+    except ValueError:
+        raise ValueError(f"Invalid log id: {log_id}")
+
+
+def virtual_logs(schedules, slots, start, end, stored, status_of):
+    """Yield a log dict, shaped like a stored row joined with its schedule,
+    for every occurrence in [start, end) that has no stored row, in time
+    order.
+
+    ``slots`` maps schedule ids to minutes of day, ``stored`` is the set of
+    (schedule_id, scheduled_time) already in medicine_logs and
+    ``status_of(schedule, scheduled_time)`` gives the status to show.
+    """
+
+    def for_schedule(schedule):
+        for scheduled_time in iter_occurrences(schedule, slots[schedule["id"]], start, end):
+            if (schedule["id"], scheduled_time) in stored:
+                continue
+            yield {
+                "id": virtual_id(schedule["id"], scheduled_time),
+                "schedule_id": schedule["id"],
+                "scheduled_time": scheduled_time,
+                "taken_time": None,
+                "status": status_of(schedule, scheduled_time),
+                "notes": None,
+                "dosage": schedule["dosage"],
+                "medicine_name": schedule["medicine_name"],
+            }
+
+    return heapq.merge(*(for_schedule(schedule) for schedule in schedules), key=_log_order)
+
+
+def merge_logs(stored, virtual):
+    # Both already sorted by (scheduled_time, schedule_id)
+    return list(heapq.merge(stored, virtual, key=_log_order))
+
+
+def _log_order(log):
+    return log["scheduled_time"], log["schedule_id"]
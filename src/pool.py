@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeoutError(PoolError):
+    pass
+
+
+def _default_health_check(connection):
+    return connection.is_connected()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections.
+
+    Connections are opened lazily up to ``size`` by the ``connect`` factory.
+    Idle connections older than ``idle_timeout`` seconds are closed, and a
+    connection that sat idle longer than ``health_check_interval`` seconds is
+    checked with ``health_check`` before it is handed out again.
+    """
+
+    def __init__(
+        self,
+        connect,
+        size=5,
+        checkout_timeout=10,
+        idle_timeout=300,
+        health_check_interval=30,
+        health_check=_default_health_check,
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self._connect = connect
+        self._health_check = health_check
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        self._condition = threading.Condition()
+        self._idle = deque()  # (connection, returned_at), most recently used last
+        self._open = 0
+        self._closed = False
+
+        self.created = 0
+        self.discarded = 0
+        self.evicted = 0
+        self.timeouts = 0
+        self.checkouts = 0
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            connection, returned_at = self._checkout(deadline)
+            if connection is None:
+                return self._open_connection()
+
+            idle_for = time.monotonic() - returned_at
+            if idle_for < self.health_check_interval or self._is_healthy(connection):
+                return connection
+            self._discard(connection)
+
+    def release(self, connection):
+        if not self._reset(connection):
+            self._discard(connection)
+            return
+
+        with self._condition:
+            if self._closed:
+                self._open -= 1
+                self._close_quietly(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+            self._condition.notify_all()
+
+        for connection in idle:
+            self._close_quietly(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "created": self.created,
+                "discarded": self.discarded,
+                "evicted": self.evicted,
+                "timeouts": self.timeouts,
+                "checkouts": self.checkouts,
+            }
+
+    def _checkout(self, deadline):
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+
+                expired = self._evict_expired()
+                if expired:
+                    break
+
+                if self._idle:
+                    self.checkouts += 1
+                    return self._idle.pop()
+
+                if self._open < self.size:
+                    self._open += 1
+                    self.checkouts += 1
+                    return None, None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {self.checkout_timeout}s waiting for a database connection"
+                    )
+                self._condition.wait(remaining)
+
+        # Close evicted connections outside the lock, then try again
+        for connection in expired:
+            self._close_quietly(connection)
+        return self._checkout(deadline)
+
+    def _evict_expired(self):
+        # Oldest connections sit at the left end of the deque
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+        self._open -= len(expired)
+        self.evicted += len(expired)
+        return expired
+
+    def _open_connection(self):
+        try:
+            connection = self._connect()
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.created += 1
+        return connection
+
+    def _discard(self, connection):
+        with self._condition:
+            self._open -= 1
+            self.discarded += 1
+            self._condition.notify()
+        self._close_quietly(connection)
+
+    def _is_healthy(self, connection):
+        try:
+            return bool(self._health_check(connection))
+        except Exception:
+            return False
+
+    def _reset(self, connection):
+        # End any transaction a borrower left open so the next one starts clean
+        try:
+            if getattr(connection, "in_transaction", False):
+                connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
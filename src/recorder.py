@@ -0,0 +1,215 @@
+import atexit
+import functools
+import gzip
+import hashlib
+import hmac
+import inspect
+import json
+import secrets
+import threading
+import time
+from datetime import date, datetime
+
+from src import config
+
+TRACE_VERSION = 1
+
+# Free-text arguments replaced by pseudonyms in anonymized traces. Ids,
+# dates and statuses are kept so the trace replays the same access pattern.
+SENSITIVE_ARGUMENTS = {
+    "username",
+    "password",
+    "email",
+    "full_name",
+    "notes",
+    "details",
+    "file_path",
+    "name",
+    "manufacturer",
+    "batch_no",
+    "storage",
+    "dosage",
+}
+
+# Not part of the workload
+UNRECORDED_METHODS = {"in_transaction", "cache_stats", "work_stats", "migrate_schema"}
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat(" ")}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$d" in value:
+            return date.fromisoformat(value["$d"])
+        return {key: decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+
+class TraceRecorder:
+    """Writes every top-level Database call to a gzipped JSON-lines trace.
+
+    Each line holds the call's offset from the start of the recording, the
+    recording thread, the method, its arguments and its duration. Calls a
+    Database method makes internally are not recorded, so replaying the
+    trace repeats the workload exactly once. With ``anonymize`` the
+    free-text arguments in SENSITIVE_ARGUMENTS become stable pseudonyms.
+    """
+
+    def __init__(self, path, anonymize=True):
+        self.path = path
+        self.anonymize = anonymize
+        self._key = secrets.token_bytes(16)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._threads = {}
+        self._started = time.perf_counter()
+        self._write({
+            "version": TRACE_VERSION,
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "anonymized": anonymize,
+        })
+        atexit.register(self.close)
+
+    def attach(self, database):
+        for name, method in inspect.getmembers(type(database), inspect.isfunction):
+            if name.startswith("_") or name in UNRECORDED_METHODS:
+                continue
+            if inspect.isgeneratorfunction(inspect.unwrap(method)) and not inspect.isgeneratorfunction(method):
+                continue  # Context managers like transaction()
+            setattr(database, name, self._wrap(name, method, getattr(database, name)))
+        return database
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def _wrap(self, name, unbound, method):
+        signature = inspect.signature(unbound)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            local = self._local
+            if getattr(local, "depth", 0):
+                return method(*args, **kwargs)
+
+            offset = time.perf_counter() - self._started
+            local.depth = 1
+            error = None
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                local.depth = 0
+                if error:
+                    self._record(name, signature, args, kwargs, offset, self._elapsed(offset), error)
+
+            if inspect.isgenerator(result):
+                return self._consume(result, name, signature, args, kwargs, offset)
+            self._record(name, signature, args, kwargs, offset, self._elapsed(offset), None)
+            return result
+
+        return wrapper
+
+    def _consume(self, generator, name, signature, args, kwargs, offset):
+        # Generators are recorded once the caller is done with them, timing
+        # only the steps taken inside the generator
+        elapsed = 0.0
+        error = None
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    error = type(e).__name__
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            generator.close()
+            self._record(name, signature, args, kwargs, offset, elapsed, error)
+
+    def _elapsed(self, offset):
+        return time.perf_counter() - self._started - offset
+
+    def _record(self, name, signature, args, kwargs, offset, elapsed, error):
+        bound = signature.bind_partial(None, *args, **kwargs)
+        arguments = dict(bound.arguments)
+        arguments.pop(next(iter(signature.parameters)))  # self
+        if self.anonymize:
+            for key, value in arguments.items():
+                if key in SENSITIVE_ARGUMENTS and isinstance(value, str):
+                    arguments[key] = self._pseudonym(value)
+
+        entry = {
+            "t": round(offset, 6),
+            "th": self._thread_number(),
+            "m": name,
+            "a": encode_value(arguments),
+            "d": round(elapsed, 6),
+        }
+        if error:
+            entry["e"] = error
+        self._write(entry)
+
+    def _pseudonym(self, value):
+        # Same input, same pseudonym within one trace; not reversible without the key
+        digest = hmac.new(self._key, value.encode(), hashlib.sha256).hexdigest()
+        return f"anon_{digest[:12]}"
+
+    def _thread_number(self):
+        # Small stable numbers instead of OS thread ids
+        ident = threading.get_ident()
+        with self._lock:
+            return self._threads.setdefault(ident, len(self._threads))
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+
+def record(database, path=None, anonymize=None):
+    """Start recording ``database``'s calls to ``path`` (default from config)."""
+    if anonymize is None:
+        anonymize = config.RECORD_ANONYMIZE
+    recorder = TraceRecorder(path or config.RECORD_TRACE, anonymize=anonymize)
+    recorder.attach(database)
+    database.recorder = recorder
+    return recorder
+
+
+def read_trace(path):
+    """Return (header, entries) of a trace, with arguments decoded."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != TRACE_VERSION:
+            raise Exception(f"Unsupported trace version: {header.get('version')}")
+        entries = []
+        for line in f:
+            entry = json.loads(line)
+            entry["a"] = decode_value(entry["a"])
+            entries.append(entry)
+    return header, entries
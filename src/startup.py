@@ -0,0 +1,78 @@
+import builtins
+import sys
+import threading
+import time
+
+_profile = None
+
+
+class StartupProfile:
+    """Times module imports and startup milestones (window created, first
+    paint, database connected) from the moment it is created."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.milestones = []
+        self.imports = []  # (module, cumulative seconds, self seconds)
+        self._import = builtins.__import__
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self):
+        builtins.__import__ = self._timed_import
+        return self
+
+    def uninstall(self):
+        if builtins.__import__ == self._timed_import:
+            builtins.__import__ = self._import
+
+    def mark(self, name):
+        with self._lock:
+            self.milestones.append((name, time.perf_counter() - self.started))
+
+    def report(self, out=None, top=15):
+        out = out or sys.stderr
+        print("Startup profile", file=out)
+        for name, offset in self.milestones:
+            print(f"  {offset * 1000:9.1f} ms  {name}", file=out)
+        with self._lock:
+            imports = sorted(self.imports, key=lambda item: item[1], reverse=True)[:top]
+        print(f"  {'import':40} {'total ms':>9} {'self ms':>9}", file=out)
+        for module, total, own in imports:
+            print(f"  {module:40} {total * 1000:9.1f} {own * 1000:9.1f}", file=out)
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Only first imports cost anything; everything else is a dict lookup
+        if level or name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self.imports.append((name, elapsed, elapsed - children))
+
+
+def start_profile():
+    global _profile
+    _profile = StartupProfile().install()
+    return _profile
+
+
+def mark(name):
+    # A no-op unless the app was started with --profile-startup
+    if _profile is not None:
+        _profile.mark(name)
+
+
+def report():
+    if _profile is not None:
+        _profile.uninstall()
+        _profile.report()
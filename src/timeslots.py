@@ -0,0 +1,41 @@
+import functools
+
+
+def parse(time_slots):
+    """Parse a comma-separated "HH:MM" list, e.g. "08:00, 20:30", into a
+    sorted tuple of distinct minutes past midnight.
+
+    This is the one validator for time slots: the schedule form, Database
+    and the schema migration all go through it. Raises ValueError with a
+    message fit to show the user.
+    """
+    return _parse(str(time_slots))
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse(text):
+    # Cached by text: a clinic has a few dozen distinct slot lists
+    minutes = set()
+    for slot in text.split(","):
+        slot = slot.strip()
+        if not slot:
+            continue
+        parts = slot.split(":")
+        if len(parts) != 2 or not all(part.strip().isdigit() for part in parts):
+            raise ValueError(f"Invalid time slot format: {slot}. Please use HH:MM format.")
+        hour, minute = int(parts[0]), int(parts[1])
+        if hour > 23 or minute > 59:
+            raise ValueError(f"Invalid time slot format: {slot}. Please use HH:MM format.")
+        minutes.add(hour * 60 + minute)
+    if not minutes:
+        raise ValueError("Please enter at least one time slot")
+    return tuple(sorted(minutes))
+
+
+def format_slots(minutes):
+    return ",".join(f"{minute // 60:02d}:{minute % 60:02d}" for minute in minutes)
+
+
+def normalize(time_slots):
+    # "8:00, 20:30,08:00" -> "08:00,20:30"
+    return format_slots(parse(time_slots))
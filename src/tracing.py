@@ -0,0 +1,336 @@
+import contextvars
+import functools
+import inspect
+import logging
+import re
+import secrets
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from src import config
+
+logger = logging.getLogger("medical_app.tracing")
+slow_query_logger = logging.getLogger("medical_app.slow_queries")
+
+# One Database call or one executed statement, handed to every listener
+CallEvent = namedtuple("CallEvent", "span method elapsed error")
+QueryEvent = namedtuple("QueryEvent", "span method fingerprint elapsed rows params")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_current_method = contextvars.ContextVar("current_method", default=None)
+
+_listeners = []
+_listeners_lock = threading.Lock()
+_slow_log_configured = False
+
+
+class Span:
+    """A UI action (e.g. ``show_dashboard``) that Database work is attributed to."""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.id = secrets.token_hex(8)
+        self.parent_id = parent.id if parent else None
+        self.started = time.perf_counter()
+
+    def __repr__(self):
+        return f"Span({self.name!r}, id={self.id!r})"
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_method():
+    # The innermost instrumented Database method running in this context
+    return _current_method.get()
+
+
+@contextmanager
+def span(name):
+    """Attribute everything run in this block to a new span called ``name``.
+
+    The span travels with the context, so work handed to TaskRunner from
+    inside the block keeps it on the worker thread and in the callbacks.
+    """
+    new_span = Span(name, parent=_current_span.get())
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    finally:
+        _current_span.reset(token)
+
+
+def traced(func):
+    # Wraps a UI handler in a span named after it
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def add_listener(listener):
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def _emit(event):
+    for listener in list(_listeners):
+        try:
+            listener(event)
+        except Exception:
+            logger.exception("Tracing listener failed")
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\?(?:, \?)+\)")
+_REPEATED_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \1)+")
+
+
+@functools.lru_cache(maxsize=512)
+def fingerprint(sql):
+    """Normalize a statement so every execution of it has the same text:
+    literals and placeholders become ``?`` and repeated lists collapse."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = sql.replace("( ", "(").replace(" )", ")").replace(" ,", ",")
+    sql = _REPEATED_ROWS.sub(r"\1, ...", sql)
+    return _PLACEHOLDER_LIST.sub("(?, ...)", sql)
+
+
+def redact(params):
+    # Keep only the shape of the parameters; values may be patient data
+    if params is None:
+        return ""
+    if isinstance(params, dict):
+        return ", ".join(f"{key}={type(value).__name__}" for key, value in params.items())
+    return ", ".join(type(value).__name__ for value in params)
+
+
+class TracedCursor:
+    """Times a backend cursor's statements, including the time spent fetching
+    their rows, and reports each one when the next starts or the cursor closes."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._pending = None  # [fingerprint, elapsed, rows, params, span, method]
+
+    def execute(self, query, params=()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._start(query, params, time.perf_counter() - started)
+
+    def executemany(self, query, seq_of_params):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_of_params)
+        finally:
+            self._start(query, None, time.perf_counter() - started)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._timed(self._cursor.fetchmany, size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._count(len(rows))
+        return rows
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _start(self, query, params, elapsed):
+        self._pending = [
+            fingerprint(query),
+            elapsed,
+            0,
+            params,
+            _current_span.get(),
+            _current_method.get(),
+        ]
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if self._pending is not None:
+                self._pending[1] += time.perf_counter() - started
+
+    def _count(self, rows):
+        if self._pending is not None:
+            self._pending[2] += rows
+
+    def _finish(self):
+        if self._pending is None:
+            return
+        statement, elapsed, rows, params, current, method = self._pending
+        self._pending = None
+        if not rows and self._cursor.rowcount and self._cursor.rowcount > 0:
+            rows = self._cursor.rowcount  # Writes report affected rows
+        event = QueryEvent(current, method, statement, elapsed, rows, params)
+        if elapsed * 1000 >= config.SLOW_QUERY_MS:
+            _log_slow_query(event)
+        _emit(event)
+
+
+class TracedBackend:
+    """Backend proxy whose cursors are TracedCursors."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def cursor(self, connection, dictionary=False):
+        return TracedCursor(self.backend.cursor(connection, dictionary))
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+# Cheap accessors that would only add noise to the trace
+UNTRACED_METHODS = {"in_transaction", "cache_stats", "work_stats"}
+
+
+def instrument(database):
+    """Trace every public method of ``database`` and every statement it runs.
+
+    Methods are wrapped on the instance, so nested calls (e.g. a schedule
+    update generating its logs) are reported too.
+    """
+    if not isinstance(database.backend, TracedBackend):
+        database.backend = TracedBackend(database.backend)
+
+    for name, method in inspect.getmembers(type(database), inspect.isfunction):
+        if name.startswith("_") or name in UNTRACED_METHODS:
+            continue
+        if inspect.isgeneratorfunction(method):
+            setattr(database, name, _traced_generator(getattr(database, name)))
+        elif not inspect.isgeneratorfunction(inspect.unwrap(method)):
+            # Context managers like transaction() are left alone
+            setattr(database, name, _traced_method(getattr(database, name)))
+    return database
+
+
+def _traced_method(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        token = _current_method.set(name)
+        started = time.perf_counter()
+        error = None
+        try:
+            return method(*args, **kwargs)
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_method.reset(token)
+            _emit(CallEvent(_current_span.get(), name, elapsed, error))
+
+    return wrapper
+
+
+def _traced_generator(method):
+    # Times only the steps of the generator, not the consumer's work between them
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        generator = method(*args, **kwargs)
+        elapsed = 0.0
+        error = None
+        try:
+            while True:
+                token = _current_method.set(name)
+                started = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                except BaseException as e:
+                    error = type(e).__name__
+                    raise
+                finally:
+                    elapsed += time.perf_counter() - started
+                    _current_method.reset(token)
+                yield item
+        finally:
+            generator.close()
+            _emit(CallEvent(_current_span.get(), name, elapsed, error))
+
+    return wrapper
+
+
+def log_to_file(target, path, max_bytes, backups):
+    """Replace ``target``'s handlers with a rotating file, opened on the first
+    record, and stop its records reaching the root logger."""
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, delay=True)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    for old in list(target.handlers):
+        target.removeHandler(old)
+        old.close()
+    target.addHandler(handler)
+    target.setLevel(logging.INFO)
+    target.propagate = False
+
+
+def configure_slow_query_log(path=None, max_bytes=None, backups=None):
+    """Send slow statements to a rotating log file. Called on first use with
+    the settings from config; call it earlier to log somewhere else."""
+    global _slow_log_configured
+    log_to_file(
+        slow_query_logger,
+        path or config.SLOW_QUERY_LOG,
+        max_bytes or config.SLOW_QUERY_LOG_BYTES,
+        backups if backups is not None else config.SLOW_QUERY_LOG_BACKUPS,
+    )
+    _slow_log_configured = True
+
+
+def _log_slow_query(event):
+    if not _slow_log_configured:
+        configure_slow_query_log()
+    current = event.span
+    slow_query_logger.info(
+        "%.1fms rows=%d action=%s span=%s method=%s sql=%s params=[%s]",
+        event.elapsed * 1000,
+        event.rows,
+        current.name if current else "-",
+        current.id if current else "-",
+        event.method or "-",
+        event.fingerprint,
+        redact(event.params),
+    )
@@ -1,4 +1,17 @@
-from src.ui.home import HomeApp
-from src.ui.admin import AdminApp
-from src.ui.patient import PatientApp
+import importlib
 
+# Screens are imported on first access, so opening the login window does not
+# wait for the role screens and their dependencies
+_SCREENS = {
+    "HomeApp": "src.ui.home",
+    "AdminApp": "src.ui.admin",
+    "PatientApp": "src.ui.patient",
+}
+
+__all__ = list(_SCREENS)
+
+
+def __getattr__(name):
+    if name in _SCREENS:
+        return getattr(importlib.import_module(_SCREENS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
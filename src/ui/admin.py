@@ -1,12 +1,14 @@
 import tkinter as tk
-from datetime import date
 from tkinter import messagebox, ttk
 
 from tkcalendar import DateEntry
 
-from src.database import Database
+from src.database import get_database
+from src.tracing import traced
+from src.ui.tasks import TaskRunner
+from src.ui.watchdog import set_view
 
-db = Database()
+db = get_database()
 
 
 class AdminApp:
@@ -16,10 +18,13 @@ class AdminApp:
         self.root.title("Medicine Management System - Admin")
         self.root.geometry("900x600")
 
+        # Database work runs off the UI thread
+        self.tasks = TaskRunner(self.root)
+
         self.name_var = tk.StringVar()
         self.details_var = tk.StringVar()
         self.quantity_var = tk.StringVar()
-        self.stocked_on_var = tk.StringVar(value=str(date.today()))
+        self.stocked_on_var = tk.StringVar(value=str(db.clock.today()))
         self.expires_on_var = tk.StringVar()
         self.manufacturer_var = tk.StringVar()
         self.batch_no_var = tk.StringVar()
@@ -59,9 +64,11 @@ class AdminApp:
     
     def logout(self):
         if messagebox.askyesno("Logout", "Are you sure you want to logout?"):
+            self.tasks.shutdown()
             self.root.destroy()
 
     def show_main_page(self):
+        set_view("admin.medicines")
         self.form_frame.pack_forget()
         self.main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
 
@@ -117,8 +124,9 @@ class AdminApp:
         self.load_medicines()
 
     def show_remove_dropdown(self):
-        medicines = db.get_all_medicines()
+        self.tasks.submit(db.get_all_medicines, on_success=self.open_remove_popup, key="remove")
 
+    def open_remove_popup(self, medicines):
         if not medicines:
             messagebox.showinfo("No Medicines", "There are no medicines to remove.")
             return
@@ -161,6 +169,7 @@ class AdminApp:
             side=tk.LEFT, padx=10
         )
 
+    @traced
     def confirm_remove_medicine(self):
         selected = self.selected_medicine_var.get()
 
@@ -179,36 +188,50 @@ class AdminApp:
         )
 
         if confirm:
-            try:
-                db.remove_medicine(medicine_id)
+            def removed(result):
                 messagebox.showinfo(
                     "Success", f"Medicine '{medicine_name}' removed successfully"
                 )
 
                 self.load_medicines()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to remove medicine: {str(e)}")
 
-    def load_medicines(self):
-        for item in self.medicine_tree.get_children():
-            self.medicine_tree.delete(item)
-
-        medicines = db.get_all_medicines()
-
-        for medicine in medicines:
-            self.medicine_tree.insert(
-                "",
-                tk.END,
-                values=(
-                    medicine["id"],
-                    medicine["name"],
-                    medicine["quantity"],
-                    medicine["manufacturer"],
-                    medicine["expires_on"],
-                ),
+            self.tasks.submit(
+                db.remove_medicine,
+                medicine_id,
+                on_success=removed,
+                on_error=lambda e: messagebox.showerror("Error", f"Failed to remove medicine: {str(e)}"),
             )
 
+    @traced
+    def load_medicines(self):
+        tree = self.medicine_tree
+        for item in tree.get_children():
+            tree.delete(item)
+
+        # Loading placeholder row until the query returns
+        tree.insert("", tk.END, values=("", "Loading..."))
+
+        def loaded(medicines):
+            for item in tree.get_children():
+                tree.delete(item)
+
+            for medicine in medicines:
+                tree.insert(
+                    "",
+                    tk.END,
+                    values=(
+                        medicine["id"],
+                        medicine["name"],
+                        medicine["quantity"],
+                        medicine["manufacturer"],
+                        medicine["expires_on"],
+                    ),
+                )
+
+        self.tasks.submit(db.get_all_medicines, on_success=loaded, key="medicines")
+
     def show_form_page(self):
+        set_view("admin.add_medicine")
         self.main_frame.pack_forget()
         self.form_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
 
@@ -295,6 +318,7 @@ class AdminApp:
             row=row, columnspan=2, pady=10
         )
 
+    @traced
     def submit_form(self):
         try:
             data = {
@@ -313,20 +337,28 @@ class AdminApp:
                 messagebox.showerror("Error", "Name and Quantity are required fields")
                 return
 
-            db.add_medicine(
-                name=data["Name"],
-                details=data["Details"],
-                quantity=int(data["Quantity"]),
-                stocked_on=data["Stocked On"],
-                expires_on=data["Expires On"],
-                manufacturer=data["Manufacturer"],
-                batch_no=data["Batch Number"],
-                storage=data["Storage Instructions"],
-                prescription=data["Prescription Required"],
-            )
+            quantity = int(data["Quantity"])
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to add medicine: {str(e)}")
+            return
+
+        def added(result):
             messagebox.showinfo(
                 "Success", f"Medicine '{data['Name']}' added successfully"
             )
             self.show_main_page()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to add medicine: {str(e)}")
\ No newline at end of file
+
+        self.tasks.submit(
+            db.add_medicine,
+            name=data["Name"],
+            details=data["Details"],
+            quantity=quantity,
+            stocked_on=data["Stocked On"],
+            expires_on=data["Expires On"],
+            manufacturer=data["Manufacturer"],
+            batch_no=data["Batch Number"],
+            storage=data["Storage Instructions"],
+            prescription=data["Prescription Required"],
+            on_success=added,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to add medicine: {str(e)}"),
+        )
\ No newline at end of file
@@ -1,13 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
-import os
 
-from src.database import Database
-from src.ui.admin import AdminApp
-from src.ui.patient import PatientApp
+from src import materializer, metrics, startup
+from src.database import get_database
+from src.tracing import traced
+from src.ui.tasks import TaskRunner
+from src.ui.watchdog import set_view
+
+# Opened by Patient Access; created with the other fixtures (MEDICAL_APP_FIXTURES)
+DEMO_PATIENT = "patient1"
+
+
+def open_database():
+    # Runs on a worker thread: connecting and migrating can take seconds
+    database = get_database()
+    metrics.start(database)
+    materializer.start(database)
+    return database
 
-db = Database()
 
 class HomeApp:
     def __init__(self, root):
@@ -15,6 +25,13 @@ class HomeApp:
         self.root.title("Medical Management System")
         self.root.geometry("800x600")
         
+        # The login screen paints first; the database connects behind it
+        self.db = None
+        self.tasks = TaskRunner(self.root)
+        self.status = ("Connecting to the database...", "gray")
+        self.painted = False
+        self.root.bind("<Map>", self.on_map, add="+")
+        
         # Main content frame
         self.main_frame = ttk.Frame(self.root)
         self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -25,8 +42,10 @@ class HomeApp:
         
         # Create the home screen
         self.create_home_screen()
+        self.connect_database()
         
     def create_home_screen(self):
+        set_view("home")
         # Clear any existing widgets
         for widget in self.main_frame.winfo_children():
             widget.destroy()
@@ -55,7 +74,10 @@ class HomeApp:
         ttk.Label(login_frame, text="Password:").pack(anchor=tk.W, pady=(5, 5))
         ttk.Entry(login_frame, textvariable=self.password_var, show="*", width=30).pack(fill=tk.X, pady=(0, 10))
         
-        ttk.Button(login_frame, text="Login", command=self.login).pack(pady=(10, 0))
+        self.action_buttons = []
+        login_button = ttk.Button(login_frame, text="Login", command=self.login)
+        login_button.pack(pady=(10, 0))
+        self.action_buttons.append(login_button)
         
         # Right panel - Quick access
         access_frame = ttk.LabelFrame(content_frame, text="Quick Access", padding=(20, 10))
@@ -67,17 +89,20 @@ class HomeApp:
             font=("Arial", 12)
         ).pack(anchor=tk.W, pady=(10, 20))
         
-        ttk.Button(
+        admin_button = ttk.Button(
             access_frame, 
             text="Admin Access",
             command=self.open_admin_interface
-        ).pack(fill=tk.X, pady=5)
+        )
+        admin_button.pack(fill=tk.X, pady=5)
         
-        ttk.Button(
+        patient_button = ttk.Button(
             access_frame, 
             text="Patient Access",
             command=self.open_patient_interface
-        ).pack(fill=tk.X, pady=5)
+        )
+        patient_button.pack(fill=tk.X, pady=5)
+        self.action_buttons.extend([admin_button, patient_button])
         
         # Footer
         footer_frame = ttk.Frame(self.main_frame)
@@ -88,7 +113,62 @@ class HomeApp:
             text="© 2025 Medical Management System",
             font=("Arial", 8)
         ).pack(side=tk.RIGHT)
+        
+        # Database status
+        self.status_label = ttk.Label(footer_frame, font=("Arial", 8))
+        self.status_label.pack(side=tk.LEFT)
+        self.retry_button = ttk.Button(footer_frame, text="Retry", command=self.connect_database)
+        self.update_status()
+    
+    def connect_database(self):
+        self.status = ("Connecting to the database...", "gray")
+        self.update_status()
+        self.tasks.submit(
+            open_database,
+            on_success=self.on_database_ready,
+            on_error=self.on_database_error,
+            key="connect",
+        )
+    
+    def on_database_ready(self, database):
+        self.db = database
+        self.status = ("Database connected", "gray")
+        self.update_status()
+        startup.mark("database connected")
+        self.report_startup()
+    
+    def on_database_error(self, error):
+        self.status = (f"Database unavailable: {error}", "red")
+        self.update_status()
+    
+    def update_status(self):
+        text, color = self.status
+        self.status_label.config(text=text, foreground=color)
+        if color == "red":
+            self.retry_button.pack(side=tk.LEFT, padx=(10, 0))
+        else:
+            self.retry_button.pack_forget()
+        for button in self.action_buttons:
+            button.config(state=tk.NORMAL if self.db else tk.DISABLED)
+    
+    def on_map(self, event):
+        if event.widget is self.root and not self.painted:
+            # Drawing happens in idle callbacks queued when the window maps
+            self.root.after_idle(self.on_first_paint)
     
+    def on_first_paint(self):
+        if self.painted:
+            return
+        self.painted = True
+        startup.mark("first paint")
+        self.report_startup()
+    
+    def report_startup(self):
+        # With --profile-startup, once both the window and the database are up
+        if self.painted and self.db:
+            startup.report()
+    
+    @traced
     def login(self):
         username = self.username_var.get()
         password = self.password_var.get()
@@ -97,20 +177,21 @@ class HomeApp:
             messagebox.showerror("Error", "Please enter both username and password")
             return
         
-        user = db.get_user(username)
+        def loaded(user):
+            if not user or user["password"] != password:
+                messagebox.showerror("Error", "Invalid username or password")
+                return
+            
+            # Successful login
+            self.open_interface_for_user(user)
         
-        if not user or user["password"] != password:
-            messagebox.showerror("Error", "Invalid username or password")
-            return
-        
-        # Successful login
-        self.open_interface_for_user(user)
+        self.tasks.submit(self.db.get_user, username, on_success=loaded, key="open")
     
     def open_interface_for_user(self, user):
         if user["user_type"] == "admin":
             self.open_admin_interface()
         elif user["user_type"] == "patient":
-            self.open_patient_interface(user["id"])
+            self.open_patient_interface(user)
         elif user["user_type"] == "doctor":
             # Future implementation
             messagebox.showinfo("Doctor Interface", "Doctor interface coming soon!")
@@ -118,14 +199,33 @@ class HomeApp:
             messagebox.showerror("Error", "Unknown user type")
     
     def open_admin_interface(self):
+        from src.ui.admin import AdminApp  # Imported on first use, with tkcalendar
+        
         self.root.withdraw()  # Hide main window
         admin_window = tk.Toplevel(self.root)
         app = AdminApp(admin_window, self)
         
-    def open_patient_interface(self, user_id=None):
+    def open_patient_interface(self, user=None):
+        if user is None:
+            # Check the demo patient exists before the home window goes away
+            self.tasks.submit(self.db.get_user, DEMO_PATIENT, on_success=self.open_demo_patient, key="open")
+            return
+        
+        from src.ui.patient import PatientApp  # Imported on first use, with tkcalendar
+        
         self.root.withdraw()  # Hide main window
         patient_window = tk.Toplevel(self.root)
-        app = PatientApp(patient_window, user_id, self)
+        app = PatientApp(patient_window, user, self)
+    
+    def open_demo_patient(self, user):
+        if not user:
+            messagebox.showinfo(
+                "Patient Access",
+                "There is no demo patient. Start the app with MEDICAL_APP_FIXTURES=1 to create one.",
+            )
+            return
+        self.open_patient_interface(user)
     
     def show(self):
+        set_view("home")
         self.root.deiconify()  # Show the main window again
\ No newline at end of file
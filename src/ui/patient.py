@@ -1,25 +1,31 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 from tkcalendar import DateEntry
 import os
 import subprocess
 import platform
 
-from src.database import Database
+from src import timeslots
+from src.database import get_database
+from src.tracing import traced
+from src.ui.tasks import TaskRunner, show_loading
+from src.ui.watchdog import set_view
 
-db = Database()
+db = get_database()
 
 class PatientApp:
-    def __init__(self, root, user_id=None, parent_app=None):
+    def __init__(self, root, user, parent_app=None):
         self.root = root
-        self.user_id = user_id
+        # The caller has already looked the user up
+        self.user = user
+        self.user_id = user["id"]
         self.parent_app = parent_app
         self.root.title("Medicine Management System - Patient")
         self.root.geometry("900x600")
         
-        # Get user data
-        self.user = self.get_user_data()
+        # Database and file work runs off the UI thread
+        self.tasks = TaskRunner(self.root)
         
         # Create frames
         self.dashboard_frame = ttk.Frame(self.root)
@@ -31,14 +37,6 @@ class PatientApp:
         self.create_sidebar()
         self.show_dashboard()
     
-    def get_user_data(self):
-        if not self.user_id:
-            # For demo purposes, use the first patient in the database
-            user = db.get_user("patient1")
-            self.user_id = user["id"]
-            return user
-        return db.get_user_by_id(self.user_id)
-    
     def create_header(self):
         header = ttk.Frame(self.root)
         header.pack(fill=tk.X, padx=10, pady=5)
@@ -98,7 +96,9 @@ class PatientApp:
         for frame in [self.dashboard_frame, self.schedules_frame, self.prescriptions_frame]:
             frame.pack_forget()
     
+    @traced
     def show_dashboard(self):
+        set_view("patient.dashboard")
         self.hide_all_frames()
         self.dashboard_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
@@ -112,7 +112,7 @@ class PatientApp:
         ).pack(anchor=tk.W, pady=(0, 20))
         
         # Today's date
-        today = date.today()
+        today = db.clock.today()
         ttk.Label(
             self.dashboard_frame, 
             text=f"Today: {today.strftime('%A, %B %d, %Y')}", 
@@ -133,29 +133,37 @@ class PatientApp:
         med_frame = ttk.LabelFrame(left_column, text="Today's Medication", padding=10)
         med_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Make sure logs are generated
-        db.generate_medicine_logs(today, self.user_id)
-        
-        # Get today's medication logs
-        today_logs = db.get_medicine_logs(self.user_id, today)
-        
-        if not today_logs:
-            ttk.Label(med_frame, text="No medication scheduled for today").pack(anchor=tk.W, pady=10)
-        else:
-            # Create a scrollable frame for the logs
-            self.create_medication_list(med_frame, today_logs)
-        
         # Expiring medications section
         expire_frame = ttk.LabelFrame(right_column, text="Medications Expiring Soon", padding=10)
         expire_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Get medications expiring in the next 30 days
-        expiring_meds = db.get_expiring_medicines(self.user_id)
+        med_loading = show_loading(med_frame)
+        expire_loading = show_loading(expire_frame)
         
-        if not expiring_meds:
-            ttk.Label(expire_frame, text="No medications expiring soon").pack(anchor=tk.W, pady=10)
-        else:
-            self.create_expiring_meds_list(expire_frame, expiring_meds)
+        def loaded(result):
+            today_logs, expiring_meds = result
+            med_loading.destroy()
+            expire_loading.destroy()
+            
+            if not today_logs:
+                ttk.Label(med_frame, text="No medication scheduled for today").pack(anchor=tk.W, pady=10)
+            else:
+                # Create a scrollable frame for the logs
+                self.create_medication_list(med_frame, today_logs)
+            
+            if not expiring_meds:
+                ttk.Label(expire_frame, text="No medications expiring soon").pack(anchor=tk.W, pady=10)
+            else:
+                self.create_expiring_meds_list(expire_frame, expiring_meds)
+        
+        self.tasks.submit(self.load_dashboard_data, today, on_success=loaded, key="content")
+    
+    def load_dashboard_data(self, today):
+        # Runs on a worker thread; due doses are stored by src/materializer.py
+        # Get today's medication logs and medications expiring in the next 30 days
+        today_logs = db.get_medicine_logs(self.user_id, today)
+        expiring_meds = db.get_expiring_medicines(self.user_id)
+        return today_logs, expiring_meds
     
     def create_medication_list(self, parent, logs):
         canvas = tk.Canvas(parent)
@@ -177,7 +185,7 @@ class PatientApp:
         self.display_medication_logs(scrollable_frame, logs)
     
     def display_medication_logs(self, parent, logs):
-        now = datetime.now()
+        now = db.clock.now()
         
         for log in logs:
             log_frame = ttk.Frame(parent, padding=5)
@@ -288,7 +296,7 @@ class PatientApp:
             ttk.Separator(parent, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=5)
     
     def create_expiring_meds_list(self, parent, medicines):
-        today = date.today()
+        today = db.clock.today()
         
         for med in medicines:
             med_frame = ttk.Frame(parent, padding=5)
@@ -314,13 +322,26 @@ class PatientApp:
             
             ttk.Separator(parent, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=5)
     
+    @traced
     def mark_medication(self, log_id, status):
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        db.update_medicine_log(log_id, status, now if status == "taken" else None)
-        messagebox.showinfo("Success", f"Medication marked as {status}")
-        self.show_dashboard()  # Refresh dashboard
+        now = db.clock.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        def marked(result):
+            messagebox.showinfo("Success", f"Medication marked as {status}")
+            self.show_dashboard()  # Refresh dashboard
+        
+        self.tasks.submit(
+            db.update_medicine_log,
+            log_id,
+            status,
+            now if status == "taken" else None,
+            on_success=marked,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to update medication: {str(e)}")
+        )
     
+    @traced
     def show_schedules(self):
+        set_view("patient.schedules")
         self.hide_all_frames()
         self.schedules_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
@@ -341,16 +362,22 @@ class PatientApp:
         ).pack(anchor=tk.W, pady=(0, 20))
         
         # Get all schedules
-        schedules = db.get_patient_medicine_schedules(self.user_id)
+        loading = show_loading(self.schedules_frame)
         
-        if not schedules:
-            ttk.Label(
-                self.schedules_frame, 
-                text="You don't have any medicine schedules yet.",
-                font=("Arial", 12)
-            ).pack(anchor=tk.W, pady=20)
-        else:
-            self.display_schedules(schedules)
+        def loaded(schedules):
+            loading.destroy()
+            if not schedules:
+                ttk.Label(
+                    self.schedules_frame, 
+                    text="You don't have any medicine schedules yet.",
+                    font=("Arial", 12)
+                ).pack(anchor=tk.W, pady=20)
+            else:
+                self.display_schedules(schedules)
+        
+        self.tasks.submit(
+            db.get_patient_medicine_schedules, self.user_id, on_success=loaded, key="content"
+        )
     
     def display_schedules(self, schedules):
         # Create a treeview to display schedules
@@ -413,7 +440,11 @@ class PatientApp:
         schedule_id = values[0]
         
         # Get full schedule data
-        schedule = db.get_schedule_by_id(schedule_id)
+        self.tasks.submit(
+            db.get_schedule_by_id, schedule_id, on_success=self.open_schedule_details, key="schedule"
+        )
+    
+    def open_schedule_details(self, schedule):
         if not schedule:
             messagebox.showerror("Error", "Schedule not found")
             return
@@ -508,6 +539,14 @@ class PatientApp:
         self.show_schedule_form(schedule)
     
     def show_schedule_form(self, schedule=None):
+        # The medicine list is fetched before the form opens
+        self.tasks.submit(
+            db.get_all_medicines,
+            on_success=lambda medicines: self.open_schedule_form(medicines, schedule),
+            key="schedule",
+        )
+    
+    def open_schedule_form(self, medicines, schedule=None):
         # Create popup window
         popup = tk.Toplevel(self.root)
         popup.title("Add Medicine Schedule" if not schedule else "Edit Medicine Schedule")
@@ -538,8 +577,6 @@ class PatientApp:
             font=("Arial", 11, "bold")
         ).grid(row=0, column=0, sticky=tk.W, pady=10)
         
-        # Get all medicines
-        medicines = db.get_all_medicines()
         medicine_names = [f"{m['id']} - {m['name']}" for m in medicines]
         
         medicine_var = tk.StringVar()
@@ -677,6 +714,7 @@ class PatientApp:
             command=popup.destroy
         ).pack(side=tk.LEFT, padx=5)
     
+    @traced
     def save_schedule(self, popup, schedule_id, medicine_str, dosage, frequency, time_slots, start_date, end_date, notes):
         # Validate fields
         if not medicine_str or not dosage or not frequency or not time_slots:
@@ -691,64 +729,50 @@ class PatientApp:
             return
         
         # Validate time slots format (HH:MM,HH:MM)
-        time_slots_list = time_slots.split(",")
-        for slot in time_slots_list:
-            slot = slot.strip()
-            if not slot:
-                continue
-                
-            try:
-                parts = slot.split(":")
-                if len(parts) != 2:
-                    raise ValueError
-                    
-                hour = int(parts[0])
-                minute = int(parts[1])
-                
-                if hour < 0 or hour > 23 or minute < 0 or minute > 59:
-                    raise ValueError
-            except:
-                messagebox.showerror("Error", f"Invalid time slot format: {slot}. Please use HH:MM format.")
-                return
+        try:
+            time_slots = timeslots.normalize(time_slots)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
         
         # Format dates
         start_date_str = start_date.strftime("%Y-%m-%d")
         end_date_str = end_date.strftime("%Y-%m-%d") if end_date else None
         
-        try:
-            if schedule_id:
-                # Update existing schedule
-                db.update_medicine_schedule(
-                    schedule_id,
-                    medicine_id,
-                    dosage,
-                    frequency,
-                    start_date_str,
-                    end_date_str,
-                    time_slots,
-                    notes
-                )
-                messagebox.showinfo("Success", "Medicine schedule updated successfully")
-            else:
-                # Add new schedule
-                db.add_medicine_schedule(
-                    self.user_id,
-                    medicine_id,
-                    None,  # No prescription ID
-                    dosage,
-                    frequency,
-                    start_date_str,
-                    end_date_str,
-                    time_slots,
-                    notes
-                )
-                messagebox.showinfo("Success", "Medicine schedule added successfully")
-            
+        if schedule_id:
+            # Update existing schedule
+            save = db.update_medicine_schedule
+            args = (schedule_id, medicine_id, dosage, frequency, start_date_str, end_date_str, time_slots, notes)
+            message = "Medicine schedule updated successfully"
+        else:
+            # Add new schedule
+            save = db.add_medicine_schedule
+            args = (
+                self.user_id,
+                medicine_id,
+                None,  # No prescription ID
+                dosage,
+                frequency,
+                start_date_str,
+                end_date_str,
+                time_slots,
+                notes
+            )
+            message = "Medicine schedule added successfully"
+        
+        def saved(result):
+            messagebox.showinfo("Success", message)
             popup.destroy()
             self.show_schedules()  # Refresh schedules view
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save schedule: {str(e)}")
+        
+        self.tasks.submit(
+            save,
+            *args,
+            on_success=saved,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to save schedule: {str(e)}")
+        )
     
+    @traced
     def delete_medicine_schedule(self, schedule, parent_popup):
         # Ask for confirmation
         confirm = messagebox.askyesno(
@@ -757,8 +781,7 @@ class PatientApp:
         )
         
         if confirm:
-            try:
-                db.delete_medicine_schedule(schedule["id"])
+            def deleted(result):
                 messagebox.showinfo(
                     "Success", 
                     f"Schedule for {schedule['medicine_name']} deleted successfully"
@@ -767,13 +790,17 @@ class PatientApp:
                 # Close the popup and refresh the schedules view
                 parent_popup.destroy()
                 self.show_schedules()
-            except Exception as e:
-                messagebox.showerror(
-                    "Error", 
-                    f"Failed to delete schedule: {str(e)}"
-                )
+            
+            self.tasks.submit(
+                db.delete_medicine_schedule,
+                schedule["id"],
+                on_success=deleted,
+                on_error=lambda e: messagebox.showerror("Error", f"Failed to delete schedule: {str(e)}")
+            )
     
+    @traced
     def show_prescriptions(self):
+        set_view("patient.prescriptions")
         self.hide_all_frames()
         self.prescriptions_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
@@ -794,16 +821,22 @@ class PatientApp:
         ).pack(anchor=tk.W, pady=(0, 20))
         
         # Get all prescriptions
-        prescriptions = db.get_patient_prescriptions(self.user_id)
+        loading = show_loading(self.prescriptions_frame)
         
-        if not prescriptions:
-            ttk.Label(
-                self.prescriptions_frame, 
-                text="You don't have any prescriptions yet.",
-                font=("Arial", 12)
-            ).pack(anchor=tk.W, pady=20)
-        else:
-            self.display_prescriptions(prescriptions)
+        def loaded(prescriptions):
+            loading.destroy()
+            if not prescriptions:
+                ttk.Label(
+                    self.prescriptions_frame, 
+                    text="You don't have any prescriptions yet.",
+                    font=("Arial", 12)
+                ).pack(anchor=tk.W, pady=20)
+            else:
+                self.display_prescriptions(prescriptions)
+        
+        self.tasks.submit(
+            db.get_patient_prescriptions, self.user_id, on_success=loaded, key="content"
+        )
     
     def display_prescriptions(self, prescriptions):
         prescriptions_container = ttk.Frame(self.prescriptions_frame)
@@ -868,6 +901,7 @@ class PatientApp:
             
             ttk.Separator(scrollable_frame, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=5)
     
+    @traced
     def upload_prescription(self):
         file_path = filedialog.askopenfilename(
             title="Select Prescription File",
@@ -877,12 +911,18 @@ class PatientApp:
         if not file_path:
             return
         
-        try:
-            db.add_prescription(self.user_id, file_path)
+        def uploaded(result):
             messagebox.showinfo("Success", "Prescription uploaded successfully")
             self.show_prescriptions()  # Refresh prescriptions view
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to upload prescription: {str(e)}")
+        
+        # Copying the file and saving the record both happen off the UI thread
+        self.tasks.submit(
+            db.add_prescription,
+            self.user_id,
+            file_path,
+            on_success=uploaded,
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to upload prescription: {str(e)}")
+        )
     
     def view_prescription(self, file_path):
         try:
@@ -904,4 +944,5 @@ class PatientApp:
     
     def logout(self):
         if messagebox.askyesno("Logout", "Are you sure you want to logout?"):
+            self.tasks.shutdown()
             self.root.destroy()
\ No newline at end of file
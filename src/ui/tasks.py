@@ -0,0 +1,117 @@
+import contextvars
+import queue
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox, ttk
+
+from src import metrics
+
+POLL_INTERVAL_MS = 30
+
+
+class Task:
+    def __init__(self, key=None):
+        self.key = key
+        self.context = None
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class TaskRunner:
+    """Runs blocking work (database calls, file copies) on worker threads.
+
+    Results are handed back on the Tk thread by polling with ``root.after``,
+    so callbacks may touch widgets. Submitting a task with the same ``key`` as
+    a running one cancels the older task, and its result is dropped. The
+    work and its callbacks run in a copy of the submitter's context, so the
+    tracing span of the UI action that started them carries over.
+    """
+
+    def __init__(self, root, workers=2, poll_interval=POLL_INTERVAL_MS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ui-task")
+        self._results = queue.Queue()
+        self._latest = {}
+        self._outstanding = 0
+        self._polling = False
+
+    def submit(self, func, *args, on_success=None, on_error=None, key=None, **kwargs):
+        if key is not None:
+            self.cancel(key)
+
+        task = Task(key)
+        task.context = contextvars.copy_context()
+        if key is not None:
+            self._latest[key] = task
+
+        def finished(future):
+            self._results.put((task, future, on_success, on_error))
+
+        self._outstanding += 1
+        task.future = self._executor.submit(task.context.run, func, *args, **kwargs)
+        task.future.add_done_callback(finished)
+        self._schedule_poll()
+        return task
+
+    def cancel(self, key):
+        task = self._latest.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def shutdown(self):
+        for key in list(self._latest):
+            self.cancel(key)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule_poll(self):
+        if self._polling:
+            return
+        try:
+            self.root.after(self.poll_interval, self._poll)
+            self._polling = True
+        except tk.TclError:
+            pass  # Window already destroyed
+
+    def _poll(self):
+        self._polling = False
+        while True:
+            try:
+                task, future, on_success, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            self._outstanding -= 1
+            if task.key is not None and self._latest.get(task.key) is task:
+                del self._latest[task.key]
+            if task.cancelled or future.cancelled():
+                continue
+
+            error = future.exception()
+            if error is None:
+                if on_success:
+                    self._run_callback(task, on_success, future.result())
+            elif on_error:
+                self._run_callback(task, on_error, error)
+            else:
+                messagebox.showerror("Error", str(error))
+
+        if self._outstanding > 0:
+            self._schedule_poll()
+
+    def _run_callback(self, task, callback, value):
+        # Timed because callbacks run on the Tk thread and block the UI
+        name = getattr(callback, "__qualname__", type(callback).__name__)
+        task.context.run(metrics.time_callback, name, callback, value)
+
+
+def show_loading(parent, text="Loading..."):
+    # Placeholder shown while a task fills the frame
+    label = ttk.Label(parent, text=text, foreground="gray")
+    label.pack(anchor=tk.W, pady=10)
+    return label
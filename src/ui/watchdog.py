@@ -0,0 +1,126 @@
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from src import config, metrics
+from src.tracing import log_to_file
+
+logger = logging.getLogger("medical_app.ui_stalls")
+
+HEARTBEAT_MS = 50
+
+_view = "-"
+_log_configured = False
+
+
+def set_view(name):
+    """Name the screen on show, so stall reports say where the user was."""
+    global _view
+    _view = name
+
+
+def current_view():
+    return _view
+
+
+class StallWatchdog:
+    """Detects Tk event-loop stalls.
+
+    A heartbeat scheduled with ``root.after`` stamps the time on every
+    beat. A watcher thread checks the stamp; once a beat is overdue by more
+    than ``threshold_ms`` it captures the Tk thread's Python stack with
+    ``sys._current_frames`` and logs it with the current view. When the loop
+    catches up, the stall's full duration is logged and published as the
+    ``medical_app_ui_stall_duration_seconds`` metric.
+    """
+
+    def __init__(self, root, threshold_ms=None, heartbeat_ms=HEARTBEAT_MS):
+        self.root = root
+        self.threshold = (threshold_ms if threshold_ms is not None else config.STALL_THRESHOLD_MS) / 1000
+        self.heartbeat = heartbeat_ms / 1000
+        self.stalls = 0
+        self._thread_id = None
+        self._last_beat = None
+        self._stall = None  # (started, view) of the stall in progress
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        # Must be called on the Tk thread, which is the one being watched
+        self._thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self.root.after(int(self.heartbeat * 1000), self._beat)
+        threading.Thread(target=self._watch, name="ui-watchdog", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _beat(self):
+        if self._stopped.is_set():
+            return
+        now = time.perf_counter()
+        with self._lock:
+            stall = self._stall
+            self._stall = None
+            self._last_beat = now
+        if stall is not None:
+            started, view = stall
+            duration = now - started
+            self.stalls += 1
+            metrics.UI_STALL_SECONDS.observe(duration, view=view)
+            _log("UI stall in view=%s lasted %.0fms", view, duration * 1000)
+        try:
+            self.root.after(int(self.heartbeat * 1000), self._beat)
+        except Exception:
+            self.stop()  # Window destroyed
+
+    def _watch(self):
+        interval = min(self.heartbeat, self.threshold) / 2
+        while not self._stopped.wait(interval):
+            with self._lock:
+                if self._stall is not None:
+                    continue  # Already reported; wait for the loop to catch up
+                started = self._last_beat + self.heartbeat
+                overdue = time.perf_counter() - started
+                if overdue < self.threshold:
+                    continue
+                view = _view
+                self._stall = (started, view)
+
+            frame = sys._current_frames().get(self._thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "  (no stack)\n"
+            _log(
+                "UI stalled for %.0fms in view=%s; Tk thread stack:\n%s",
+                overdue * 1000,
+                view,
+                stack.rstrip("\n"),
+            )
+
+
+def configure_stall_log(path=None, max_bytes=None, backups=None):
+    """Send stall reports to a rotating log file. Called on first use with
+    the settings from config; call it earlier to log somewhere else."""
+    global _log_configured
+    log_to_file(
+        logger,
+        path or config.STALL_LOG,
+        max_bytes or config.STALL_LOG_BYTES,
+        backups if backups is not None else config.STALL_LOG_BACKUPS,
+    )
+    _log_configured = True
+
+
+def _log(message, *args):
+    if not _log_configured:
+        configure_stall_log()
+    logger.warning(message, *args)
+
+
+def start(root):
+    """Watch ``root``'s event loop if config.STALL_THRESHOLD_MS is set."""
+    if not config.STALL_THRESHOLD_MS:
+        return None
+    return StallWatchdog(root).start()
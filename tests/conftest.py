@@ -0,0 +1,74 @@
+import os
+from datetime import date, datetime
+
+import pytest
+
+from src.backends import create_backend
+from src.clock import SimulatedClock
+from src.database import Database
+
+# Every test runs on SQLite. Set MEDICAL_APP_TEST_MYSQL=1 to run them on MySQL
+# too, in a scratch database on the server configured by MEDICAL_APP_DB_*.
+TEST_MYSQL = os.environ.get("MEDICAL_APP_TEST_MYSQL", "").lower() in ("1", "true", "yes")
+TEST_MYSQL_DATABASE = os.environ.get("MEDICAL_APP_TEST_MYSQL_DATABASE", "medical_management_test")
+
+
+@pytest.fixture
+def clock():
+    return SimulatedClock(datetime(2026, 1, 20, 12, 0))
+
+
+@pytest.fixture(params=["sqlite", "mysql"] if TEST_MYSQL else ["sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        yield create_backend("sqlite", path=str(tmp_path / "test.db"))
+        return
+
+    pytest.importorskip("mysql.connector")
+    backend = create_backend("mysql", database=TEST_MYSQL_DATABASE)
+    try:
+        drop_mysql_database(backend)
+    except Exception as e:
+        pytest.skip(f"MySQL server unavailable: {e}")
+    yield backend
+    drop_mysql_database(backend)
+
+
+def drop_mysql_database(backend):
+    connection = backend.mysql.connect(**backend.connect_args)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {backend.database}")
+    cursor.close()
+    connection.close()
+
+
+@pytest.fixture
+def open_database(backend, clock):
+    # Each call opens another client of the same test database
+    databases = []
+
+    def open_database():
+        database = Database(backend=create_backend(backend.name, **backend.options()), fixtures=False, clock=clock)
+        databases.append(database)
+        return database
+
+    yield open_database
+    for database in databases:
+        database.pool.close()
+
+
+@pytest.fixture
+def db(open_database):
+    return open_database()
+
+
+@pytest.fixture
+def patient_id(db):
+    db.add_user("patient", "secret", "patient@example.com", "Test Patient", "patient")
+    return db.get_user_id_by_username("patient")
+
+
+@pytest.fixture
+def medicine_id(db):
+    db.add_medicine("Aspirin", "", 100, date(2025, 12, 1), date(2027, 1, 1), "", "", "", "")
+    return db.get_all_medicines()[0]["id"]
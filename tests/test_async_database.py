@@ -0,0 +1,37 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from src.async_database import AsyncDatabase
+
+
+def test_shares_the_database_cache(db):
+    async def run():
+        async with AsyncDatabase(workers=2, database=db) as adb:
+            assert await adb.get_all_medicines() == []
+            # A write through the shared Database invalidates what the facade reads
+            db.add_medicine("Aspirin", "", 100, date(2025, 12, 1), date(2027, 1, 1), "", "", "", "")
+            return await adb.get_all_medicines()
+
+    assert [medicine["name"] for medicine in asyncio.run(run())] == ["Aspirin"]
+
+
+def test_load_dashboard(db, patient_id):
+    async def run():
+        async with AsyncDatabase(workers=2, database=db) as adb:
+            return await adb.load_dashboard(patient_id, date(2026, 1, 20))
+
+    assert asyncio.run(run()) == [[], []]
+
+
+@pytest.mark.parametrize("name", ["iter_medicine_log_history", "transaction"])
+def test_generators_and_context_managers_are_refused(db, name):
+    adb = AsyncDatabase(workers=1, database=db)
+    try:
+        with pytest.raises(AttributeError, match=name):
+            getattr(adb, name)
+        with pytest.raises(AttributeError, match=name):
+            adb.submit(name)
+    finally:
+        adb.close()
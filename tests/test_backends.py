@@ -0,0 +1,83 @@
+from datetime import date, datetime
+
+import pytest
+
+
+@pytest.fixture
+def connection(backend):
+    connection = backend.connect()
+    cursor = backend.cursor(connection)
+    cursor.execute(
+        "CREATE TABLE parity (k INT PRIMARY KEY, v VARCHAR(20), minutes INT, at DATETIME, day DATE)"
+    )
+    cursor.close()
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def query(backend, connection, sql, params=(), dictionary=False):
+    cursor = backend.cursor(connection, dictionary=dictionary)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def execute(backend, connection, sql, params=()):
+    cursor = backend.cursor(connection)
+    cursor.execute(sql, params)
+    rowcount = cursor.rowcount
+    cursor.close()
+    connection.commit()
+    return rowcount
+
+
+def test_insert_ignore_keeps_the_first_row(backend, connection):
+    sql = f"{backend.insert_ignore} INTO parity (k, v) VALUES (%s, %s)"
+    assert execute(backend, connection, sql, (1, "first")) == 1
+    assert execute(backend, connection, sql, (1, "second")) == 0
+
+    assert query(backend, connection, "SELECT k, v FROM parity") == [(1, "first")]
+
+
+def test_upsert_inserts_and_updates(backend, connection):
+    execute(backend, connection, backend.upsert("parity", ("k", "v"), ("k",), rows=2), (1, "a", 2, "b"))
+    execute(backend, connection, backend.upsert("parity", ("k", "v"), ("k",)), (1, "c"))
+
+    assert query(backend, connection, "SELECT k, v FROM parity ORDER BY k") == [(1, "c"), (2, "b")]
+
+
+def test_add_minutes(backend, connection):
+    rows = [(1, 45, datetime(2026, 1, 20, 23, 30)), (2, 1440, datetime(2026, 1, 20, 8, 0))]
+    for row in rows:
+        execute(backend, connection, "INSERT INTO parity (k, minutes, at) VALUES (%s, %s, %s)", row)
+    due = backend.add_minutes("at", "minutes")
+
+    values = query(backend, connection, f"SELECT {due} FROM parity ORDER BY k")
+    # SQLite returns the text it stores, MySQL a datetime; both print the same
+    assert [str(value) for value, in values] == ["2026-01-21 00:15:00", "2026-01-21 08:00:00"]
+    assert query(backend, connection, f"SELECT k FROM parity WHERE {due} <= %s", (datetime(2026, 1, 21, 1, 0),)) == [
+        (1,)
+    ]
+
+
+def test_cursor_takes_format_placeholders_and_round_trips_dates(backend, connection):
+    cursor = backend.cursor(connection)
+    cursor.executemany(
+        "INSERT INTO parity (k, v, at, day) VALUES (%s, %s, %s, %s)",
+        [(1, "a", datetime(2026, 1, 20, 8, 30), date(2026, 1, 20)), (2, "b", None, None)],
+    )
+    cursor.close()
+    connection.commit()
+
+    rows = query(backend, connection, "SELECT k, v, at, day FROM parity WHERE k >= %s ORDER BY k", (1,), True)
+    assert rows == [
+        {"k": 1, "v": "a", "at": datetime(2026, 1, 20, 8, 30), "day": date(2026, 1, 20)},
+        {"k": 2, "v": "b", "at": None, "day": None},
+    ]
+
+    cursor = backend.cursor(connection, dictionary=True)
+    cursor.execute("SELECT k FROM parity WHERE k = %s", (3,))
+    assert cursor.fetchone() is None
+    cursor.close()
@@ -0,0 +1,24 @@
+
+
+def test_user_added_by_another_client_is_found(db, open_database):
+    assert db.get_user("nurse") is None
+
+    user_id = open_database().add_user("nurse", "secret", "nurse@example.com", "Test Nurse", "patient")
+
+    assert db.get_user("nurse")["id"] == user_id
+    assert db.get_user_id_by_username("nurse") == user_id
+
+
+def test_found_users_are_cached(db, patient_id):
+    db.get_user("patient")
+    hits = db.cache_stats()["hits"]
+    db.get_user("patient")
+    assert db.cache_stats()["hits"] == hits + 1
+
+
+def test_medicine_added_by_another_client_is_found(db, open_database):
+    assert db.get_medicine_by_id(1) is None
+
+    open_database().add_medicine("Aspirin", "", 100, "2025-12-01", "2027-01-01", "", "", "", "")
+
+    assert db.get_medicine_by_id(1)["name"] == "Aspirin"
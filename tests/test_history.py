@@ -0,0 +1,63 @@
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def patient_logs(db, patient_id, medicine_id):
+    # Three schedules with the same slots, so every dose time is shared by
+    # three logs and paging has to break ties on id; 39 due doses each
+    for _ in range(3):
+        db.add_medicine_schedule(
+            patient_id, medicine_id, None, "1 tablet", "daily", date(2026, 1, 1), None, "08:00,20:00"
+        )
+    with db._connection() as connection:
+        cursor = db.backend.cursor(connection)
+        cursor.execute("SELECT scheduled_time, id FROM medicine_logs ORDER BY scheduled_time, id")
+        keys = [tuple(row) for row in cursor.fetchall()]
+        cursor.close()
+    assert len(keys) == 117
+    return keys
+
+
+def page_through(db, patient_id, newest_first):
+    keys = []
+    after = None
+    while True:
+        rows, after = db.get_medicine_log_page(patient_id, after=after, newest_first=newest_first, page_size=7)
+        keys.extend((row["scheduled_time"], row["id"]) for row in rows)
+        if after is None:
+            return keys
+
+
+@pytest.mark.parametrize("newest_first", [False, True])
+def test_pages_break_ties_on_id(db, patient_id, patient_logs, newest_first):
+    expected = patient_logs[::-1] if newest_first else patient_logs
+    assert page_through(db, patient_id, newest_first) == expected
+
+
+@pytest.mark.parametrize("newest_first", [False, True])
+def test_history_iterates_every_log_once(db, patient_id, patient_logs, newest_first):
+    history = db.iter_medicine_log_history(patient_id, newest_first=newest_first, page_size=7)
+    keys = [(row["scheduled_time"], row["id"]) for row in history]
+    assert keys == (patient_logs[::-1] if newest_first else patient_logs)
+
+
+def test_filters_apply_across_pages(db, patient_id, patient_logs):
+    history = db.iter_medicine_log_history(
+        patient_id, start_date=date(2026, 1, 10), end_date=date(2026, 1, 11), page_size=4
+    )
+    assert [row["scheduled_time"].day for row in history] == [10] * 6 + [11] * 6
+
+
+def test_abandoned_history_returns_its_connection(db, patient_id, patient_logs):
+    history = db.iter_medicine_log_history(patient_id, page_size=50)
+    next(history)
+    assert db.pool.stats()["in_use"] == 1
+
+    history.close()
+    assert db.pool.stats()["in_use"] == 0
+
+    # And the connection is usable by the next borrower
+    assert len(db.get_medicine_log_page(patient_id, page_size=5)[0]) == 5
+    assert db.pool.stats()["in_use"] == 0
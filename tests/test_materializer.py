@@ -0,0 +1,59 @@
+from datetime import date, datetime
+
+from src import materializer
+
+
+def add_schedule(db, patient_id, medicine_id, time_slots):
+    return db.add_medicine_schedule(
+        patient_id, medicine_id, None, "1 tablet", "daily", date(2026, 1, 1), None, time_slots
+    )
+
+
+def log_count(db):
+    with db._connection() as connection:
+        cursor = db.backend.cursor(connection)
+        cursor.execute("SELECT COUNT(*) FROM medicine_logs")
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return count
+
+
+def test_passes_only_touch_schedules_with_newly_due_doses(db, clock, patient_id, medicine_id):
+    add_schedule(db, patient_id, medicine_id, "08:00,20:00")
+    add_schedule(db, patient_id, medicine_id, "13:00")
+
+    assert materializer.run(db)["schedules"] == 0
+
+    clock.set(datetime(2026, 1, 20, 13, 5))
+    totals = materializer.run(db)
+    assert (totals["schedules"], totals["created"]) == (1, 1)
+
+    clock.set(datetime(2026, 1, 21, 9, 0))
+    totals = materializer.run(db)
+    assert (totals["schedules"], totals["created"]) == (1, 2)
+
+
+def test_edit_adding_an_earlier_dose_rewinds_the_watermark(db, clock, patient_id, medicine_id):
+    schedule_id = add_schedule(db, patient_id, medicine_id, "20:00")
+    db.update_medicine_schedule(schedule_id, medicine_id, "1 tablet", "daily", date(2026, 1, 1), None, "14:00,20:00")
+
+    clock.set(datetime(2026, 1, 20, 15, 0))
+    assert materializer.run(db)["created"] == 1
+
+
+def test_workers_use_the_callers_database(db, clock, patient_id, medicine_id):
+    add_schedule(db, patient_id, medicine_id, "13:00")
+    clock.set(datetime(2026, 1, 22, 14, 0))
+    before = log_count(db)
+
+    totals = materializer.run(db, workers=2)
+
+    assert totals["created"] == 3
+    assert log_count(db) == before + 3
+
+
+def test_claim_job_lets_one_client_run_per_interval(db, clock):
+    assert db.claim_job("test", 300)
+    assert not db.claim_job("test", 300)
+    clock.set(datetime(2026, 1, 20, 12, 5))
+    assert db.claim_job("test", 300)
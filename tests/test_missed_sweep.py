@@ -0,0 +1,31 @@
+from datetime import date, datetime
+
+
+def statuses(db):
+    with db._connection() as connection:
+        cursor = db.backend.cursor(connection)
+        cursor.execute("SELECT schedule_id, status FROM medicine_logs ORDER BY schedule_id")
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def test_sweep_uses_each_schedules_grace_period(db, clock, patient_id, medicine_id):
+    def add(missed_after_minutes):
+        return db.add_medicine_schedule(
+            patient_id, medicine_id, None, "1 tablet", "daily", date(2026, 1, 20), None, "13:00",
+            missed_after_minutes=missed_after_minutes,
+        )
+
+    short, long = add(30), add(120)
+    clock.set(datetime(2026, 1, 20, 13, 5))
+    db.materialize_logs([patient_id])
+    assert db.mark_missed_medicine_logs() == 0
+
+    clock.set(datetime(2026, 1, 20, 13, 45))
+    assert db.mark_missed_medicine_logs() == 1
+    assert statuses(db) == [(short, "missed"), (long, "scheduled")]
+
+    clock.set(datetime(2026, 1, 20, 15, 5))
+    assert db.mark_missed_medicine_logs() == 1
+    assert statuses(db) == [(short, "missed"), (long, "missed")]
@@ -0,0 +1,54 @@
+from datetime import date, datetime
+
+from src.occurrences import diff_occurrences
+
+
+def schedule(start, end=None):
+    return {"start_date": start, "end_date": end}
+
+
+START = datetime(2026, 1, 1)
+END = datetime(2026, 1, 6)
+
+
+def test_unchanged_schedule_has_no_diff():
+    old = schedule(date(2026, 1, 1))
+    assert diff_occurrences(old, [480, 1200], old, [480, 1200], START, END) == ([], [])
+
+
+def test_removed_slot_on_shared_days():
+    old = new = schedule(date(2026, 1, 1), date(2026, 1, 3))
+    removed, added = diff_occurrences(old, [480, 1200], new, [480], START, END)
+    assert removed == [datetime(2026, 1, day, 20, 0) for day in (1, 2, 3)]
+    assert added == []
+
+
+def test_added_slot_on_shared_days():
+    old = new = schedule(date(2026, 1, 4))
+    removed, added = diff_occurrences(old, [480], new, [480, 840], START, END)
+    assert removed == []
+    assert added == [datetime(2026, 1, 4, 14, 0), datetime(2026, 1, 5, 14, 0)]
+
+
+def test_earlier_start_adds_days():
+    old = schedule(date(2026, 1, 3))
+    new = schedule(date(2026, 1, 1))
+    removed, added = diff_occurrences(old, [480], new, [480], START, END)
+    assert removed == []
+    assert added == [datetime(2026, 1, 1, 8, 0), datetime(2026, 1, 2, 8, 0)]
+
+
+def test_earlier_end_removes_days_of_open_ended_schedule():
+    old = schedule(date(2026, 1, 1))
+    new = schedule(date(2026, 1, 1), date(2026, 1, 3))
+    removed, added = diff_occurrences(old, [480], new, [480], START, END)
+    assert removed == [datetime(2026, 1, 4, 8, 0), datetime(2026, 1, 5, 8, 0)]
+    assert added == []
+
+
+def test_disjoint_ranges():
+    old = schedule(date(2026, 1, 1), date(2026, 1, 2))
+    new = schedule(date(2026, 1, 4), date(2026, 1, 5))
+    removed, added = diff_occurrences(old, [480], new, [600], START, END)
+    assert removed == [datetime(2026, 1, 1, 8, 0), datetime(2026, 1, 2, 8, 0)]
+    assert added == [datetime(2026, 1, 4, 10, 0), datetime(2026, 1, 5, 10, 0)]
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+
+from src.pool import ConnectionPool, PoolError, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.closed = False
+        self.in_transaction = False
+        self.borrowers = 0
+
+    def is_connected(self):
+        return self.alive
+
+    def rollback(self):
+        if not self.alive:
+            raise Exception("connection lost")
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self):
+        self.connections = []
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self.fail:
+            raise Exception("server unavailable")
+        with self._lock:
+            connection = FakeConnection(len(self.connections))
+            self.connections.append(connection)
+        return connection
+
+
+@pytest.fixture
+def factory():
+    return Factory()
+
+
+def test_connections_are_opened_lazily_and_reused(factory):
+    pool = ConnectionPool(factory, size=2)
+    assert pool.stats()["open"] == 0
+
+    with pool.connection() as first:
+        with pool.connection() as second:
+            assert first is not second
+            assert pool.stats()["in_use"] == 2
+    with pool.connection() as again:
+        assert again in (first, second)
+
+    stats = pool.stats()
+    assert (stats["created"], stats["open"], stats["idle"], stats["in_use"]) == (2, 2, 2, 0)
+    assert stats["checkouts"] == 3
+
+
+def test_release_rolls_back_an_open_transaction(factory):
+    pool = ConnectionPool(factory, size=1)
+    with pool.connection() as connection:
+        connection.in_transaction = True
+    assert not connection.in_transaction
+    assert pool.acquire() is connection
+
+
+def test_exhausted_pool_times_out(factory):
+    pool = ConnectionPool(factory, size=1, checkout_timeout=0.1)
+    held = pool.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.1
+    assert pool.stats()["timeouts"] == 1
+
+    pool.release(held)
+    assert pool.acquire() is held
+
+
+def test_waiting_borrower_gets_a_released_connection(factory):
+    pool = ConnectionPool(factory, size=1, checkout_timeout=5)
+    held = pool.acquire()
+    threading.Timer(0.05, pool.release, (held,)).start()
+
+    assert pool.acquire() is held
+    assert pool.stats()["created"] == 1
+
+
+def test_dead_idle_connection_is_replaced(factory):
+    pool = ConnectionPool(factory, size=1, health_check_interval=0)
+    with pool.connection() as dead:
+        pass
+    dead.alive = False
+
+    with pool.connection() as connection:
+        assert connection is not dead
+    assert dead.closed
+    stats = pool.stats()
+    assert (stats["discarded"], stats["created"], stats["open"]) == (1, 2, 1)
+
+
+def test_connection_that_fails_to_reset_is_discarded(factory):
+    pool = ConnectionPool(factory, size=1)
+    with pool.connection() as connection:
+        connection.in_transaction = True
+        connection.alive = False
+    assert connection.closed
+    assert pool.stats()["open"] == 0
+
+
+def test_idle_connections_expire(factory):
+    pool = ConnectionPool(factory, size=1, idle_timeout=0)
+    with pool.connection() as old:
+        pass
+    time.sleep(0.01)
+    with pool.connection() as connection:
+        assert connection is not old
+    assert old.closed
+    assert pool.stats()["evicted"] == 1
+
+
+def test_failed_connect_frees_its_slot(factory):
+    pool = ConnectionPool(factory, size=1, checkout_timeout=0.1)
+    factory.fail = True
+    with pytest.raises(Exception, match="server unavailable"):
+        pool.acquire()
+
+    factory.fail = False
+    assert pool.acquire() is factory.connections[0]
+
+
+def test_closed_pool_refuses_checkouts(factory):
+    pool = ConnectionPool(factory, size=2)
+    held = pool.acquire()
+    with pool.connection() as idle:
+        pass
+    pool.close()
+
+    assert idle.closed
+    with pytest.raises(PoolError):
+        pool.acquire()
+    # Connections still out are closed when they come back
+    pool.release(held)
+    assert held.closed
+    assert pool.stats()["open"] == 0
+
+
+def test_concurrent_borrowers_never_share_a_connection(factory):
+    pool = ConnectionPool(factory, size=3, checkout_timeout=5)
+    errors = []
+
+    def borrow():
+        try:
+            for _ in range(200):
+                with pool.connection() as connection:
+                    connection.borrowers += 1
+                    if connection.borrowers != 1:
+                        errors.append(f"connection {connection.number} shared")
+                    time.sleep(0)
+                    connection.borrowers -= 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=borrow) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    stats = pool.stats()
+    assert stats["created"] <= 3
+    assert (stats["in_use"], stats["checkouts"]) == (0, 1600)
@@ -0,0 +1,15 @@
+from src import config, recorder
+
+
+def test_only_the_shared_database_records(db, open_database, tmp_path, monkeypatch):
+    trace = tmp_path / "session.trace.gz"
+    monkeypatch.setattr(config, "RECORD_TRACE", str(trace))
+    recorder.record(db)
+    db.get_all_medicines()
+
+    # e.g. a materializer worker starting up while the kiosk records
+    assert open_database().recorder is None
+
+    db.recorder.close()
+    _, entries = recorder.read_trace(str(trace))
+    assert [entry["m"] for entry in entries] == ["get_all_medicines"]
@@ -0,0 +1,89 @@
+from datetime import date, datetime
+
+import pytest
+
+
+@pytest.fixture
+def schedule_id(db, patient_id, medicine_id):
+    # Running since Jan 1; the clock is at Jan 20 12:00, so 39 doses are due
+    return db.add_medicine_schedule(
+        patient_id, medicine_id, None, "1 tablet", "twice daily", date(2026, 1, 1), date(2026, 3, 1), "08:00,20:00"
+    )
+
+
+def stored_logs(db, schedule_id):
+    with db._connection() as connection:
+        cursor = db.backend.cursor(connection, dictionary=True)
+        cursor.execute(
+            "SELECT id, scheduled_time, status FROM medicine_logs WHERE schedule_id = %s ORDER BY scheduled_time",
+            (schedule_id,),
+        )
+        logs = cursor.fetchall()
+        cursor.close()
+    return logs
+
+
+def edit(db, schedule_id, medicine_id, start_date=date(2026, 1, 1), time_slots="08:00,20:00"):
+    db.update_medicine_schedule(
+        schedule_id, medicine_id, "1 tablet", "daily", start_date, date(2026, 3, 1), time_slots
+    )
+
+
+def store_ahead(db, schedule_id, scheduled_time):
+    with db._connection() as connection:
+        cursor = db.backend.cursor(connection)
+        cursor.execute(
+            "INSERT INTO medicine_logs (schedule_id, scheduled_time, status) VALUES (%s, %s, 'scheduled')",
+            (schedule_id, scheduled_time),
+        )
+        connection.commit()
+        cursor.close()
+
+
+def test_removing_a_slot_keeps_past_logs(db, schedule_id, medicine_id):
+    before = stored_logs(db, schedule_id)
+    assert len(before) == 39
+
+    edit(db, schedule_id, medicine_id, time_slots="08:00")
+
+    assert stored_logs(db, schedule_id) == before
+
+
+def test_adding_a_slot_does_not_backfill_past_days(db, schedule_id, medicine_id):
+    before = stored_logs(db, schedule_id)
+
+    edit(db, schedule_id, medicine_id, time_slots="08:00,14:00,20:00")
+
+    assert stored_logs(db, schedule_id) == before
+    upcoming = db.get_medicine_logs(db.get_schedule_by_id(schedule_id)["patient_id"], date(2026, 1, 21))
+    assert [log["scheduled_time"].hour for log in upcoming] == [8, 14, 20]
+
+
+def test_earlier_start_backfills_the_added_days(db, schedule_id, medicine_id):
+    before = stored_logs(db, schedule_id)
+
+    edit(db, schedule_id, medicine_id, start_date=date(2025, 12, 30))
+
+    after = stored_logs(db, schedule_id)
+    added = [log["scheduled_time"] for log in after[:4]]
+    assert added == [
+        datetime(2025, 12, 30, 8, 0),
+        datetime(2025, 12, 30, 20, 0),
+        datetime(2025, 12, 31, 8, 0),
+        datetime(2025, 12, 31, 20, 0),
+    ]
+    assert after[4:] == before
+
+
+def test_removed_future_doses_are_deleted_unless_acted_on(db, schedule_id, medicine_id):
+    store_ahead(db, schedule_id, datetime(2026, 1, 21, 8, 0))
+    store_ahead(db, schedule_id, datetime(2026, 1, 21, 20, 0))
+    db.update_medicine_log(f"v:{schedule_id}:202601222000", "skipped")
+
+    edit(db, schedule_id, medicine_id, time_slots="08:00")
+
+    future = [log for log in stored_logs(db, schedule_id) if log["scheduled_time"] >= datetime(2026, 1, 20, 12, 0)]
+    assert [(log["scheduled_time"], log["status"]) for log in future] == [
+        (datetime(2026, 1, 21, 8, 0), "scheduled"),
+        (datetime(2026, 1, 22, 20, 0), "skipped"),
+    ]
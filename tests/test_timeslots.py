@@ -0,0 +1,23 @@
+import pytest
+
+from src import timeslots
+
+
+def test_parse_sorts_and_dedupes():
+    assert timeslots.parse("20:30, 08:00,8:00") == (480, 1230)
+
+
+def test_normalize():
+    assert timeslots.normalize(" 8:05,20:30 ,") == "08:05,20:30"
+
+
+@pytest.mark.parametrize("text", ["8", "08:00:00", "8:", ":30", "24:00", "12:60", "ab:cd", "-1:00"])
+def test_parse_rejects_anything_but_hh_mm(text):
+    with pytest.raises(ValueError, match="HH:MM"):
+        timeslots.parse(text)
+
+
+@pytest.mark.parametrize("text", ["", " , "])
+def test_parse_needs_a_slot(text):
+    with pytest.raises(ValueError, match="at least one"):
+        timeslots.parse(text)
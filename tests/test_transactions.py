@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+
+class Boom(Exception):
+    pass
+
+
+def add_medicine(db, name):
+    db.add_medicine(name, "", 10, date(2025, 12, 1), date(2027, 1, 1), "", "", "", "")
+
+
+def medicine_names(db):
+    return sorted(medicine["name"] for medicine in db.get_all_medicines())
+
+
+def test_outer_rollback_discards_everything(db, open_database):
+    with pytest.raises(Boom):
+        with db.transaction():
+            add_medicine(db, "Aspirin")
+            with db.transaction():
+                add_medicine(db, "Ibuprofen")
+            db.add_user("nurse", "secret", "nurse@example.com", "Test Nurse", "patient")
+            raise Boom()
+
+    assert not db.in_transaction()
+    assert medicine_names(db) == []
+    assert db.get_user("nurse") is None
+    assert medicine_names(open_database()) == []
+    assert db.work_stats()["transactions_rolled_back"] == 1
+
+
+def test_inner_failure_rolls_back_to_its_savepoint(db, open_database):
+    committed = db.work_stats()["transactions_committed"]
+    with db.transaction():
+        add_medicine(db, "Aspirin")
+        with pytest.raises(Boom):
+            with db.transaction():
+                add_medicine(db, "Ibuprofen")
+                raise Boom()
+        add_medicine(db, "Paracetamol")
+        # Nothing is visible to other clients until the outer block commits
+        assert medicine_names(open_database()) == []
+
+    assert medicine_names(db) == ["Aspirin", "Paracetamol"]
+    assert medicine_names(open_database()) == ["Aspirin", "Paracetamol"]
+    # One commit for the whole block
+    assert db.work_stats()["transactions_committed"] == committed + 1
+
+
+def test_reads_inside_a_transaction_bypass_the_cache(db):
+    assert medicine_names(db) == []  # Cached
+
+    with pytest.raises(Boom):
+        with db.transaction():
+            add_medicine(db, "Aspirin")
+            size = db.cache_stats()["size"]
+            assert medicine_names(db) == ["Aspirin"]
+            assert db.get_medicine_by_id(1)["name"] == "Aspirin"
+            assert db.cache_stats()["size"] == size
+            raise Boom()
+
+    # The uncommitted row never reached the shared cache
+    assert medicine_names(db) == []
+    assert db.get_medicine_by_id(1) is None
+
+
+def test_commit_drops_entries_cached_during_the_block(db):
+    assert medicine_names(db) == []
+
+    with db.transaction():
+        add_medicine(db, "Aspirin")
+
+    assert medicine_names(db) == ["Aspirin"]